@@ -0,0 +1,205 @@
+import contextvars
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+
+from metrics import DEGRADED, QUEUE_DEPTH, REGISTRY, simple_collector
+from profiling import wrap
+from serving import CONCURRENCY
+
+# ---------------------- Configuration ----------------------
+# AIGNOSIS_MODEL_MAX_PENDING  model jobs queued or running before new ones are shed
+# AIGNOSIS_MODEL_DEADLINE     seconds a request waits for the models (0 = no deadline)
+# AIGNOSIS_LLM_MAX_PENDING    LLM calls queued or running before new ones are shed
+# AIGNOSIS_LLM_DEADLINE       seconds a request waits for the LLM summary (0 = no deadline)
+# AIGNOSIS_PENDING_TTL        seconds a late result stays available under its pending id
+MODEL_MAX_PENDING = int(os.getenv("AIGNOSIS_MODEL_MAX_PENDING", CONCURRENCY * 4))
+MODEL_DEADLINE = float(os.getenv("AIGNOSIS_MODEL_DEADLINE", 10))
+LLM_MAX_PENDING = int(os.getenv("AIGNOSIS_LLM_MAX_PENDING", 32))
+LLM_DEADLINE = float(os.getenv("AIGNOSIS_LLM_DEADLINE", 20))
+PENDING_TTL = float(os.getenv("AIGNOSIS_PENDING_TTL", 600))
+PENDING_MAX = 10000
+
+
+class StageDegraded(Exception):
+    """
+    A stage was skipped because it was saturated ("shed") or missed its
+    deadline ("deadline"). For a missed deadline `late` is the still running
+    concurrent.futures.Future of the stage.
+    """
+
+    def __init__(self, stage, reason, late=None):
+        super().__init__(f"{stage}: {reason}")
+        self.stage = stage
+        self.reason = reason
+        self.late = late
+
+
+class StageGate:
+    """
+    Admission control for one expensive stage.
+    At most `max_pending` calls are queued or running in the gate's own
+    executor; further calls are shed at once. A caller waits at most
+    `deadline` seconds, after which the call keeps running in the background
+    and the caller gets StageDegraded with the future to pick it up later.
+    """
+
+    def __init__(self, name, max_pending, deadline, workers):
+        self.name = name
+        self.max_pending = max_pending
+        self.deadline = deadline or None
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix=f"aignosis-{name}")
+        self.pending = 0
+        self.admitted = 0
+        self.shed = 0
+        self.timed_out = 0
+        self._lock = threading.Lock()
+
+    def _release(self, _future):
+        with self._lock:
+            self.pending -= 1
+
+    def call(self, fn, *args):
+        with self._lock:
+            if self.pending >= self.max_pending:
+                self.shed += 1
+                DEGRADED.labels(stage=self.name, reason="shed").inc()
+                raise StageDegraded(self.name, "shed")
+            self.pending += 1
+            self.admitted += 1
+        # Carry the current span (and a request profile) into the executor thread
+        future = self.executor.submit(contextvars.copy_context().run, wrap(fn), *args)
+        future.add_done_callback(self._release)
+        try:
+            return future.result(timeout=self.deadline)
+        except FutureTimeout:
+            with self._lock:
+                self.timed_out += 1
+            DEGRADED.labels(stage=self.name, reason="deadline").inc()
+            raise StageDegraded(self.name, "deadline", late=future)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "pending": self.pending,
+                "max_pending": self.max_pending,
+                "admitted": self.admitted,
+                "shed": self.shed,
+                "timed_out": self.timed_out,
+            }
+
+
+MODEL_GATE = StageGate("models", MODEL_MAX_PENDING, MODEL_DEADLINE, workers=CONCURRENCY)
+LLM_GATE = StageGate("llm_summary", LLM_MAX_PENDING, LLM_DEADLINE, workers=LLM_MAX_PENDING)
+
+
+class PendingResults:
+    """
+    Results of degraded requests that are completed in the background,
+    available under a pending id for PENDING_TTL seconds.
+    """
+
+    def __init__(self, ttl=PENDING_TTL, max_entries=PENDING_MAX):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries = OrderedDict()    # id -> (created, status, value)
+        self._lock = threading.Lock()
+        self.completed = 0
+        self.failed = 0
+
+    def _expire(self, now):
+        while self._entries:
+            pending_id, (created, _, _) = next(iter(self._entries.items()))
+            if now - created <= self.ttl and len(self._entries) <= self.max_entries:
+                break
+            del self._entries[pending_id]
+
+    def create(self):
+        pending_id = uuid.uuid4().hex
+        now = time.time()
+        with self._lock:
+            self._entries[pending_id] = (now, "pending", None)
+            self._expire(now)
+        return pending_id
+
+    def _set(self, pending_id, status, value):
+        with self._lock:
+            entry = self._entries.get(pending_id)
+            if entry is not None:
+                self._entries[pending_id] = (entry[0], status, value)
+            if status == "done":
+                self.completed += 1
+            else:
+                self.failed += 1
+
+    def resolve(self, pending_id, payload):
+        self._set(pending_id, "done", payload)
+
+    def fail(self, pending_id, error):
+        self._set(pending_id, "failed", error)
+
+    def get(self, pending_id):
+        """
+        Returns {"status": "pending" | "done" | "failed", ...} or None if unknown/expired.
+        """
+        with self._lock:
+            self._expire(time.time())
+            entry = self._entries.get(pending_id)
+        if entry is None:
+            return None
+        _, status, value = entry
+        if status == "done":
+            return {"status": status, "result": value}
+        if status == "failed":
+            return {"status": status, "error": value}
+        return {"status": status}
+
+
+PENDING = PendingResults()
+
+_counts = {"requests": 0, "degraded": 0}
+_counts_lock = threading.Lock()
+
+
+def record_request(degraded):
+    """Count one assessment, degraded if any stage was skipped."""
+    with _counts_lock:
+        _counts["requests"] += 1
+        if degraded:
+            _counts["degraded"] += 1
+
+
+def _read_counts():
+    # (requests, degraded), read together
+    with _counts_lock:
+        return _counts["requests"], _counts["degraded"]
+
+
+def stats():
+    """
+    Admission and degradation counters (for /healthz and metrics).
+    """
+    requests, degraded = _read_counts()
+    return {
+        "requests": requests,
+        "degraded": degraded,
+        "degradation_rate": round(degraded / requests, 4) if requests else 0.0,
+        "completed_later": PENDING.completed,
+        "failed_later": PENDING.failed,
+        "gates": {gate.name: gate.stats() for gate in (MODEL_GATE, LLM_GATE)},
+    }
+
+
+def _request_samples():
+    requests, degraded = _read_counts()
+    return [({"outcome": "full"}, requests - degraded), ({"outcome": "degraded"}, degraded)]
+
+
+REGISTRY.register_collector(simple_collector(
+    "aignosis_requests_total", "counter", "Assessments by outcome (full/degraded)", _request_samples))
+QUEUE_DEPTH.labels(queue="gate.models").set_function(lambda: MODEL_GATE.pending)
+QUEUE_DEPTH.labels(queue="gate.llm_summary").set_function(lambda: LLM_GATE.pending)
+QUEUE_DEPTH.labels(queue="pending_results").set_function(lambda: len(PENDING._entries))
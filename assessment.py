@@ -0,0 +1,825 @@
+import os
+import logging
+from dotenv import load_dotenv
+from process_file import extract_key_value_pairs
+from summary_result import summarize_model_outputs_llm
+import json
+from dataclasses import replace
+import asyncio
+import functools
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from assessment_graph import AssessmentGraph, AssessmentSession
+from serving import CONCURRENCY
+from model_artifacts import MODELS
+from model_manager import load_managed_pipelines, register_metrics
+from admission import LLM_GATE, MODEL_GATE, PENDING, StageDegraded, record_request
+from inference_workers import WORKERS as INFERENCE_WORKERS, InferenceWorkerPool, WorkerCrashed
+from cpu_scheduler import CPU_LAYOUT, PIN_WORKERS, ModelScheduler, detect_topology, partition_cores, resolve_layout
+from report_renderer import render_json, render_markdown, render_markdown_tail, render_timeline, to_payload
+from tracing import get_logger, log_event, span
+from metrics import EMIT_SECONDS, FILE_PREFETCH, LLM_SECONDS, MODEL_SECONDS, QUEUE_DEPTH
+from profiling import profile_request
+from history_store import history_entry, open_history_store
+from lab_trends import TrendTracker, trend_values
+# Pure assessment logic (re-exported here for existing callers)
+from cardio_core import (
+    CRITICAL_SYMPTOM_MAP, FREE_TEXT_KEYWORDS, FREE_TEXT_MATCHER, LABEL_MAPPING, MODEL_EXPLANATIONS, MODEL_WEIGHTS,
+    aggregate_model_predictions, analyze_extra_text, build_assessment_result, build_free_text_matcher,
+    calculate_heart_score, classify_cardiovascular_disease, generate_clinical_alerts, generate_recommendations,
+    MODEL_INPUT_ENCODINGS, encode_compact, generate_summary_text, map_uploaded_file, score_model_outputs,
+)
+
+# Load environment variables from .env file
+load_dotenv()
+
+logger = get_logger("assessment")
+
+# Max texts per forward pass on the batched path
+MODEL_BATCH_SIZE = int(os.getenv("AIGNOSIS_MODEL_BATCH_SIZE", 8))
+
+
+def parse_model_inputs(spec, models=MODELS):
+    """
+    {model_name: encoding} from AIGNOSIS_MODEL_INPUTS: one encoding for every
+    model ("compact") or per model ("ClinicalBERT=compact,BioBERT=summary");
+    models not listed read the summary text.
+    """
+    encodings = {name: "summary" for name in models}
+    for part in filter(None, (p.strip() for p in spec.split(","))):
+        name, _, encoding = part.rpartition("=")
+        if encoding not in MODEL_INPUT_ENCODINGS:
+            raise ValueError(f"unknown model input encoding {encoding!r} (use {', '.join(MODEL_INPUT_ENCODINGS)})")
+        if name and name not in encodings:
+            raise ValueError(f"AIGNOSIS_MODEL_INPUTS names unknown model {name!r}")
+        for model_name in ([name] if name else encodings):
+            encodings[model_name] = encoding
+    return encodings
+
+
+# Text each model scores: the markdown summary (default) or the compact
+# encoding (cardio_core.encode_compact, far fewer tokens)
+MODEL_INPUTS = parse_model_inputs(os.getenv("AIGNOSIS_MODEL_INPUTS", ""))
+
+# Load pipelines for each model (compiled artifacts if present, see model_artifacts.py);
+# with AIGNOSIS_MODEL_MEMORY_MB they are loaded on demand within that budget (model_manager.py)
+pipelines, model_manager = load_managed_pipelines(MODELS)
+if model_manager is not None:
+    register_metrics(model_manager)
+
+# Optional CPU layout for in-process inference (see cpu_scheduler.py)
+model_scheduler = None
+if CPU_LAYOUT:
+    model_scheduler = ModelScheduler(pipelines, resolve_layout(CPU_LAYOUT, pipelines))
+
+# Assessment history (see history_store.py); None when AIGNOSIS_HISTORY_DB is empty
+HISTORY_STORE = open_history_store()
+# Per-patient lab trends, stored with the history (see lab_trends.py)
+LAB_TRENDS = TrendTracker(HISTORY_STORE)
+
+# Pre-forked inference processes (see inference_workers.py); None = in-process
+inference_pool = None
+
+
+def start_inference_workers(workers=None):
+    """
+    Fork the inference worker pool after the models are loaded. Call it from
+    the entry point before the server starts its threads. No-op when the
+    worker count (AIGNOSIS_INFERENCE_WORKERS) is 0.
+    """
+    global inference_pool
+    workers = INFERENCE_WORKERS if workers is None else workers
+    if workers > 0 and inference_pool is None:
+        cpu_sets = partition_cores(detect_topology(), workers) if PIN_WORKERS else None
+        inference_pool = InferenceWorkerPool(pipelines, workers, cpu_sets=cpu_sets).start()
+        QUEUE_DEPTH.labels(queue="inference_pool").set_function(inference_pool.pending)
+        log_event(logger, logging.INFO, "inference_workers_started",
+                  workers=[w["pid"] for w in inference_pool.health()])
+    return inference_pool
+
+
+def build_model_input(summary, symptoms, history, labs):
+    """
+    What the models score for one patient: the summary text, or
+    {encoding: text} when some model reads another encoding (MODEL_INPUTS).
+    """
+    encodings = set(MODEL_INPUTS.values())
+    if encodings == {"summary"}:
+        return summary
+    texts = {"summary": summary}
+    if "compact" in encodings:
+        texts["compact"] = encode_compact(symptoms, history, labs)
+    return texts
+
+
+def _texts_by_model(model_inputs):
+    # A list of texts for all models, or {model_name: texts} with each model's encoding
+    if all(isinstance(item, str) for item in model_inputs):
+        return model_inputs
+    return {name: [item[MODEL_INPUTS[name]] for item in model_inputs] for name in pipelines}
+
+
+def predict_all_models(texts):
+    """
+    Run every model on `texts` (summary texts, or model inputs from
+    build_model_input); returns {model_name: pipeline output}.
+    """
+    texts = _texts_by_model(list(texts))
+    if inference_pool is not None and inference_pool.available():
+        try:
+            with span("model.pool", batch_size=len(texts)):
+                return inference_pool.submit(texts, batch_size=MODEL_BATCH_SIZE).result()
+        except WorkerCrashed as e:
+            # The job's worker died or hung (the pool replaces it); run this job in-process
+            log_event(logger, logging.WARNING, "inference_failover", error=str(e))
+    if model_scheduler is not None:
+        with span("model.scheduler", layout=model_scheduler.layout.name, batch_size=len(texts)):
+            return model_scheduler.predict_all(texts, batch_size=MODEL_BATCH_SIZE)
+    outputs = {}
+    for model_name, clf in pipelines.items():
+        with span("model", model=model_name, batch_size=len(texts)), MODEL_SECONDS.labels(model=model_name).time():
+            model_texts = texts[model_name] if isinstance(texts, dict) else texts
+            outputs[model_name] = clf(model_texts, batch_size=MODEL_BATCH_SIZE)
+    return outputs
+
+
+# Uploaded lab reports return fixed sample values (process_file mock data)
+# unless AIGNOSIS_MOCK_FILE=0, which extracts them with the LLM
+MOCK_FILE = os.getenv("AIGNOSIS_MOCK_FILE", "1") != "0"
+
+
+def handle_file_output(file_output, lang):
+    """
+    Process uploaded files，return file_data, file_mapping, file_section
+    """
+    file_data = None
+    file_mapping = None
+    file_section = None
+    if file_output:
+        file_data = process_file(file_output, lang, mock=MOCK_FILE)
+        if isinstance(file_data, str):
+            try:
+                file_data = json.loads(file_data)
+            except json.JSONDecodeError:
+                return None, None, f"Error processing file: {file_data}"
+    if file_data:
+        file_section = "### 上传文件内容解析" if lang == "中文" else "### File Content Analysis"
+        file_mapping = map_uploaded_file(file_data)
+        log_event(logger, logging.DEBUG, "file_mapping", file_mapping=file_mapping)
+    return file_data, file_mapping, file_section
+
+
+# ---------------------- Upload prefetch ----------------------
+# Extraction of an uploaded file (an LLM call, seconds) starts as soon as the
+# file is attached (prefetch_file, called by the UI), not when the form is
+# submitted. Extractions are keyed by file content and language, so the
+# submit reuses the pending or finished one, whatever temp path the file has.
+# AIGNOSIS_FILE_PREFETCH   0 = extract only on submit
+# AIGNOSIS_PREFETCH_FILES  extractions kept for reuse
+FILE_PREFETCH_ENABLED = os.getenv("AIGNOSIS_FILE_PREFETCH", "1") != "0"
+PREFETCH_FILES = int(os.getenv("AIGNOSIS_PREFETCH_FILES", 64))
+
+
+def _file_key(file_output, lang):
+    # Content hash of the upload (a path or a tempfile-like object with .name)
+    path = getattr(file_output, "name", file_output)
+    digest = hashlib.blake2b(digest_size=16)
+    try:
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(1 << 20), b""):
+                digest.update(chunk)
+    except (OSError, TypeError):
+        digest.update(repr(path).encode("utf-8"))
+    return digest.hexdigest(), lang
+
+
+class FilePrefetcher:
+    """
+    handle_file_output of uploaded files, run in the background and kept per
+    (content hash, language) for the `max_files` most recent files. Failed
+    extractions are not kept, so submitting again retries them.
+    """
+
+    def __init__(self, max_files=PREFETCH_FILES, workers=4):
+        self.max_files = max_files
+        self._futures = OrderedDict()    # (hash, lang) -> Future of handle_file_output
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="aignosis-prefetch")
+
+    def _future(self, file_output, lang):
+        key = _file_key(file_output, lang)
+        with self._lock:
+            future = self._futures.get(key)
+            if future is not None:
+                self._futures.move_to_end(key)
+                return future, False
+            future = self._futures[key] = self._executor.submit(handle_file_output, file_output, lang)
+            while len(self._futures) > self.max_files:
+                self._futures.popitem(last=False)
+        future.add_done_callback(functools.partial(self._forget_failed, key))
+        return future, True
+
+    def _forget_failed(self, key, future):
+        if future.exception() is None and future.result()[0] is not None:
+            return
+        with self._lock:
+            if self._futures.get(key) is future:
+                del self._futures[key]
+
+    def prefetch(self, file_output, lang):
+        """Start extracting `file_output` unless it is already extracted or being extracted."""
+        if file_output:
+            self._future(file_output, lang)
+
+    def result(self, file_output, lang):
+        """handle_file_output(file_output, lang), reusing a prefetched extraction."""
+        if not file_output:
+            return handle_file_output(file_output, lang)
+        future, started = self._future(file_output, lang)
+        FILE_PREFETCH.labels(result="miss" if started else "done" if future.done() else "pending").inc()
+        return future.result()
+
+
+FILE_PREFETCHER = FilePrefetcher() if FILE_PREFETCH_ENABLED else None
+
+
+def prefetch_file(file_output, lang):
+    """Start extracting an uploaded file in the background (call it when the file is attached)."""
+    if FILE_PREFETCHER is not None:
+        FILE_PREFETCHER.prefetch(file_output, lang)
+
+
+def run_model_predictions(summary, lang):
+    """
+    Run every model in `pipelines` on the summary text (or model input, see
+    build_model_input) and compute the weighted risk scores.
+    Returns (outputs, risk_scores) where outputs maps model name to
+    (sorted_result, result).
+    """
+    return run_model_predictions_batch([summary], lang)[0]
+
+
+def run_model_predictions_batch(summaries, lang):
+    """
+    Batched version of run_model_predictions: every model is called once for
+    all summaries. Returns one (outputs, risk_scores) per summary.
+    """
+    return score_model_outputs(predict_all_models(summaries), len(summaries), lang)
+
+
+# ---------------------- Assessment graph ----------------------
+# Every stage declares what it reads, so an edit to one form field only
+# recomputes the stages downstream of that field (see assessment_graph.py).
+ASSESSMENT_GRAPH = AssessmentGraph()
+
+
+@ASSESSMENT_GRAPH.stage("file", deps=["file_output", "lang"], io=True)
+def _stage_file(file_output, lang):
+    if FILE_PREFETCHER is not None:
+        return FILE_PREFETCHER.result(file_output, lang)
+    return handle_file_output(file_output, lang)
+
+
+@ASSESSMENT_GRAPH.stage("labs", deps=["lab_params", "file"])
+def _stage_labs(lab_params, file_result):
+    # Merge overlapping lab parameters (file values win), without touching the form values
+    file_data, file_mapping, _ = file_result
+    labs = dict(lab_params)
+    if file_data:
+        for k, v in file_mapping.items():
+            if k in labs:
+                labs[k] = v
+    return labs
+
+
+@ASSESSMENT_GRAPH.stage("lab_overrides", deps=["lab_params", "file", "lang"])
+def _stage_lab_overrides(lab_params, file_result, lang):
+    file_data, file_mapping, _ = file_result
+    overlap_keys = []
+    if file_data:
+        for k, v in file_mapping.items():
+            if k in lab_params:
+                if lang == "中文":
+                    overlap_keys.append(
+                        f"文件覆盖实验室参数： {k}:{v} 替换  {lab_params[k]}")
+                else:
+                    overlap_keys.append(
+                        f"Overriding lab parameter {k}:{v} with original value {lab_params[k]}")
+    return overlap_keys
+
+
+@ASSESSMENT_GRAPH.stage("summary", deps=["symptoms", "history", "labs", "lang"])
+def _stage_summary(symptoms, history, labs, lang):
+    return generate_summary_text(symptoms, history, labs, lang)
+
+
+@ASSESSMENT_GRAPH.stage("free_text", deps=["extra_text", "symptoms", "lang"])
+def _stage_free_text(extra_text, symptoms, lang):
+    return analyze_extra_text(extra_text, symptoms, lang)
+
+
+@ASSESSMENT_GRAPH.stage("rules", deps=["symptoms", "history", "labs", "lang"])
+def _stage_rules(symptoms, history, labs, lang):
+    return classify_cardiovascular_disease(symptoms, history, labs, lang)
+
+
+@ASSESSMENT_GRAPH.stage("model_input", deps=["summary", "symptoms", "history", "labs"])
+def _stage_model_input(summary, symptoms, history, labs):
+    return build_model_input(summary, symptoms, history, labs)
+
+
+@ASSESSMENT_GRAPH.stage("models", deps=["model_input", "lang"])
+def _stage_models(model_input, lang):
+    # Shed or time-boxed under load (admission.py); the result degrades to rules + HEART
+    return MODEL_GATE.call(run_model_predictions, model_input, lang)
+
+
+@ASSESSMENT_GRAPH.stage("heart", deps=["symptoms", "history", "labs", "lang"])
+def _stage_heart(symptoms, history, labs, lang):
+    return calculate_heart_score(symptoms, history, labs, lang)
+
+
+@ASSESSMENT_GRAPH.stage("alerts", deps=["symptoms", "history", "labs", "lang"])
+def _stage_alerts(symptoms, history, labs, lang):
+    return generate_clinical_alerts(symptoms, history, labs, lang)
+
+
+@ASSESSMENT_GRAPH.stage("trends", deps=["patient_id", "session_id", "labs", "file", "form_defaults", "lang",
+                                        "trend_version"])
+def _stage_trends(patient_id, session_id, labs, file_result, form_defaults, lang, trend_version):
+    # The patient's lab trends with this assessment's values; they are added
+    # for good when the assessment is recorded (_record_history), once per
+    # form session. trend_version changes when any session or API call adds
+    # values for the patient, so a cached preview is not reused after that
+    if patient_id is None:
+        return []
+    return LAB_TRENDS.preview(patient_id, trend_values(labs, file_result[1], form_defaults), lang,
+                              session_id=session_id)
+
+
+@ASSESSMENT_GRAPH.stage("result", deps=["models", "heart", "alerts", "rules", "summary", "extra_text", "free_text", "file", "lab_overrides", "lang", "trends"])
+def _stage_result(models, heart, alerts, rules, summary, extra_text, free_text, file_result, overlap_keys, lang, trends):
+    return build_assessment_result(models, heart, alerts, rules, summary, extra_text, free_text, file_result, overlap_keys, lang,
+                                   trends)
+
+
+@ASSESSMENT_GRAPH.stage("report", deps=["result"])
+def _stage_report(result):
+    return render_markdown(result)
+
+
+@ASSESSMENT_GRAPH.stage("llm_summary", deps=["report", "lang"], io=True)
+def _stage_llm_summary(report, lang):
+    # call openai API to summarize the output
+    return LLM_GATE.call(summarize_model_outputs, report, lang, True)
+
+
+def _graph_inputs(symptoms, history, lab_params, file_output, lang, extra_text=None, patient_id=None,
+                  session_id=None, form_defaults=None):
+    # Accept extra_text either as an argument or under the "__extra_text__" symptom key
+    if isinstance(symptoms, dict) and "__extra_text__" in symptoms:
+        symptoms = dict(symptoms)
+        extra_text = symptoms.pop("__extra_text__")
+    return {
+        "symptoms": symptoms,
+        "extra_text": extra_text,
+        "history": history,
+        "lab_params": lab_params,
+        "file_output": file_output,
+        "lang": lang,
+        "patient_id": patient_id,
+        "session_id": session_id,
+        "form_defaults": form_defaults,
+        "trend_version": LAB_TRENDS.version(patient_id) if patient_id is not None else None,
+    }
+
+
+def _complete_later(inputs, session, futures, only):
+    # Re-run the graph once the stages that missed their deadline are done
+    # (their outputs are cached by then) and publish the full payload. The
+    # re-run (which may call the LLM) goes to the IO executor, not the gate
+    # thread that finished the stage, and works on a snapshot of the session,
+    # so it never races with the user's next submit; only the stage outputs
+    # it computed are merged back.
+    pending_id = PENDING.create()
+    remaining = [len(futures)]
+    lock = threading.Lock()
+
+    def complete():
+        try:
+            background = session.snapshot()
+            values, _ = ASSESSMENT_GRAPH.run(inputs, session=background, only=only)
+            session.merge(background)
+            result = replace(values["result"], llm_summary=values.get("llm_summary"),
+                             degraded=background.last_degraded or None)
+            PENDING.resolve(pending_id, to_payload(result))
+        except Exception as e:
+            PENDING.fail(pending_id, repr(e))
+        log_event(logger, logging.INFO, "degraded_completed", pending_id=pending_id)
+
+    def done(_future):
+        with lock:
+            remaining[0] -= 1
+            if remaining[0]:
+                return
+        IO_EXECUTOR.submit(complete)
+
+    for future in futures:
+        future.add_done_callback(done)
+    return pending_id
+
+
+def _apply_degradation(inputs, session, result, only):
+    """
+    Count the request and mark the stages skipped under load on the result.
+    Stages still running past their deadline complete in the background; the
+    full result is then available under result.pending_id (see admission.PENDING)
+    and cached in the session for the next submit.
+    """
+    degraded = session.last_degraded
+    record_request(degraded)
+    if not degraded:
+        return result
+    late = [session.late[name] for name in degraded if name in session.late]
+    pending_id = _complete_later(inputs, session, late, only) if late else None
+    log_event(logger, logging.WARNING, "assessment_degraded", degraded=degraded, pending_id=pending_id)
+    return replace(result, degraded=degraded, pending_id=pending_id)
+
+
+def _record_history(inputs, values, result, timings, started):
+    # Add the lab values to the patient's trends and queue the assessment for
+    # the history store (both written in the background)
+    patient_id = inputs["patient_id"]
+    trend_states = None
+    if patient_id is not None:
+        labs = trend_values(values["labs"], values["file"][1], inputs["form_defaults"])
+        trend_states = LAB_TRENDS.observe(patient_id, labs, session_id=inputs["session_id"])
+    if HISTORY_STORE is None:
+        return
+    timings = dict(timings, total=time.perf_counter() - started)
+    HISTORY_STORE.record(history_entry(patient_id, inputs["lang"], inputs["symptoms"], inputs["history"],
+                                       values["labs"], result, timings, trend_states, values["rules"][0]))
+
+
+def analyze_structured_inputs(symptoms, history, lab_params, file_output, lang, session=None,
+                              output_format="markdown", with_summary=False, debug=False, patient_id=None,
+                              form_defaults=None):
+    """
+    Run the full assessment.
+    Pass the same `session` (AssessmentSession) on every submit of a form to
+    reuse the cached stages whose inputs did not change.
+    output_format: "markdown" for the report text (with LLM summary), or "json"
+    for a compact structured payload; the json mode skips markdown rendering
+    and, unless with_summary is set, the LLM summary.
+    debug: profile this request (cProfile and torch profiler, see
+    profiling.py); the json payload then lists the files under "profile".
+    patient_id: optional id the assessment is recorded under in the history
+    (history_store.py); the report then shows the patient's lab trends
+    (lab_trends.py).
+    form_defaults: {lab label: initial value} of the web form the labs come
+    from; lab values still at their initial value are not added to the
+    trends (see lab_trends.trend_values).
+    """
+    if debug:
+        return _profiled(analyze_structured_inputs, symptoms, history, lab_params, file_output, lang,
+                         session, output_format, with_summary, False, patient_id, form_defaults)
+    started = time.perf_counter()
+    if session is None:
+        session = AssessmentSession()
+    inputs = _graph_inputs(symptoms, history, lab_params, file_output, lang, patient_id=patient_id,
+                           session_id=session.id, form_defaults=form_defaults)
+    log_event(logger, logging.DEBUG, "assessment_inputs",
+              symptoms=inputs["symptoms"], history=history, lab_params=lab_params, lang=lang)
+
+    only = None
+    if output_format == "json":
+        only = {"result", "llm_summary"} if with_summary else {"result"}
+    with span("assessment", lang=lang, output_format=output_format):
+        values, recomputed = ASSESSMENT_GRAPH.run(inputs, session=session, only=only)
+    result = replace(values["result"], llm_summary=values.get("llm_summary"), recomputed=recomputed)
+    result = _apply_degradation(inputs, session, result, only)
+    _record_history(inputs, values, result, session.last_timings, started)
+    if output_format == "json":
+        return render_json(result)
+    log_event(logger, logging.DEBUG, "assessment_recomputed", recomputed=recomputed)
+    return values["report"] + render_markdown_tail(result)
+
+
+def _profiled(analyze, *args):
+    output_format = args[6]
+    with profile_request("assessment") as profile:
+        output = analyze(*args)
+    log_event(logger, logging.INFO, "assessment_profiled", profile_id=profile.id, files=profile.files)
+    if output_format == "json":
+        payload = json.loads(output)
+        payload["profile"] = profile.files
+        return json.dumps(payload, ensure_ascii=False, separators=(",", ":"))
+    return output
+
+
+# Executors of the async pipeline: CPU-bound stages (rules, models, rendering)
+# get one thread per concurrent request, LLM calls mostly wait on the network.
+CPU_EXECUTOR = ThreadPoolExecutor(max_workers=CONCURRENCY, thread_name_prefix="aignosis-cpu")
+IO_EXECUTOR = ThreadPoolExecutor(max_workers=int(os.getenv("AIGNOSIS_IO_THREADS", 32)), thread_name_prefix="aignosis-io")
+QUEUE_DEPTH.labels(queue="cpu_executor").set_function(lambda: CPU_EXECUTOR._work_queue.qsize())
+QUEUE_DEPTH.labels(queue="io_executor").set_function(lambda: IO_EXECUTOR._work_queue.qsize())
+
+
+def _speculative_models(inputs, session):
+    # While a new file is being extracted, score the questionnaire summary
+    # (the file may add no lab values that change it); see run_async(speculative=)
+    if inputs["file_output"] is None or ASSESSMENT_GRAPH.is_cached(session, "file", inputs):
+        return None
+    symptoms, history, lab_params, lang = inputs["symptoms"], inputs["history"], inputs["lab_params"], inputs["lang"]
+    form_summary = generate_summary_text(symptoms, history, dict(lab_params), lang)
+    form_input = build_model_input(form_summary, symptoms, history, dict(lab_params))
+    guess = {"model_input": form_input, "lang": lang}
+    if ASSESSMENT_GRAPH.is_cached(session, "models", guess):
+        return None
+    loop = asyncio.get_running_loop()
+    return {"models": (guess, loop.run_in_executor(CPU_EXECUTOR, _stage_models, form_input, lang))}
+
+
+async def analyze_structured_inputs_async(symptoms, history, lab_params, file_output, lang, session=None,
+                                          output_format="markdown", with_summary=False, debug=False,
+                                          patient_id=None, form_defaults=None):
+    """
+    Async version of analyze_structured_inputs (same arguments and output).
+    Independent stages run concurrently. When a file is uploaded, the
+    questionnaire summary is scored by the models while the file is being
+    extracted; the result is reused if the file adds no lab values that
+    change the summary.
+    With debug=True the request runs through the synchronous pipeline in a
+    worker thread and is profiled there, so the profile holds only its stages.
+    """
+    if debug:
+        return await asyncio.get_running_loop().run_in_executor(IO_EXECUTOR, functools.partial(
+            _profiled, analyze_structured_inputs, symptoms, history, lab_params, file_output, lang,
+            session, output_format, with_summary, False, patient_id, form_defaults))
+    started = time.perf_counter()
+    if session is None:
+        session = AssessmentSession()
+    inputs = _graph_inputs(symptoms, history, lab_params, file_output, lang, patient_id=patient_id,
+                           session_id=session.id, form_defaults=form_defaults)
+    log_event(logger, logging.DEBUG, "assessment_inputs",
+              symptoms=inputs["symptoms"], history=history, lab_params=lab_params, lang=lang)
+
+    only = None
+    if output_format == "json":
+        only = {"result", "llm_summary"} if with_summary else {"result"}
+    with span("assessment", lang=lang, output_format=output_format, mode="async"):
+        values, recomputed = await ASSESSMENT_GRAPH.run_async(
+            inputs, session=session, only=only, cpu_executor=CPU_EXECUTOR,
+            io_executor=IO_EXECUTOR, speculative=_speculative_models(inputs, session))
+    result = replace(values["result"], llm_summary=values.get("llm_summary"), recomputed=recomputed)
+    result = _apply_degradation(inputs, session, result, only)
+    _record_history(inputs, values, result, session.last_timings, started)
+    if output_format == "json":
+        return render_json(result)
+    log_event(logger, logging.DEBUG, "assessment_recomputed", recomputed=recomputed)
+    return values["report"] + render_markdown_tail(result)
+
+
+# Stages the preliminary report (rules, alerts, HEART score) is built from
+PRELIMINARY_STAGES = ("heart", "alerts", "rules", "summary", "free_text", "file", "lab_overrides", "trends")
+
+
+async def analyze_structured_inputs_stream(symptoms, history, lab_params, file_output, lang, session=None,
+                                           patient_id=None, form_defaults=None):
+    """
+    Progressive version of analyze_structured_inputs_async (markdown only).
+    Yields (stage, seconds since the request, markdown) as the report fills in:
+    "rules" with the rule-based findings, clinical alerts and HEART score as
+    soon as they are computed, "models" with the full report when the models
+    have scored, and "llm_summary" with the final text (the same report as
+    analyze_structured_inputs_async). Every update lists the times of the
+    updates so far; "rules" is left out when the models are already cached.
+    """
+    started = time.perf_counter()
+    if session is None:
+        session = AssessmentSession()
+    inputs = _graph_inputs(symptoms, history, lab_params, file_output, lang, patient_id=patient_id,
+                           session_id=session.id, form_defaults=form_defaults)
+    outputs = {}
+    changed = asyncio.Event()
+
+    def on_stage(name, output):
+        outputs[name] = output
+        changed.set()
+
+    timeline = []
+
+    def emit(stage, markdown):
+        elapsed = time.perf_counter() - started
+        timeline.append((stage, elapsed))
+        EMIT_SECONDS.labels(stage=stage).observe(elapsed)
+        log_event(logger, logging.INFO, "assessment_emitted", stage=stage, elapsed_ms=round(elapsed * 1000, 1))
+        return stage, elapsed, markdown + render_timeline(lang, timeline)
+
+    with span("assessment", lang=lang, output_format="markdown", mode="stream"):
+        graph = asyncio.ensure_future(ASSESSMENT_GRAPH.run_async(
+            inputs, session=session, cpu_executor=CPU_EXECUTOR, io_executor=IO_EXECUTOR,
+            speculative=_speculative_models(inputs, session), on_stage=on_stage))
+        emitted = set()
+        try:
+            while not graph.done():
+                waiter = asyncio.ensure_future(changed.wait())
+                await asyncio.wait({waiter, graph}, return_when=asyncio.FIRST_COMPLETED)
+                waiter.cancel()
+                changed.clear()
+                if ("rules" not in emitted and "result" not in outputs
+                        and all(name in outputs for name in PRELIMINARY_STAGES)):
+                    emitted.add("rules")
+                    preliminary = build_assessment_result(
+                        None, outputs["heart"], outputs["alerts"], outputs["rules"], outputs["summary"],
+                        inputs["extra_text"], outputs["free_text"], outputs["file"], outputs["lab_overrides"],
+                        lang, outputs["trends"])
+                    yield emit("rules", render_markdown(replace(preliminary, degraded=None, preliminary=True)))
+                if "models" not in emitted and "report" in outputs and not graph.done():
+                    emitted.add("models")
+                    yield emit("models", outputs["report"])
+            values, recomputed = graph.result()
+        finally:
+            graph.cancel()
+    result = replace(values["result"], llm_summary=values.get("llm_summary"), recomputed=recomputed)
+    result = _apply_degradation(inputs, session, result, None)
+    _record_history(inputs, values, result, session.last_timings, started)
+    yield emit("llm_summary", values["report"] + render_markdown_tail(result))
+
+
+def analyze_batch(requests):
+    """
+    Assess several patients at once. The pre-model stages run per patient, then
+    every model scores all summaries of a language in one batched call.
+    Each request is a dict with "symptoms", "history", "lab_params" and the
+    optional "extra_text", "lang" (default "English"), "with_summary" and
+    "patient_id" (see analyze_structured_inputs).
+    Returns one JSON payload dict (see report_renderer.to_payload) per request.
+    """
+    started = time.perf_counter()
+    prepared = []
+    timings = []    # per request: stage -> seconds
+    with span("assessment.batch", batch_size=len(requests)):
+        for request in requests:
+            session = AssessmentSession()
+            inputs = _graph_inputs(
+                request.get("symptoms") or {}, request.get("history") or {},
+                request.get("lab_params") or {}, None, request.get("lang", "English"),
+                extra_text=request.get("extra_text"), patient_id=request.get("patient_id"),
+                session_id=session.id)
+            values, _ = ASSESSMENT_GRAPH.run(inputs, session=session, only={"model_input"})
+            prepared.append((inputs, session, values))
+            timings.append(dict(session.last_timings))
+
+        by_lang = {}
+        for i, (inputs, _, _) in enumerate(prepared):
+            by_lang.setdefault(inputs["lang"], []).append(i)
+        late = {}    # request index -> Future of a batch that missed its deadline
+        for lang, indices in by_lang.items():
+            batch_start = time.perf_counter()
+            try:
+                batch = MODEL_GATE.call(
+                    run_model_predictions_batch, [prepared[i][2]["model_input"] for i in indices], lang)
+                for i in indices:
+                    timings[i]["models"] = time.perf_counter() - batch_start
+            except StageDegraded as e:
+                if e.late is not None:
+                    e.late.add_done_callback(functools.partial(_prime_batch, prepared, indices))
+                    late.update((i, e.late) for i in indices)
+                else:
+                    late.update((i, None) for i in indices)
+                continue
+            _prime_batch(prepared, indices, batch)
+
+        payloads = []
+        for i, (request, (inputs, session, _)) in enumerate(zip(requests, prepared)):
+            only = {"result", "llm_summary"} if request.get("with_summary") else {"result"}
+            values, _ = ASSESSMENT_GRAPH.run(inputs, session=session, only=only,
+                                             skip={"models"} if i in late else None)
+            if late.get(i) is not None:
+                session.late["models"] = late[i]
+            result = replace(values["result"], llm_summary=values.get("llm_summary"))
+            result = _apply_degradation(inputs, session, result, only)
+            _record_history(inputs, values, result,
+                            dict(timings[i], **session.last_timings), started)
+            payloads.append(to_payload(result))
+    return payloads
+
+
+def _prime_batch(prepared, indices, batch):
+    # Store batched model outputs in each request's session; `batch` is either
+    # the outputs or the Future of a batch that finished after its deadline
+    if isinstance(batch, Future):
+        if batch.cancelled() or batch.exception() is not None:
+            return
+        batch = batch.result()
+    for i, models in zip(indices, batch):
+        _, session, values = prepared[i]
+        ASSESSMENT_GRAPH.prime(session, "models", values, models)
+
+
+def summarize_model_outputs(model_outputs, language="中文", mock= False):
+    """
+    Summarizes model outputs and returns a formatted string.
+    Args:
+        model_outputs: list of dicts with model results
+
+    """
+    mock_chinese_text = """
+根据您提供的信息和模型分析，您的综合风险等级被评为高风险。这是由BioBERT、PubMedBERT和ClinicalBERT三个模型共同评估得出的结果，其中ClinicalBERT给出的高风险评估最高，达到0.67，而BioBERT和PubMedBERT的评估较低，分别为0.38和0.51。这可能是由于ClinicalBERT模型更侧重于临床数据的分析
+。
+
+尽管您的HEART评分为1分，属于低风险，但综合模型的加权风险分数显示您的高风险评级为0.521，因此我们建议您高度重视。
+
+根据您的症状和病史，以及实验室参数的结果，我们强烈建议您立即就医。虽然您的胸痛并未在劳累时加重，也没有表现为压迫感或紧缩感，也没有放射至 
+肩/背/下巴，也没有在休息后缓解，也没有伴随呼吸困难、恶心或呕吐、头晕或晕厥、心悸等症状，但您的胸痛持续超过5分钟并伴有冷汗，这是需要引起高
+度警惕的症状。
+
+此外，您的病史显示您患有糖尿病并且有吸烟的习惯，这都是心血管疾病的风险因素。您的实验室参数显示，您的低密度脂蛋白胆固醇和总胆固醇水平超标 
+，这也可能增加心血管疾病的风险。
+
+因此，我们建议您立即就医，并向医生详细描述您的症状、病史和实验室参数结果，以便医生能够做出准确的诊断。
+    """
+    
+
+    mock_english_text = """
+    Based on the analysis, the overall risk level for your health condition is high. This assessment is primarily derived from the evaluations of two models, PubMedBERT and ClinicalBERT, both of which have classified your condition as high risk. However, the BioBERT model suggests a moderate risk level. Despite this discrepancy, the weighted risk scores lean towards a high-risk classification.
+
+The HEART Score, a clinical tool used to evaluate the risk of major adverse cardiac events, classifies your condition as low risk. This score seems to contradict the high-risk assessment from the models. However, the HEART Score is based on a limited set of parameters and may not fully capture the complexity of your situation.
+
+Given the high risk indicated by the models, it is strongly recommended that you seek immediate medical attention. This is not a situation where waiting and observing is advisable. The symptoms you have reported, particularly chest pain lasting more than 5 minutes and accompanied by cold sweat, are concerning and warrant immediate evaluation.
+
+When you visit the doctor, be prepared to provide a detailed account of your symptoms and medical history. This includes the fact that you are a smoker and have diabetes, both of which can contribute to cardiovascular risk. Also, share the lab parameters, especially the overridden values for LDL Cholesterol, Total Cholesterol, and HDL Cholesterol. These factors will help the healthcare professionals to make 
+a comprehensive assessment of your condition.
+
+Remember, this analysis is based on the information provided and models' predictions. It is intended to support, not replace, the relationship between a patient and his/her physician. Always consult with a healthcare professional for a definitive diagnosis and treatment
+    """
+
+    if mock:
+        if language == "中文":
+            return mock_chinese_text
+        else:
+            return mock_english_text
+    else:
+        with span("llm.summary", language=language), LLM_SECONDS.labels(call="summary").time():
+            return summarize_model_outputs_llm(model_outputs, language)
+    
+
+def process_file(file, lang="English", mock=True):
+    """
+    Process the uploaded docx file and use OpenAI API to extract key-value pairs.
+    If mock is True, return a fixed JSON structure for testing.
+    """
+    if mock:
+        if lang == "中文":
+            mock_data = {
+                "癌胚抗原 (CEA)": "3.22 ng/ml (≤5)",
+                "甲胎蛋白": "3.52 ng/ml (≤7)",
+                "高密度脂蛋白胆固醇": "78.15 mg/dL (>40)",
+                "低密度脂蛋白胆固醇": "171.4 mg/dL (<130) ↑",
+                "甘油三酯": "110.7 mg/dL (<150)",
+                "总胆固醇": "266.5 mg/dL (<200) ↑",
+                "尿素": "37.64 mg/dL (18.63–52.85)",
+                "总二氧化碳": "26.8 mEq/L (22.0–29.0)",
+                "尿酸": "3.97 mg/dL (2.61–6.00)",
+                "肌酐": "0.71 mg/dL (0.46–0.92)"
+            }
+        else:
+            mock_data = {
+                "LDL Cholesterol": "84 mg/dL (Ref: < 135 mg/dL)",
+                "Total Cholesterol": "185 mg/dL (Ref: < 200 mg/dL)",
+                "HDL Cholesterol": "76 mg/dL (Ref: ≥ 40 mg/dL)",
+                "Non-HDL Cholesterol": "109 mg/dL (Ref: < 162 mg/dL)",
+                "Triglycerides": "144 mg/dL (Ref: < 150 mg/dL)",
+                "A1c": "5.4% (Ref: < 6.0%)",
+                "eGFR": "72 mL/min/1.73m² (Ref: ≥ 60)",
+                "Urea (BUN equivalent)": "23 mg/dL (Ref: ~7 – 23 mg/dL)",
+                "Iron": "67 µg/dL (Ref: 40 – 160 µg/dL)",
+                "Vitamin B12": "149 pg/mL (Ref: 148–220: Insufficiency)",
+                "PSA (Prostate Specific Antigen)": "1.68 ng/mL (Ref: < 3.5 ng/mL)",
+                "DHEAS": "148 µg/dL (Ref: ~69 – 305 µg/dL)",
+                "WBC Count": "4.1 x10⁹/L (Ref: 4.5 – 11.0 x10⁹/L)",
+                "RBC Count": "4.9 x10¹²/L (Ref: 4.4 – 5.9 x10¹²/L)",
+                "Hemoglobin": "15.2 g/dL (Ref: 14.0 – 18.0 g/dL)",
+                "Lymphocytes": "0.8 x10⁹/L (Ref: 1.0 – 3.3 x10⁹/L)",
+                "Ferritin": "473 ng/mL (Ref: > 220 ng/mL)",
+                "Platelets": "170 x10⁹/L (Ref: 140 – 440 x10⁹/L)"
+            }
+        
+        return json.dumps(mock_data, indent=2, ensure_ascii=False)
+    if file is None:
+        return "No file uploaded."
+    try:
+        # Save uploaded file to a temp path
+        temp_path = file.name
+        with span("llm.extract"), LLM_SECONDS.labels(call="extract").time():
+            result = extract_key_value_pairs(temp_path)
+        if result is None:
+            return "Could not extract key-value pairs. See logs for details."
+        # Pretty print JSON result
+        return json.dumps(result, indent=2, ensure_ascii=False)
+    except Exception as e:
+        return f"Error processing file: {e}"
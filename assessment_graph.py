@@ -0,0 +1,291 @@
+import asyncio
+import contextvars
+import copy
+import functools
+import hashlib
+import json
+import threading
+import time
+import uuid
+
+from admission import StageDegraded
+from metrics import ERRORS, STAGE_CACHE, STAGE_SECONDS
+from profiling import wrap
+from tracing import span
+
+
+def fingerprint(value):
+    """
+    Stable fingerprint of a stage input or output, used to decide whether a
+    cached stage result can be reused.
+    Uploaded files are identified by their temp path (Gradio gives every upload
+    a unique path), everything else by its JSON/repr form.
+    """
+    def default(obj):
+        name = getattr(obj, "name", None)
+        if isinstance(name, str):
+            return f"<file {name}>"
+        return repr(obj)
+
+    payload = json.dumps(value, sort_keys=True, ensure_ascii=False, default=default)
+    return hashlib.blake2b(payload.encode("utf-8"), digest_size=16).hexdigest()
+
+
+class AssessmentGraph:
+    """
+    Dependency-tracked assessment pipeline.
+    Each stage declares the inputs / upstream stages it reads; its output is
+    cached together with the fingerprint of those dependencies, so a re-run only
+    recomputes the stages whose dependencies actually changed.
+    """
+
+    def __init__(self):
+        self.stages = {}
+        self.order = []
+        self.io_stages = set()
+
+    def stage(self, name, deps, io=False):
+        """
+        Register a stage. Stages must be registered after the stages they depend on.
+        io=True marks stages that mostly wait on the network (LLM calls); the
+        async runner gives them their own executor.
+        """
+        def register(fn):
+            self.stages[name] = (fn, tuple(deps))
+            self.order.append(name)
+            if io:
+                self.io_stages.add(name)
+            return fn
+        return register
+
+    def run(self, inputs, session=None, only=None, skip=None):
+        """
+        Run the graph for the given inputs.
+        Args:
+            inputs: dict of graph inputs (symptoms, lab_params, lang, ...)
+            session: AssessmentSession holding cached stage outputs, or None for a cold run
+            only: optional set of stage names to evaluate (plus their dependencies)
+            skip: optional set of stage names to treat as degraded (value None)
+        Returns:
+            (values, recomputed): all input and stage values, and the names of
+            the stages that were recomputed in this run (their durations are
+            in session.last_timings)
+        A stage that raises StageDegraded (see admission.py) gets the value
+        None and is listed in session.last_degraded; downstream stages must
+        accept None for it.
+        """
+        if session is None:
+            session = AssessmentSession()
+        wanted = self._closure(only) if only is not None else None
+        values = dict(inputs)
+        recomputed = []
+        degraded = []
+        timings = {}
+        session.late = {}
+        for name in self.order:
+            if wanted is not None and name not in wanted:
+                continue
+            fn, deps = self.stages[name]
+            args = [values[d] for d in deps]
+            key = fingerprint(args)
+            cached = session.cache.get(name)
+            if cached is not None and cached[0] == key:
+                STAGE_CACHE.labels(stage=name, result="hit").inc()
+                values[name] = cached[1]
+                continue
+            if skip and name in skip:
+                values[name] = None
+                degraded.append(name)
+                continue
+            STAGE_CACHE.labels(stage=name, result="miss").inc()
+            start = time.perf_counter()
+            try:
+                with span(f"stage.{name}"), STAGE_SECONDS.labels(stage=name).time():
+                    values[name] = fn(*args)
+            except StageDegraded as e:
+                values[name] = None
+                degraded.append(name)
+                self._adopt_late(session, name, key, e.late)
+                continue
+            except Exception:
+                ERRORS.labels(where=f"stage.{name}").inc()
+                raise
+            session.store(name, key, values[name])
+            recomputed.append(name)
+            timings[name] = time.perf_counter() - start
+        session.last_recomputed = recomputed
+        session.last_degraded = degraded
+        session.last_timings = timings
+        return values, recomputed
+
+    def _adopt_late(self, session, name, key, late):
+        # Cache the output of a stage that finished after its deadline, so the
+        # next run of the session picks it up
+        if late is None:
+            return
+        session.late[name] = late
+
+        def store(future):
+            if not future.cancelled() and future.exception() is None:
+                session.store(name, key, future.result())
+        late.add_done_callback(store)
+
+    async def run_async(self, inputs, session=None, only=None, cpu_executor=None, io_executor=None,
+                        speculative=None, on_stage=None):
+        """
+        Async version of run(): every stage starts as soon as its dependencies
+        are available, so independent branches (e.g. the file extraction LLM
+        call and the model scoring) overlap and the latency approaches the
+        longest branch. Stage functions run in cpu_executor, or io_executor for
+        io stages (None = the loop's default executor).
+        speculative: optional {stage: (dep_values, awaitable)} results started
+        early from guessed dependencies; used when the real dependencies have
+        the same fingerprint, otherwise the stage is computed normally.
+        on_stage: optional on_stage(name, output), called on the event loop as
+        soon as each stage's output is available (cached or computed), e.g. to
+        show partial results.
+        Returns (values, recomputed) like run().
+        """
+        if session is None:
+            session = AssessmentSession()
+        wanted = self._closure(only) if only is not None else None
+        speculative = speculative or {}
+        loop = asyncio.get_running_loop()
+        values = dict(inputs)
+        recomputed = []
+        degraded = []
+        timings = {}
+        session.late = {}
+        tasks = {}
+
+        async def evaluate(name):
+            fn, deps = self.stages[name]
+            args = [(await tasks[d]) if d in tasks else values[d] for d in deps]
+            key = fingerprint(args)
+            cached = session.cache.get(name)
+            if cached is not None and cached[0] == key:
+                STAGE_CACHE.labels(stage=name, result="hit").inc()
+                return cached[1]
+            STAGE_CACHE.labels(stage=name, result="miss").inc()
+            guess = speculative.get(name)
+            start = time.perf_counter()
+            try:
+                with span(f"stage.{name}"), STAGE_SECONDS.labels(stage=name).time():
+                    if guess is not None and fingerprint([guess[0][d] for d in deps]) == key:
+                        output = await guess[1]
+                    else:
+                        executor = io_executor if name in self.io_stages else cpu_executor
+                        # Carry the current span into the executor thread
+                        call = functools.partial(contextvars.copy_context().run, wrap(fn), *args)
+                        output = await loop.run_in_executor(executor, call)
+            except StageDegraded as e:
+                degraded.append(name)
+                self._adopt_late(session, name, key, e.late)
+                return None
+            except Exception:
+                ERRORS.labels(where=f"stage.{name}").inc()
+                raise
+            session.store(name, key, output)
+            recomputed.append(name)
+            timings[name] = time.perf_counter() - start
+            return output
+
+        async def evaluate_and_report(name):
+            output = await evaluate(name)
+            if on_stage is not None:
+                on_stage(name, output)
+            return output
+
+        for name in self.order:
+            if wanted is None or name in wanted:
+                tasks[name] = asyncio.ensure_future(evaluate_and_report(name))
+        try:
+            for name, task in tasks.items():
+                values[name] = await task
+        finally:
+            for task in tasks.values():
+                task.cancel()
+        recomputed.sort(key=self.order.index)
+        degraded.sort(key=self.order.index)
+        session.last_recomputed = recomputed
+        session.last_degraded = degraded
+        session.last_timings = {name: timings[name] for name in recomputed}
+        return values, recomputed
+
+    def is_cached(self, session, name, values):
+        """
+        True if the session holds an output of `name` for these dependency values.
+        """
+        _, deps = self.stages[name]
+        cached = session.cache.get(name) if session is not None else None
+        return cached is not None and cached[0] == fingerprint([values[d] for d in deps])
+
+    def prime(self, session, name, values, output):
+        """
+        Store an externally computed output for a stage (e.g. from a batched
+        model call) so the next run reuses it. `values` must hold the stage's
+        dependencies.
+        """
+        _, deps = self.stages[name]
+        session.store(name, fingerprint([values[d] for d in deps]), output)
+
+    def _closure(self, names):
+        wanted = set()
+        pending = list(names)
+        while pending:
+            name = pending.pop()
+            if name in wanted or name not in self.stages:
+                continue
+            wanted.add(name)
+            pending.extend(self.stages[name][1])
+        return wanted
+
+
+class AssessmentSession:
+    """
+    Per-user cache of stage outputs (one per Gradio session).
+    """
+
+    def __init__(self):
+        self.id = uuid.uuid4().hex  # identifies the form session (lab trends add one point per session)
+        self.cache = {}
+        self.last_recomputed = []
+        self.last_degraded = []
+        self.last_timings = {}   # stage -> seconds, of the stages recomputed in the last run
+        self.late = {}       # stage -> Future of a stage still running past its deadline
+        self.lock = threading.Lock()   # guards cache writes from other threads (late stages)
+        self._base = None    # cache entries of the session a snapshot was taken from
+
+    def store(self, name, key, output):
+        with self.lock:
+            self.cache[name] = (key, output)
+
+    def snapshot(self):
+        """
+        Copy of the session for a run outside the request (e.g. completing a
+        degraded result in the background); merge() its outputs back.
+        """
+        with self.lock:
+            other = copy.copy(self)
+            other.cache = dict(self.cache)
+            other._base = dict(self.cache)
+        other.last_recomputed, other.last_degraded, other.last_timings, other.late = [], [], {}, {}
+        other.lock = threading.Lock()
+        return other
+
+    def merge(self, other):
+        """
+        Adopt the stages `other` (a snapshot) recomputed in its last run,
+        unless this session has cached another output for them since.
+        """
+        with self.lock:
+            for name in other.last_recomputed:
+                if self.cache.get(name) is other._base.get(name):
+                    self.cache[name] = other.cache[name]
+
+    def clear(self):
+        self.cache.clear()
+        self.last_recomputed = []
+        self.last_degraded = []
+        self.last_timings = {}
+        self.late = {}
@@ -0,0 +1 @@
+# Reproducible benchmarks on synthetic patients (see bench.py)
@@ -0,0 +1,223 @@
+import argparse
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from benchmarks.synthetic import generate_lab_reports, generate_model_outputs, generate_patients
+
+# Stage benchmark: latency and throughput of every assessment stage on
+# synthetic patients, at several concurrency levels, written to JSON so two
+# runs can be compared. Run from the repository root:
+#
+#   python -m benchmarks.bench --patients 200 --concurrency 1,4,16 --output base.json
+#   python -m benchmarks.bench --compare base.json new.json
+#
+# The rules stages only need the standard library; "models" and "assess"
+# load the models (through assessment.py), "docx" needs python-docx.
+CORE_STAGES = ["summary", "rules", "heart", "alerts", "free_text", "render"]
+MODEL_STAGES = ["models", "assess"]
+ALL_STAGES = CORE_STAGES + ["docx"] + MODEL_STAGES
+
+
+def _prepare(patients, seed):
+    """
+    Per-patient arguments of the stages that need more than the form
+    input: the summary text and an AssessmentResult from fixed random model
+    outputs (for "render").
+    """
+    from cardio_core import (analyze_extra_text, build_assessment_result, calculate_heart_score,
+                             classify_cardiovascular_disease, generate_clinical_alerts, generate_summary_text,
+                             score_model_outputs)
+    rng = random.Random(seed)
+    for p in patients:
+        symptoms, history, labs, lang = p["symptoms"], p["history"], p["lab_params"], p["lang"]
+        p["summary"] = generate_summary_text(symptoms, history, labs, lang)
+        outputs = generate_model_outputs(rng)
+        models = score_model_outputs({name: [out] for name, out in outputs.items()}, 1, lang)[0]
+        extra = symptoms.get("__extra_text__", "")
+        p["result"] = build_assessment_result(
+            models, calculate_heart_score(symptoms, history, labs, lang),
+            generate_clinical_alerts(symptoms, history, labs, lang),
+            classify_cardiovascular_disease(symptoms, history, labs, lang),
+            p["summary"], extra, analyze_extra_text(extra, symptoms, lang), ({}, {}, None), [], lang)
+
+
+def stage_functions(stages):
+    """
+    {stage name: fn(patient)} for the requested stages; heavy modules are
+    imported only for the stages that need them.
+    """
+    import cardio_core
+    from report_renderer import render_markdown
+    fns = {
+        "summary": lambda p: cardio_core.generate_summary_text(p["symptoms"], p["history"], p["lab_params"], p["lang"]),
+        "rules": lambda p: cardio_core.classify_cardiovascular_disease(p["symptoms"], p["history"], p["lab_params"], p["lang"]),
+        "heart": lambda p: cardio_core.calculate_heart_score(p["symptoms"], p["history"], p["lab_params"], p["lang"]),
+        "alerts": lambda p: cardio_core.generate_clinical_alerts(p["symptoms"], p["history"], p["lab_params"], p["lang"]),
+        "free_text": lambda p: cardio_core.analyze_extra_text(p["symptoms"].get("__extra_text__", ""), p["symptoms"], p["lang"]),
+        "render": lambda p: render_markdown(p["result"]),
+    }
+    if "docx" in stages:
+        from process_file import load_docx_text
+        fns["docx"] = lambda p: load_docx_text(p["file"])
+    if "models" in stages or "assess" in stages:
+        import assessment
+        fns["models"] = lambda p: assessment.predict_all_models([p["summary"]])
+        # Whole assessment without file and LLM summary, fresh session every call
+        fns["assess"] = lambda p: assessment.analyze_structured_inputs(
+            dict(p["symptoms"]), dict(p["history"]), dict(p["lab_params"]), None, p["lang"])
+    return {name: fns[name] for name in stages}
+
+
+def _percentile(sorted_values, q):
+    index = min(len(sorted_values) - 1, max(0, round(q * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+def measure(fn, patients, concurrency, warmup=5):
+    """
+    Call fn once per patient from `concurrency` threads.
+    Returns throughput (calls/s) and latency percentiles (ms).
+    """
+    for p in patients[:warmup]:
+        fn(p)
+
+    def timed(p):
+        start = time.perf_counter()
+        fn(p)
+        return time.perf_counter() - start
+
+    start = time.perf_counter()
+    if concurrency == 1:
+        latencies = [timed(p) for p in patients]
+    else:
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            latencies = list(executor.map(timed, patients))
+    elapsed = time.perf_counter() - start
+    latencies.sort()
+    ms = [t * 1000 for t in latencies]
+    return {
+        "concurrency": concurrency,
+        "calls": len(patients),
+        "throughput": round(len(patients) / elapsed, 2),
+        "latency_ms": {
+            "mean": round(statistics.fmean(ms), 4),
+            "p50": round(_percentile(ms, 0.50), 4),
+            "p95": round(_percentile(ms, 0.95), 4),
+            "p99": round(_percentile(ms, 0.99), 4),
+            "max": round(ms[-1], 4),
+        },
+    }
+
+
+def _environment():
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=root,
+                                capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        "commit": commit,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": len(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else os.cpu_count(),
+        "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+    }
+
+
+def run_benchmarks(stages=CORE_STAGES, patients=200, concurrency=(1, 4, 16), seed=0, docx_dir=None, rounds=3):
+    """
+    Benchmark `stages` on `patients` synthetic patients at every concurrency
+    level, keeping the fastest of `rounds` runs (the rules stages take
+    microseconds, so single runs are noisy). Returns the JSON-ready report.
+    """
+    cohort = generate_patients(patients, seed)
+    if "docx" in stages:
+        generate_lab_reports(cohort, docx_dir or tempfile.mkdtemp(prefix="aignosis-bench-"), seed)
+    _prepare(cohort, seed)
+    fns = stage_functions(stages)
+    results = {}
+    for name, fn in fns.items():
+        results[name] = [
+            max((measure(fn, cohort, level) for _ in range(rounds)), key=lambda r: r["throughput"])
+            for level in concurrency
+        ]
+        best = max(results[name], key=lambda r: r["throughput"])
+        print(f"{name:10s} p50={results[name][0]['latency_ms']['p50']:9.3f} ms  "
+              f"best={best['throughput']:10.1f}/s at concurrency {best['concurrency']}")
+    return {
+        "environment": _environment(),
+        "config": {"patients": patients, "seed": seed, "concurrency": list(concurrency),
+                   "rounds": rounds, "stages": list(stages)},
+        "results": results,
+    }
+
+
+def compare(baseline, current, threshold=0.10):
+    """
+    Compare two reports stage by stage and concurrency by concurrency.
+    Returns rows with the relative change of p50 latency and throughput;
+    a row is a regression when either got worse by more than `threshold`.
+    """
+    rows = []
+    for stage, runs in current["results"].items():
+        before = {r["concurrency"]: r for r in baseline["results"].get(stage, [])}
+        for run in runs:
+            old = before.get(run["concurrency"])
+            if old is None:
+                continue
+            p50 = run["latency_ms"]["p50"] / old["latency_ms"]["p50"] - 1 if old["latency_ms"]["p50"] else 0.0
+            throughput = run["throughput"] / old["throughput"] - 1 if old["throughput"] else 0.0
+            rows.append({
+                "stage": stage,
+                "concurrency": run["concurrency"],
+                "p50_change": round(p50, 4),
+                "throughput_change": round(throughput, 4),
+                "regression": p50 > threshold or throughput < -threshold,
+            })
+    return rows
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the assessment stages on synthetic patients")
+    parser.add_argument("--stages", default=",".join(CORE_STAGES),
+                        help=f"comma-separated, from {','.join(ALL_STAGES)} (or 'all')")
+    parser.add_argument("--patients", type=int, default=200)
+    parser.add_argument("--concurrency", default="1,4,16", help="comma-separated thread counts")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--rounds", type=int, default=3, help="runs per stage and concurrency, fastest kept")
+    parser.add_argument("--docx-dir", help="where to write the synthetic lab reports (default: a temp dir)")
+    parser.add_argument("--output", help="write the report as JSON to this file")
+    parser.add_argument("--compare", nargs=2, metavar=("BASELINE", "CURRENT"), help="compare two reports")
+    parser.add_argument("--threshold", type=float, default=0.10, help="relative change counted as a regression")
+    args = parser.parse_args()
+
+    if args.compare:
+        with open(args.compare[0], encoding="utf-8") as f:
+            baseline = json.load(f)
+        with open(args.compare[1], encoding="utf-8") as f:
+            current = json.load(f)
+        rows = compare(baseline, current, args.threshold)
+        for row in rows:
+            flag = "REGRESSION" if row["regression"] else ""
+            print(f"{row['stage']:10s} c={row['concurrency']:<4d} p50 {row['p50_change']:+8.1%}  "
+                  f"throughput {row['throughput_change']:+8.1%}  {flag}")
+        sys.exit(1 if any(row["regression"] for row in rows) else 0)
+
+    stages = ALL_STAGES if args.stages == "all" else [s.strip() for s in args.stages.split(",") if s.strip()]
+    unknown = set(stages) - set(ALL_STAGES)
+    if unknown:
+        parser.error(f"unknown stages: {', '.join(sorted(unknown))}")
+    levels = [int(c) for c in args.concurrency.split(",")]
+    report = run_benchmarks(stages, args.patients, levels, args.seed, args.docx_dir, args.rounds)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
@@ -0,0 +1,128 @@
+import argparse
+import json
+import statistics
+import time
+
+from benchmarks.synthetic import generate_patients
+
+# Model input encodings compared on synthetic patients: the markdown summary
+# the models read by default and the compact encoding
+# (cardio_core.encode_compact, AIGNOSIS_MODEL_INPUTS=compact). For every
+# model it reports the token count per text, the scoring latency and how far
+# the predictions move (probability drift) when switching to the compact text.
+# Run from the repository root (loads the models):
+#
+#   python -m benchmarks.encodings --patients 200 --output encodings.json
+BASELINE = "summary"
+
+
+def encode_patients(patients):
+    """{encoding: [text per patient]} for the summary and compact encodings."""
+    from cardio_core import encode_compact, generate_summary_text
+    texts = {"summary": [], "compact": []}
+    for p in patients:
+        # As in the assessment graph, free text is not part of the model input
+        symptoms = {q: a for q, a in p["symptoms"].items() if q != "__extra_text__"}
+        texts["summary"].append(generate_summary_text(symptoms, p["history"], p["lab_params"], p["lang"]))
+        texts["compact"].append(encode_compact(symptoms, p["history"], p["lab_params"]))
+    return texts
+
+
+def token_counts(clf, texts):
+    """Tokens per text (without truncation) with the model's own tokenizer, or words without one."""
+    tokenizer = getattr(clf, "tokenizer", None)
+    if tokenizer is None:
+        return [len(t.split()) for t in texts]
+    return [len(tokenizer(t, truncation=False)["input_ids"]) for t in texts]
+
+
+def _label_scores(prediction):
+    # {label: score} of one pipeline output (top-1 dict or top_k list)
+    if isinstance(prediction, dict):
+        prediction = [prediction]
+    return {p["label"]: p["score"] for p in prediction}
+
+
+def drift(baseline, current):
+    """
+    How the predictions on the compact text differ from the summary ones:
+    share of texts with the same top label, and the mean and max absolute
+    change of the baseline top label's probability.
+    """
+    same, deltas = 0, []
+    for before, after in zip(baseline, current):
+        before, after = _label_scores(before), _label_scores(after)
+        top = max(before, key=before.get)
+        same += top == max(after, key=after.get)
+        # Labels missing from a top-1 output are bounded by 1 - its score; count them as 0
+        deltas.append(abs(before[top] - after.get(top, 0.0)))
+    return {
+        "top_label_agreement": round(same / len(baseline), 4),
+        "mean_abs_prob_change": round(statistics.fmean(deltas), 4),
+        "max_abs_prob_change": round(max(deltas), 4),
+    }
+
+
+def _time_model(clf, texts, batch_size, rounds):
+    best, outputs = None, None
+    for _ in range(rounds):
+        start = time.perf_counter()
+        outputs = clf(texts, batch_size=batch_size)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, outputs
+
+
+def compare_encodings(pipelines, patients, batch_size=8, rounds=3):
+    """Token counts, latency and drift of every encoding for every model in `pipelines`."""
+    texts = encode_patients(patients)
+    report = {"patients": len(patients), "batch_size": batch_size, "models": {}}
+    for name, clf in pipelines.items():
+        clf(texts[BASELINE][:batch_size], batch_size=batch_size)  # warm-up
+        model_report, outputs = {}, {}
+        for encoding, encoded in texts.items():
+            tokens = token_counts(clf, encoded)
+            seconds, outputs[encoding] = _time_model(clf, encoded, batch_size, rounds)
+            model_report[encoding] = {
+                "mean_tokens": round(statistics.fmean(tokens), 1),
+                "max_tokens": max(tokens),
+                "ms_per_text": round(seconds / len(encoded) * 1000, 3),
+                "texts_per_second": round(len(encoded) / seconds, 2),
+            }
+        for encoding in texts:
+            if encoding != BASELINE:
+                base = model_report[BASELINE]
+                model_report[encoding]["token_ratio"] = round(model_report[encoding]["mean_tokens"] / base["mean_tokens"], 3)
+                model_report[encoding]["speedup"] = round(base["ms_per_text"] / model_report[encoding]["ms_per_text"], 2)
+                model_report[encoding]["drift"] = drift(outputs[BASELINE], outputs[encoding])
+        report["models"][name] = model_report
+    return report
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compare the model input encodings on synthetic patients")
+    parser.add_argument("--patients", type=int, default=200)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--batch", type=int, default=8, help="texts per forward pass")
+    parser.add_argument("--rounds", type=int, default=3, help="runs per model and encoding, fastest kept")
+    parser.add_argument("--output", help="write the report as JSON to this file")
+    args = parser.parse_args(argv)
+
+    from model_artifacts import load_pipelines
+    report = compare_encodings(load_pipelines(), generate_patients(args.patients, args.seed), args.batch, args.rounds)
+    for name, encodings in report["models"].items():
+        for encoding, r in encodings.items():
+            line = (f"{name:14s} {encoding:8s} tokens={r['mean_tokens']:6.1f} (max {r['max_tokens']:4d})  "
+                    f"{r['ms_per_text']:8.3f} ms/text")
+            if "drift" in r:
+                d = r["drift"]
+                line += (f"  x{r['speedup']:.2f}  agreement={d['top_label_agreement']:.1%}  "
+                         f"mean |dp|={d['mean_abs_prob_change']:.4f}")
+            print(line)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,295 @@
+import argparse
+import http.client
+import json
+import random
+import statistics
+import sys
+import tempfile
+import threading
+import time
+import urllib.parse
+from concurrent.futures import ThreadPoolExecutor
+
+from benchmarks.bench import _environment, _percentile
+from benchmarks.synthetic import (HISTORY_QUESTIONS, LAB_FIELDS, SYMPTOM_QUESTIONS, YES_NO,
+                                  generate_lab_reports, generate_patients)
+
+# Load generator for the running app: synthetic user sessions arrive as a
+# Poisson process at each of several rates, against the JSON API
+# (http_api.py) or the Gradio app (comparemodel.py, its /assess_zh and
+# /assess_en endpoints through gradio_client). Run from the repository root:
+#
+#   python -m benchmarks.loadgen --target http://127.0.0.1:8080 --rates 1,2,4,8 --duration 60 --output load.json
+#   python -m benchmarks.loadgen --target http://127.0.0.1:7860 --gradio --mix questionnaire=5,free_text=3,file=2
+#
+# A session is one submit and, with probability --resubmit, more submits
+# after changing one answer (a user correcting the form). Latency is
+# measured from the scheduled arrival, so time spent waiting for a free
+# client thread counts (no coordinated omission). File sessions upload a
+# synthetic lab report and need the Gradio target; the JSON API has no
+# upload.
+SESSION_KINDS = ("questionnaire", "free_text", "file")
+DEFAULT_MIX = {"questionnaire": 0.6, "free_text": 0.3, "file": 0.1}
+
+
+def parse_mix(text):
+    """'questionnaire=6,free_text=3,file=1' -> normalized weights."""
+    mix = {}
+    for part in text.split(","):
+        kind, _, weight = part.partition("=")
+        if kind.strip() not in SESSION_KINDS:
+            raise ValueError(f"unknown session kind {kind!r} (use {', '.join(SESSION_KINDS)})")
+        mix[kind.strip()] = float(weight or 1)
+    total = sum(mix.values())
+    return {kind: weight / total for kind, weight in mix.items()}
+
+
+def build_sessions(count, mix, seed=0, resubmit=0.0, docx_dir=None):
+    """
+    `count` synthetic sessions: {"kind", "submits": [patient, ...]}.
+    """
+    rng = random.Random(seed)
+    patients = generate_patients(count, seed)
+    kinds = rng.choices(list(mix), weights=list(mix.values()), k=count)
+    with_file = [p for p, kind in zip(patients, kinds) if kind == "file"]
+    if with_file:
+        generate_lab_reports(with_file, docx_dir or tempfile.mkdtemp(prefix="aignosis-load-"), seed)
+    sessions = []
+    for patient, kind in zip(patients, kinds):
+        if kind == "questionnaire":
+            patient["symptoms"]["__extra_text__"] = ""
+        elif kind == "free_text" and not patient["symptoms"]["__extra_text__"]:
+            patient["symptoms"]["__extra_text__"] = "chest pain and cold sweat" if patient["lang"] == "English" else "胸痛，冷汗"
+        submits = [patient]
+        while rng.random() < resubmit:
+            edited = json.loads(json.dumps(submits[-1]))
+            yes, no = YES_NO[patient["lang"]]
+            question = rng.choice(SYMPTOM_QUESTIONS[patient["lang"]])
+            edited["symptoms"][question] = no if edited["symptoms"][question] == yes else yes
+            submits.append(edited)
+        sessions.append({"kind": kind, "submits": submits})
+    return sessions
+
+
+class HttpTarget:
+    """POST /v1/assess on the JSON API, one keep-alive connection per thread."""
+    name = "http"
+
+    def __init__(self, url, timeout=120):
+        parsed = urllib.parse.urlsplit(url)
+        self.host, self.port = parsed.hostname, parsed.port or 80
+        self.timeout = timeout
+        self._local = threading.local()
+
+    def _connection(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self._local.conn = http.client.HTTPConnection(self.host, self.port, timeout=self.timeout)
+        return conn
+
+    def supports(self, kind):
+        return kind != "file"
+
+    def submit(self, patient):
+        body = json.dumps({
+            "lang": patient["lang"],
+            "symptoms": {q: a for q, a in patient["symptoms"].items() if q != "__extra_text__"},
+            "history": patient["history"],
+            "lab_params": patient["lab_params"],
+            "extra_text": patient["symptoms"].get("__extra_text__", ""),
+        }, ensure_ascii=False).encode("utf-8")
+        conn = self._connection()
+        try:
+            conn.request("POST", "/v1/assess", body, {"Content-Type": "application/json"})
+            resp = conn.getresponse()
+            payload = resp.read()
+        except (OSError, http.client.HTTPException):
+            self._local.conn = None
+            conn.close()
+            raise
+        if resp.status != 200:
+            raise RuntimeError(f"HTTP {resp.status}")
+        return "degraded" in json.loads(payload)
+
+
+class GradioTarget:
+    """The submit endpoint of the Gradio app, one gradio_client per thread."""
+    name = "gradio"
+
+    def __init__(self, url):
+        self.url = url
+        self._local = threading.local()
+
+    def _client(self):
+        client = getattr(self._local, "client", None)
+        if client is None:
+            from gradio_client import Client
+            client = self._local.client = Client(self.url, verbose=False)
+        return client
+
+    def supports(self, kind):
+        return True
+
+    def submit(self, patient):
+        from gradio_client import handle_file
+        lang = patient["lang"]
+        no = YES_NO[lang][1]
+        symptoms, history, labs = patient["symptoms"], patient["history"], patient["lab_params"]
+        lab_labels = [chinese if lang == "中文" else english for english, chinese, *_ in LAB_FIELDS]
+        inputs = (
+            [symptoms.get(q, no) for q in SYMPTOM_QUESTIONS[lang]]
+            + [symptoms.get("__extra_text__", "")]
+            + [history.get(q, no) for q in HISTORY_QUESTIONS[lang]]
+            + [labs.get(label, 0) for label in lab_labels]
+            + [handle_file(patient["file"]) if patient.get("file") else None]
+            + [patient.get("patient_id", "")]
+        )
+        result = self._client().predict(*inputs, api_name="/assess_zh" if lang == "中文" else "/assess_en")
+        text = result[0] if isinstance(result, (list, tuple)) else result
+        return "⏳" in str(text)
+
+
+def run_rate(target, sessions, rate, duration, max_in_flight=256, seed=0):
+    """
+    Start sessions as a Poisson process of `rate` sessions/s for `duration`
+    seconds (cycling through `sessions`). Returns the measurements.
+    """
+    rng = random.Random(seed)
+    arrivals, t = [], 0.0
+    while True:
+        t += rng.expovariate(rate)
+        if t >= duration:
+            break
+        arrivals.append(t)
+    samples = []          # (kind, latency seconds, ok, degraded)
+    lock = threading.Lock()
+
+    def run_session(session, scheduled):
+        for i, patient in enumerate(session["submits"]):
+            start = scheduled if i == 0 else time.perf_counter()
+            ok, degraded = True, False
+            try:
+                degraded = target.submit(patient)
+            except Exception:
+                ok = False
+            with lock:
+                samples.append((session["kind"], time.perf_counter() - start, ok, degraded))
+            if not ok:
+                break
+
+    usable = [s for s in sessions if target.supports(s["kind"])]
+    if not usable:
+        raise ValueError(f"no session kind of the mix is supported by the {target.name} target")
+    begin = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=max_in_flight) as executor:
+        for i, offset in enumerate(arrivals):
+            scheduled = begin + offset
+            wait = scheduled - time.perf_counter()
+            if wait > 0:
+                time.sleep(wait)
+            executor.submit(run_session, usable[i % len(usable)], scheduled)
+    elapsed = time.perf_counter() - begin
+    return summarize(samples, rate, len(arrivals), arrivals[-1] if arrivals else duration, elapsed)
+
+
+def _latency_summary(latencies):
+    if not latencies:
+        return None
+    ms = sorted(t * 1000 for t in latencies)
+    return {
+        "mean": round(statistics.fmean(ms), 1),
+        "p50": round(_percentile(ms, 0.50), 1),
+        "p95": round(_percentile(ms, 0.95), 1),
+        "p99": round(_percentile(ms, 0.99), 1),
+        "max": round(ms[-1], 1),
+    }
+
+
+def summarize(samples, rate, sessions, arrival_span, elapsed):
+    """
+    Latency and error statistics of one rate step. offered_request_rate
+    counts resubmits, throughput is the rate of successful requests until
+    the last one finished (it falls behind when requests queue up).
+    """
+    ok = [s for s in samples if s[2]]
+    by_kind = {}
+    for kind in SESSION_KINDS:
+        kind_samples = [s for s in samples if s[0] == kind]
+        if kind_samples:
+            by_kind[kind] = {
+                "requests": len(kind_samples),
+                "errors": sum(1 for s in kind_samples if not s[2]),
+                "latency_ms": _latency_summary([s[1] for s in kind_samples if s[2]]),
+            }
+    return {
+        "offered_rate": rate,
+        "sessions": sessions,
+        "requests": len(samples),
+        "offered_request_rate": round(len(samples) / max(arrival_span, 1e-9), 2),
+        "throughput": round(len(ok) / elapsed, 2),
+        "drain_seconds": round(elapsed - arrival_span, 3),
+        "error_rate": round(1 - len(ok) / len(samples), 4) if samples else 0.0,
+        "degraded_rate": round(sum(1 for s in ok if s[3]) / len(ok), 4) if ok else 0.0,
+        "latency_ms": _latency_summary([s[1] for s in ok]),
+        "by_kind": by_kind,
+    }
+
+
+def saturation_point(steps, slo_ms=None, max_error_rate=0.01):
+    """
+    The first offered rate the app could not keep up with: throughput below
+    90% of the offered request rate, too many errors, or p95 above slo_ms.
+    None when every step was served.
+    """
+    for step in steps:
+        p95 = (step["latency_ms"] or {}).get("p95")
+        if (step["throughput"] < 0.9 * step["offered_request_rate"] or step["error_rate"] > max_error_rate
+                or (slo_ms is not None and (p95 is None or p95 > slo_ms))):
+            return step["offered_rate"]
+    return None
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Drive the running app with synthetic user sessions")
+    parser.add_argument("--target", default="http://127.0.0.1:8080", help="base URL of the app")
+    parser.add_argument("--gradio", action="store_true", help="the target is the Gradio app (default: JSON API)")
+    parser.add_argument("--rates", default="1,2,4,8", help="comma-separated session arrival rates (per second)")
+    parser.add_argument("--duration", type=float, default=30, help="seconds per rate")
+    parser.add_argument("--mix", default=None, help="session mix, e.g. questionnaire=6,free_text=3,file=1")
+    parser.add_argument("--resubmit", type=float, default=0.2, help="probability of a further submit in a session")
+    parser.add_argument("--sessions", type=int, default=500, help="distinct synthetic sessions to cycle through")
+    parser.add_argument("--max-in-flight", type=int, default=256, help="client threads")
+    parser.add_argument("--slo-ms", type=float, default=None, help="p95 latency objective for the saturation point")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="write the report as JSON to this file")
+    args = parser.parse_args()
+
+    mix = parse_mix(args.mix) if args.mix else dict(DEFAULT_MIX)
+    target = GradioTarget(args.target) if args.gradio else HttpTarget(args.target)
+    if not args.gradio and mix.pop("file", 0):
+        print("the JSON API has no file upload; file sessions are left out of the mix", file=sys.stderr)
+        if not mix:
+            raise SystemExit("no session kind left in the mix")
+        mix = {kind: weight / sum(mix.values()) for kind, weight in mix.items()}
+    sessions = build_sessions(args.sessions, mix, args.seed, args.resubmit)
+    steps = []
+    for rate in [float(r) for r in args.rates.split(",")]:
+        step = run_rate(target, sessions, rate, args.duration, args.max_in_flight, args.seed)
+        steps.append(step)
+        latency = step["latency_ms"] or {}
+        print(f"rate={rate:6.2f}/s  throughput={step['throughput']:7.2f}/s  errors={step['error_rate']:6.1%}  "
+              f"degraded={step['degraded_rate']:6.1%}  p50={latency.get('p50')} p95={latency.get('p95')} "
+              f"p99={latency.get('p99')} ms")
+    saturation = saturation_point(steps, args.slo_ms)
+    print(f"saturation point: {saturation if saturation is not None else 'not reached'}")
+    if args.output:
+        report = {
+            "environment": _environment(),
+            "config": {"target": args.target, "kind": target.name, "rates": args.rates, "duration": args.duration,
+                       "mix": mix, "resubmit": args.resubmit, "sessions": args.sessions, "seed": args.seed,
+                       "slo_ms": args.slo_ms},
+            "steps": steps,
+            "saturation_rate": saturation,
+        }
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
@@ -0,0 +1,111 @@
+import argparse
+import json
+import random
+import time
+
+from benchmarks.synthetic import REPORT_LINES, generate_patients
+
+# Mixed-length batches: questionnaire-only summaries next to summaries that
+# also carry a full lab panel (as when lab values come from an uploaded
+# report), shuffled and scored in batches, once in call order and once
+# batched by token length (serving.length_buckets). Reports, per model, the
+# share of padding in the forward passes and the throughput of both.
+# Run from the repository root (loads the models):
+#
+#   python -m benchmarks.padding --texts 256 --long-share 0.25 --output padding.json
+
+# Extra panel lines of a long summary: (name, unit, mean, spread)
+PANEL_LINES = [(english, unit, mean, spread) for _, english, unit, mean, spread, _ in REPORT_LINES] + [
+    ("Hemoglobin", "g/L", 140, 15), ("White Blood Cells", "10^9/L", 6.5, 1.8), ("Platelets", "10^9/L", 240, 50),
+    ("ALT", "U/L", 28, 12), ("AST", "U/L", 26, 9), ("Potassium", "mmol/L", 4.2, 0.4),
+    ("Sodium", "mmol/L", 140, 3), ("CK-MB", "U/L", 15, 6), ("NT-proBNP", "pg/mL", 120, 90),
+    ("HbA1c", "%", 5.8, 0.7), ("hs-CRP", "mg/L", 2.1, 1.6), ("D-dimer", "mg/L", 0.3, 0.2),
+]
+
+
+def mixed_texts(count, long_share=0.25, seed=0):
+    """`count` shuffled summary texts, a `long_share` of them with the extra lab panel."""
+    from cardio_core import generate_summary_text
+    rng = random.Random(seed)
+    texts = []
+    for p in generate_patients(count, seed):
+        symptoms = {q: a for q, a in p["symptoms"].items() if q != "__extra_text__"}
+        labs = dict(p["lab_params"])
+        if rng.random() < long_share:
+            for name, unit, mean, spread in PANEL_LINES:
+                labs[f"{name} ({unit})"] = round(max(0.0, rng.gauss(mean, spread)), 2)
+        texts.append(generate_summary_text(symptoms, p["history"], labs, p["lang"]))
+    rng.shuffle(texts)
+    return texts
+
+
+def padding_stats(lengths, batches):
+    """Real and padded token counts of the forward passes over `batches` (lists of indices)."""
+    real = sum(lengths)
+    padded = sum(max(lengths[i] for i in batch) * len(batch) for batch in batches)
+    return {"real_tokens": real, "padded_tokens": padded, "padding_share": round(1 - real / padded, 4)}
+
+
+def _throughput(clf, texts, batch_size, rounds):
+    best = None
+    for _ in range(rounds):
+        start = time.perf_counter()
+        clf(texts, batch_size=batch_size)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return round(len(texts) / best, 2)
+
+
+def run_padding_benchmark(pipelines, texts, batch_size=8, rounds=3):
+    """Padding share and throughput (texts/s) of every model, in call order and length-bucketed."""
+    from serving import length_buckets
+    report = {"texts": len(texts), "batch_size": batch_size, "models": {}}
+    for name, clf in pipelines.items():
+        tokenizer = clf.tokenizer
+        lengths = [len(ids) for ids in tokenizer(texts, truncation=True)["input_ids"]]
+        in_order = [list(range(s, min(s + batch_size, len(texts)))) for s in range(0, len(texts), batch_size)]
+        model_report = {
+            "mean_tokens": round(sum(lengths) / len(lengths), 1),
+            "max_tokens": max(lengths),
+            "in_order": padding_stats(lengths, in_order),
+            "bucketed": padding_stats(lengths, length_buckets(lengths, batch_size)),
+        }
+        bucketing = clf.length_bucketing
+        clf(texts[:batch_size], batch_size=batch_size)  # warm-up
+        try:
+            for mode, enabled in (("in_order", False), ("bucketed", True)):
+                clf.length_bucketing = enabled
+                model_report[mode]["texts_per_second"] = _throughput(clf, texts, batch_size, rounds)
+        finally:
+            clf.length_bucketing = bucketing
+        model_report["speedup"] = round(
+            model_report["bucketed"]["texts_per_second"] / model_report["in_order"]["texts_per_second"], 2)
+        report["models"][name] = model_report
+    return report
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Throughput of length-bucketed batching on mixed-length texts")
+    parser.add_argument("--texts", type=int, default=256)
+    parser.add_argument("--long-share", type=float, default=0.25, help="share of summaries with the extra lab panel")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--batch", type=int, default=8, help="texts per forward pass")
+    parser.add_argument("--rounds", type=int, default=3, help="runs per model and mode, fastest kept")
+    parser.add_argument("--output", help="write the report as JSON to this file")
+    args = parser.parse_args(argv)
+
+    from model_artifacts import load_pipelines
+    texts = mixed_texts(args.texts, args.long_share, args.seed)
+    report = run_padding_benchmark(load_pipelines(), texts, args.batch, args.rounds)
+    for name, r in report["models"].items():
+        print(f"{name:14s} tokens mean={r['mean_tokens']:6.1f} max={r['max_tokens']:4d}  "
+              f"padding {r['in_order']['padding_share']:.0%} -> {r['bucketed']['padding_share']:.0%}  "
+              f"{r['in_order']['texts_per_second']:8.2f} -> {r['bucketed']['texts_per_second']:8.2f} texts/s  "
+              f"x{r['speedup']:.2f}")
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,139 @@
+import os
+import random
+
+# Seeded generator of synthetic patients, filled in the same way as the
+# Gradio form (comparemodel.make_tab): 10 symptom and 6 history questions
+# answered yes/no, 6 lab parameters, an optional free-text concern and,
+# optionally, a lab report .docx like the uploaded files.
+# The same seed always gives the same patients.
+
+YES_NO = {"中文": ("是", "否"), "English": ("Yes", "No")}
+
+SYMPTOM_QUESTIONS = {
+    "中文": [
+        "胸痛是否在劳累时加重？", "是否为压迫感或紧缩感？", "是否持续超过5分钟？", "是否放射至肩/背/下巴？",
+        "是否在休息后缓解？", "是否伴冷汗？", "是否呼吸困难？", "是否恶心或呕吐？", "是否头晕或晕厥？", "是否心悸？",
+    ],
+    "English": [
+        "Is chest pain aggravated by exertion?", "Is it a pressing or tightening sensation?",
+        "Does it last more than 5 minutes?", "Does it radiate to shoulder/back/jaw?", "Is it relieved by rest?",
+        "Is it accompanied by cold sweat?", "Is there shortness of breath?", "Is there nausea or vomiting?",
+        "Is there dizziness or fainting?", "Is there palpitations?",
+    ],
+}
+
+HISTORY_QUESTIONS = {
+    "中文": ["是否患有高血压？", "是否患糖尿病？", "是否有高血脂？", "是否吸烟？", "是否有心脏病家族史？", "近期是否有情绪压力？"],
+    "English": [
+        "Do you have hypertension?", "Do you have diabetes?", "Do you have hyperlipidemia?", "Do you smoke?",
+        "Family history of heart disease?", "Recent emotional stress?",
+    ],
+}
+
+# (English label, Chinese label, form minimum, form maximum, typical mean, spread, decimals)
+LAB_FIELDS = [
+    ("Systolic BP (mmHg)", "收缩压 (Systolic BP) (mmHg)", 60, 220, 130, 22, 0),
+    ("Diastolic BP (mmHg)", "舒张压 (Diastolic BP) (mmHg)", 40, 120, 82, 12, 0),
+    ("LDL Cholesterol (mg/dL)", "低密度脂蛋白胆固醇 (LDL Cholesterol) (mg/dL)", 50, 200, 115, 30, 0),
+    ("HDL Cholesterol (mg/dL)", "高密度脂蛋白胆固醇 (HDL Cholesterol) (mg/dL)", 20, 100, 50, 12, 0),
+    ("Total Cholesterol (mg/dL)", "总胆固醇 (Total Cholesterol) (mg/dL)", 0, 300, 195, 35, 0),
+    ("Troponin I/T (ng/mL)", "肌钙蛋白 (Troponin I/T) (ng/mL)", 0, 50, 0.02, 0.03, 3),
+]
+
+# How often a symptom / history answer is "yes" for a low- and a high-risk patient
+YES_RATE = {"low": 0.1, "high": 0.6}
+HIGH_RISK_SHARE = 0.3
+
+EXTRA_TEXTS = {
+    "中文": ["", "", "有冷汗，心悸，胸痛", "没有胸痛，偶尔头晕", "夜间呼吸困难，恶心", "最近压力大，焦虑"],
+    "English": [
+        "", "", "I have cold sweat and feel dizzy, chest pain", "no chest pain, sometimes palpitations",
+        "shortness of breath at night and nausea", "a lot of pressure at work, anxiety",
+    ],
+}
+
+# Lab report lines: (Chinese name, English name, unit, mean, spread, reference range)
+REPORT_LINES = [
+    ("总胆固醇", "Total Cholesterol", "mmol/L", 5.0, 0.9, "3.1-5.2"),
+    ("甘油三酯", "Triglycerides", "mmol/L", 1.6, 0.7, "0.4-1.7"),
+    ("高密度脂蛋白胆固醇", "HDL Cholesterol", "mmol/L", 1.3, 0.3, "1.0-1.9"),
+    ("低密度脂蛋白胆固醇", "LDL Cholesterol", "mmol/L", 3.0, 0.8, "0-3.4"),
+    ("肌酐", "Creatinine", "µmol/L", 80, 18, "57-111"),
+    ("尿酸", "Uric Acid", "µmol/L", 340, 70, "208-428"),
+    ("空腹血糖", "Fasting Glucose", "mmol/L", 5.4, 0.9, "3.9-6.1"),
+]
+
+
+def _lab_value(rng, risk, low, high, mean, spread, decimals):
+    if risk == "high":
+        mean += spread
+    value = min(high, max(low, rng.gauss(mean, spread)))
+    return round(value, decimals) if decimals else int(round(value))
+
+
+def generate_patient(rng, lang):
+    """
+    One synthetic patient as the form would submit it.
+    Returns a dict with symptoms (including "__extra_text__"), history,
+    lab_params, lang and risk ("low" or "high", the profile it was drawn from).
+    """
+    yes, no = YES_NO[lang]
+    risk = "high" if rng.random() < HIGH_RISK_SHARE else "low"
+    rate = YES_RATE[risk]
+    symptoms = {q: yes if rng.random() < rate else no for q in SYMPTOM_QUESTIONS[lang]}
+    symptoms["__extra_text__"] = rng.choice(EXTRA_TEXTS[lang])
+    history = {q: yes if rng.random() < rate else no for q in HISTORY_QUESTIONS[lang]}
+    lab_params = {}
+    for english, chinese, low, high, mean, spread, decimals in LAB_FIELDS:
+        value = _lab_value(rng, risk, low, high, mean, spread, decimals)
+        # The form leaves empty/zero fields out
+        if value:
+            lab_params[chinese if lang == "中文" else english] = value
+    return {"symptoms": symptoms, "history": history, "lab_params": lab_params, "lang": lang, "risk": risk}
+
+
+def generate_patients(count, seed=0, langs=("中文", "English")):
+    """
+    `count` patients, alternating between `langs`; same seed, same patients.
+    """
+    rng = random.Random(seed)
+    return [generate_patient(rng, langs[i % len(langs)]) for i in range(count)]
+
+
+def generate_model_outputs(rng, models=("BioBERT", "PubMedBERT", "ClinicalBERT")):
+    """
+    Random top-1 classifier outputs ({model: {"label", "score"}}) for timing
+    the stages after model inference without loading the models.
+    """
+    return {name: {"label": f"LABEL_{rng.randrange(3)}", "score": rng.uniform(0.34, 0.99)} for name in models}
+
+
+def write_lab_report(path, lang, rng):
+    """
+    Write a synthetic lab report .docx (one paragraph per test, like the
+    sample reports). Needs python-docx.
+    """
+    from docx import Document
+    doc = Document()
+    doc.add_heading("血液检查报告" if lang == "中文" else "Blood Work Report", level=1)
+    for chinese, english, unit, mean, spread, reference in REPORT_LINES:
+        value = round(max(0.1, rng.gauss(mean, spread)), 1 if mean >= 10 else 2)
+        name = chinese if lang == "中文" else english
+        doc.add_paragraph(f"{name}: {value} {unit} ({reference})")
+    doc.save(path)
+    return path
+
+
+def generate_lab_reports(patients, directory, seed=0):
+    """
+    Write one lab report per patient into `directory`; sets patient["file"]
+    to its path. Returns the list of paths.
+    """
+    rng = random.Random(seed)
+    os.makedirs(directory, exist_ok=True)
+    paths = []
+    for i, patient in enumerate(patients):
+        path = write_lab_report(os.path.join(directory, f"patient_{i:05d}.docx"), patient["lang"], rng)
+        patient["file"] = path
+        paths.append(path)
+    return paths
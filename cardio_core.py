@@ -0,0 +1,603 @@
+import re
+
+from report_renderer import AssessmentResult, ModelPrediction
+from text_matcher import PhraseMatcher
+
+# Dependency-free core of the assessment: clinical rules, HEART score, alerts,
+# recommendations, free-text analysis, model score weighting, lab unit
+# conversion and result assembly. Only the standard library and the pure
+# helper modules are imported here, so batch jobs and scripts can use the
+# logic without loading torch, transformers, openai, docx or gradio.
+
+
+# Define label mapping
+LABEL_MAPPING = {
+    "LABEL_0": {
+        "中文": "低风险",
+        "English": "Low Risk"
+    },
+    "LABEL_1": {
+        "中文": "中风险",
+        "English": "Moderate Risk"
+    },
+    "LABEL_2": {
+        "中文": "高风险",
+        "English": "High Risk"
+    }
+}
+
+
+# Define cardiovascular disease classification logic
+def classify_cardiovascular_disease(symptoms, history, lab_params, lang="中文"):
+    diseases = []
+    recommendations = []
+
+    if lang == "English":
+        # Hypertension
+        if lab_params.get("Systolic BP (mmHg)", 0) > 180 or lab_params.get("Diastolic BP (mmHg)", 0) > 120:
+            diseases.append("Hypertension (Severe)")
+            recommendations.append(
+                "This is an emergency. Please seek medical attention immediately.")
+        elif lab_params.get("Systolic BP (mmHg)", 0) > 160 or lab_params.get("Diastolic BP (mmHg)", 0) > 100:
+            diseases.append("Hypertension (Moderate)")
+            recommendations.append(
+                "Monitor your blood pressure, reduce salt intake, maintain a healthy diet, and consult your doctor.")
+        elif lab_params.get("Systolic BP (mmHg)", 0) > 140 or lab_params.get("Diastolic BP (mmHg)", 0) > 90:
+            diseases.append("Hypertension (Mild)")
+            recommendations.append(
+                "Regularly monitor your blood pressure and maintain a healthy lifestyle.")
+
+        # Coronary Artery Disease (CAD)
+        if history.get("Family history of heart disease?", "No") == "Yes" or lab_params.get("LDL-C (mg/dL)", 0) > 130:
+            diseases.append("Coronary Artery Disease")
+            recommendations.append(
+                "Consider a cardiac health check, avoid high-fat diets, and maintain regular exercise.")
+
+        # Myocardial Infarction (MI)
+        if symptoms.get("Chest pain triggered by exertion?", "No") == "Yes" and lab_params.get("Troponin I/T (ng/mL)", 0) > 0.04:
+            diseases.append("Myocardial Infarction")
+            recommendations.append(
+                "This is an emergency. Please seek medical attention immediately.")
+
+        # Hyperlipidemia
+        if lab_params.get("Total Cholesterol (mg/dL)", 0) > 200 or lab_params.get("LDL-C (mg/dL)", 0) > 130:
+            diseases.append("Hyperlipidemia")
+            recommendations.append(
+                "Reduce high-fat foods, increase fiber-rich foods, and consult your doctor.")
+
+        # Heart Failure
+        if symptoms.get("Shortness of breath?", "No") == "Yes" and lab_params.get("Troponin I/T (ng/mL)", 0) > 0.1:
+            diseases.append("Heart Failure")
+            recommendations.append(
+                "This is an emergency. Please seek medical attention immediately.")
+
+        if not diseases:
+            diseases.append(
+                "No significant cardiovascular disease risk detected")
+            recommendations.append(
+                "Maintain a healthy lifestyle and have regular health check-ups.")
+
+    else:
+        # Hypertension
+        if lab_params.get("收缩压 (mmHg)", 0) > 180 or lab_params.get("舒张压 (mmHg)", 0) > 120:
+            diseases.append("高血压 (严重)")
+            recommendations.append("这是紧急情况，请立即就医。")
+        elif lab_params.get("收缩压 (mmHg)", 0) > 160 or lab_params.get("舒张压 (mmHg)", 0) > 100:
+            diseases.append("高血压 (中度)")
+            recommendations.append("建议监测血压，减少盐分摄入，保持健康饮食，并咨询医生。")
+        elif lab_params.get("收缩压 (mmHg)", 0) > 140 or lab_params.get("舒张压 (mmHg)", 0) > 90:
+            diseases.append("高血压 (轻度)")
+            recommendations.append("建议定期监测血压，保持健康生活方式。")
+
+        # Coronary Artery Disease (CAD)
+        if history.get("是否有心脏病家族史？", "否") == "是" or lab_params.get("低密度脂蛋白 (LDL-C, mg/dL)", 0) > 130:
+            diseases.append("冠心病")
+            recommendations.append("建议进行心脏健康检查，避免高脂饮食，并保持适度运动。")
+
+        # Myocardial Infarction (MI)
+        if symptoms.get("胸痛是否在劳累时加重？", "否") == "是" and lab_params.get("肌钙蛋白 (Troponin I/T, ng/mL)", 0) > 0.04:
+            diseases.append("心肌梗塞")
+            recommendations.append("这是紧急情况，请立即就医。")
+
+        # Hyperlipidemia
+        if lab_params.get("总胆固醇 (Total Cholesterol, mg/dL)", 0) > 200 or lab_params.get("低密度脂蛋白 (LDL-C, mg/dL)", 0) > 130:
+            diseases.append("高脂血症")
+            recommendations.append("建议减少高脂饮食，增加富含纤维的食物，并咨询医生。")
+
+        # Heart Failure
+        if symptoms.get("是否呼吸困难？", "否") == "是" and lab_params.get("肌钙蛋白 (Troponin I/T, ng/mL)", 0) > 0.1:
+            diseases.append("心力衰竭")
+            recommendations.append("这是紧急情况，请立即就医。")
+
+        if not diseases:
+            diseases.append("无明显心血管疾病风险")
+            recommendations.append("保持健康的生活方式，定期进行健康检查。")
+
+    return diseases, recommendations
+
+MODEL_EXPLANATIONS = {
+    "BioBERT": {
+        "中文": "BioBERT 是一个专门针对生物医学文本训练的模型，适用于分析医学相关的文本。",
+        "English": "BioBERT is a model pre-trained on biomedical text, suitable for analyzing medical-related content."
+    },
+    "PubMedBERT": {
+        "中文": "PubMedBERT 是基于 PubMed 数据训练的模型，专注于生物医学文献的理解。",
+        "English": "PubMedBERT is trained on PubMed data and focuses on understanding biomedical literature."
+    },
+    "ClinicalBERT": {
+        "中文": "ClinicalBERT 是针对临床文本（如电子病历）优化的模型，适合分析患者相关的临床数据。",
+        "English": "ClinicalBERT is optimized for clinical text (such as electronic medical records) and is suitable for analyzing patient-related clinical data."
+    }
+}
+
+
+def aggregate_model_predictions(results, lang="中文"):
+    """
+    Aggregates probabilities from all models to determine the overall risk level,
+    and outputs labels in the specified language.
+    """
+    # Define risk labels based on language
+    if lang == "English":
+        risk_labels = ["Low Risk", "Moderate Risk", "High Risk"]
+    else:
+        risk_labels = ["低风险", "中风险", "高风险"]
+
+    # Initialize aggregated probabilities
+    aggregated_probabilities = {label: 0 for label in risk_labels}
+    model_count = 0
+
+    for model_result in results:
+        if isinstance(model_result, dict) and "probabilities" in model_result:
+            for risk, score in model_result["probabilities"].items():
+                # Only aggregate if the risk label matches the current language
+                if risk in aggregated_probabilities:
+                    aggregated_probabilities[risk] += score
+            model_count += 1
+
+    # Avoid division by zero
+    if model_count == 0:
+        return None, aggregated_probabilities
+
+    # Average the probabilities
+    for risk in aggregated_probabilities:
+        aggregated_probabilities[risk] /= model_count
+
+    # Determine the most likely risk level
+    most_likely = max(aggregated_probabilities, key=aggregated_probabilities.get)
+    return most_likely, aggregated_probabilities
+
+def generate_summary_text(symptoms, history, lab_params, lang):
+    """
+    Generate a summary text from structured inputs for model analysis.
+    """
+    if lang == "中文":
+        section_user = "### 📝 用户输入"
+        section_symptoms = "#### 🩺 症状"
+        section_history = "#### 🏥 病史"
+        section_lab = "#### 🧪 实验室参数"
+        bullet = "🔹"
+    else:
+        section_user = "### 📝 User Inputs"
+        section_symptoms = "#### 🩺 Symptoms"
+        section_history = "#### 🏥 Medical History"
+        section_lab = "#### 🧪 Lab Parameters"
+        bullet = "🔹"
+
+    summary = (
+        f"{section_user}:\n\n"
+        f"{section_symptoms}:\n" +
+        "\n".join([f"{bullet} {q}: {a}" for q, a in symptoms.items()]) +
+        f"\n\n{section_history}:\n" +
+        "\n".join([f"{bullet} {q}: {a}" for q, a in history.items()]) +
+        f"\n\n{section_lab}:\n" +
+        "\n".join([f"{bullet} {q}: {a}" for q, a in lab_params.items()])
+    )
+    return summary
+
+
+# Compact model input: canonical feature tokens in one fixed layout for both
+# languages (several times fewer tokens than generate_summary_text).
+# Question or lab label (both languages) -> feature token
+COMPACT_SYMPTOMS = {
+    "胸痛是否在劳累时加重？": "exertional_pain", "Is chest pain aggravated by exertion?": "exertional_pain",
+    "Chest pain triggered by exertion?": "exertional_pain",
+    "是否为压迫感或紧缩感？": "pressing_pain", "Is it a pressing or tightening sensation?": "pressing_pain",
+    "是否持续超过5分钟？": "pain_over_5min", "Does it last more than 5 minutes?": "pain_over_5min",
+    "是否放射至肩/背/下巴？": "radiating_pain", "Does it radiate to shoulder/back/jaw?": "radiating_pain",
+    "是否在休息后缓解？": "relieved_by_rest", "Is it relieved by rest?": "relieved_by_rest",
+    "是否伴冷汗？": "cold_sweat", "Is it accompanied by cold sweat?": "cold_sweat",
+    "是否呼吸困难？": "dyspnea", "Is there shortness of breath?": "dyspnea", "Shortness of breath?": "dyspnea",
+    "是否恶心或呕吐？": "nausea", "Is there nausea or vomiting?": "nausea",
+    "是否头晕或晕厥？": "syncope", "Is there dizziness or fainting?": "syncope",
+    "是否心悸？": "palpitations", "Is there palpitations?": "palpitations",
+}
+COMPACT_HISTORY = {
+    "是否患有高血压？": "hypertension", "Do you have hypertension?": "hypertension",
+    "是否患糖尿病？": "diabetes", "Do you have diabetes?": "diabetes",
+    "是否有高血脂？": "hyperlipidemia", "Do you have hyperlipidemia?": "hyperlipidemia",
+    "是否吸烟？": "smoker", "Do you smoke?": "smoker",
+    "是否有心脏病家族史？": "family_history", "Family history of heart disease?": "family_history",
+    "近期是否有情绪压力？": "stress", "Recent emotional stress?": "stress",
+}
+# Feature token -> (labels, low, high); values outside [low, high] get a low/high flag
+COMPACT_LABS = {
+    "sbp": (("Systolic BP (mmHg)", "收缩压 (Systolic BP) (mmHg)", "收缩压 (mmHg)"), 90, 140),
+    "dbp": (("Diastolic BP (mmHg)", "舒张压 (Diastolic BP) (mmHg)", "舒张压 (mmHg)"), 60, 90),
+    "ldl": (("LDL Cholesterol (mg/dL)", "低密度脂蛋白胆固醇 (LDL Cholesterol) (mg/dL)", "LDL-C (mg/dL)",
+             "低密度脂蛋白 (LDL-C, mg/dL)"), None, 130),
+    "hdl": (("HDL Cholesterol (mg/dL)", "高密度脂蛋白胆固醇 (HDL Cholesterol) (mg/dL)", "HDL-C (mg/dL)",
+             "高密度脂蛋白 (HDL-C, mg/dL)"), 40, None),
+    "tc": (("Total Cholesterol (mg/dL)", "总胆固醇 (Total Cholesterol) (mg/dL)",
+            "总胆固醇 (Total Cholesterol, mg/dL)"), None, 200),
+    "troponin": (("Troponin I/T (ng/mL)", "肌钙蛋白 (Troponin I/T) (ng/mL)", "肌钙蛋白 (Troponin I/T, ng/mL)"), None, 0.04),
+}
+COMPACT_LAB_LABELS = {label: key for key, (labels, _, _) in COMPACT_LABS.items() for label in labels}
+MODEL_INPUT_ENCODINGS = ("summary", "compact")
+
+
+def canonical_lab_key(label):
+    """
+    Feature token of a lab label in either language (e.g. "sbp"), the same
+    one encode_compact uses. Other labs keep their unit in the token
+    ("Triglycerides (mmol/L)" -> "triglycerides_mmol_l").
+    """
+    return COMPACT_LAB_LABELS.get(label) or _compact_token(re.sub(r"[()]", " ", label))
+
+
+def _compact_token(label):
+    # Token for a question or lab without a canonical name (e.g. labs from an uploaded file)
+    return re.sub(r"\W+", "_", re.sub(r"\(.*?\)", "", label)).strip("_").lower()[:32] or "item"
+
+
+def _compact_value(value):
+    try:
+        return f"{float(value):.4g}"
+    except (TypeError, ValueError):
+        return _compact_token(str(value))
+
+
+def encode_compact(symptoms, history, lab_params):
+    """
+    Compact model input: the positive symptoms and history as feature
+    tokens, then the lab values with a low/high flag outside the normal
+    range. Same text for the same answers in either language, e.g.
+    "symptoms: exertional_pain dyspnea; history: smoker; labs: sbp 150 high dbp 85 ..."
+    """
+    def positives(answers, names):
+        return [names.get(q) or _compact_token(q) for q, a in answers.items() if a in ("是", "Yes")]
+
+    labs = {}
+    for label, value in lab_params.items():
+        key = canonical_lab_key(label)
+        labs.setdefault(key, value)
+    lab_tokens = []
+    for key in list(COMPACT_LABS) + sorted(k for k in labs if k not in COMPACT_LABS):
+        if key not in labs:
+            continue
+        lab_tokens.append(f"{key} {_compact_value(labs[key])}")
+        _, low, high = COMPACT_LABS.get(key, (None, None, None))
+        try:
+            value = float(labs[key])
+        except (TypeError, ValueError):
+            continue
+        if low is not None and value < low:
+            lab_tokens.append("low")
+        elif high is not None and value > high:
+            lab_tokens.append("high")
+    return (
+        f"symptoms: {' '.join(sorted(positives(symptoms, COMPACT_SYMPTOMS))) or 'none'}; "
+        f"history: {' '.join(sorted(positives(history, COMPACT_HISTORY))) or 'none'}; "
+        f"labs: {' '.join(lab_tokens) or 'none'}"
+    )
+
+def generate_recommendations(final_risk, heart_score, lang):
+    recommendations = []
+    if lang == "中文":
+        if final_risk == "高风险":
+            recommendations.append("这是紧急情况，请立即就医。")
+        elif final_risk == "中风险":
+            recommendations.append("建议尽快咨询医生，进一步检查心脏健康。")
+        else:
+            recommendations.append("风险较低，建议定期体检，保持健康生活方式。")
+        if heart_score >= 4:
+            recommendations.append(f"HEART评分较高（{heart_score}分），请高度重视心脏健康。")
+    else:
+        if final_risk == "High Risk":
+            recommendations.append("This is an emergency. Please seek medical attention immediately.")
+        elif final_risk == "Moderate Risk":
+            recommendations.append("It is recommended to consult a doctor soon for further cardiac evaluation.")
+        else:
+            recommendations.append("Risk is low. Regular check-ups and a healthy lifestyle are recommended.")
+        if heart_score >= 4:
+            recommendations.append(f"HEART score is high ({heart_score} points). Please pay close attention to your heart health.")
+    return recommendations
+
+def generate_clinical_alerts(symptoms, history, lab_params, lang):
+    alerts = []
+    # Example: Troponin alert
+    if lang == "中文":
+        if lab_params.get("肌钙蛋白 (Troponin I/T, ng/mL)", 0) > 0.04:
+            alerts.append("肌钙蛋白升高，提示心肌损伤风险。")
+        if lab_params.get("收缩压 (mmHg)", 0) > 180 or lab_params.get("舒张压 (mmHg)", 0) > 120:
+            alerts.append("血压极高，存在高血压急症风险。")
+        if symptoms.get("胸痛是否在劳累时加重？", "否") == "是":
+            alerts.append("存在心绞痛症状，请注意心脏健康。")
+    else:
+        if lab_params.get("Troponin I/T (ng/mL)", 0) > 0.04:
+            alerts.append("Elevated troponin indicates risk of myocardial injury.")
+        if lab_params.get("Systolic BP (mmHg)", 0) > 180 or lab_params.get("Diastolic BP (mmHg)", 0) > 120:
+            alerts.append("Extremely high blood pressure, risk of hypertensive emergency.")
+        if symptoms.get("Is chest pain aggravated by exertion?", "No") == "Yes":
+            alerts.append("Angina symptoms present, please monitor heart health.")
+    return alerts
+
+def calculate_heart_score(symptoms, history, lab_params, lang):
+    """
+    Calculate a simplified HEART score based on inputs.
+    Returns (score, risk_level).
+    """
+    score = 0
+
+    # Example scoring logic (customize for your needs)
+    # History
+    if history.get("是否有心脏病家族史？", "否") == "是" or history.get("Family history of heart disease?", "No") == "Yes":
+        score += 1
+    if history.get("是否患有高血压？", "否") == "是" or history.get("Do you have hypertension?", "No") == "Yes":
+        score += 1
+    if history.get("是否患糖尿病？", "否") == "是" or history.get("Do you have diabetes?", "No") == "Yes":
+        score += 1
+
+    # Symptoms
+    if symptoms.get("胸痛是否在劳累时加重？", "否") == "是" or symptoms.get("Is chest pain aggravated by exertion?", "No") == "Yes":
+        score += 2
+    if symptoms.get("是否呼吸困难？", "否") == "是" or symptoms.get("Is there shortness of breath?", "No") == "Yes":
+        score += 1
+
+    # Lab parameters (example: Troponin)
+    if lab_params.get("肌钙蛋白 (Troponin I/T, ng/mL)", 0) > 0.04 or lab_params.get("Troponin I/T (ng/mL)", 0) > 0.04:
+        score += 2
+
+    # Risk level mapping
+    if score >= 4:
+        risk = "高风险" if lang == "中文" else "High Risk"
+    elif score >= 2:
+        risk = "中风险" if lang == "中文" else "Moderate Risk"
+    else:
+        risk = "低风险" if lang == "中文" else "Low Risk"
+
+    return score, risk
+
+
+# ---------------------- Free text vocabulary ----------------------
+# Some common concerning words (reported as keywords)
+FREE_TEXT_KEYWORDS = [
+    "pain", "chest", "dizzy", "sweat", "palpitation", "nausea", "vomit", "shortness", "pressure", "anxiety",
+    "疼", "胸", "晕", "出汗", "心悸", "恶心", "呕吐", "呼吸", "压力", "焦虑"
+]
+
+# Mapping of structured field to keyword, for mismatch detection of critical symptoms
+CRITICAL_SYMPTOM_MAP = [
+    {"field": "是否伴冷汗？", "keyword": "冷汗", "yes": "是", "lang": "中文"},
+    {"field": "Is it accompanied by cold sweat?", "keyword": "cold sweat", "yes": "Yes", "lang": "English"},
+    {"field": "是否呼吸困难？", "keyword": "呼吸", "yes": "是", "lang": "中文"},
+    {"field": "Is there shortness of breath?", "keyword": "shortness", "yes": "Yes", "lang": "English"},
+    {"field": "是否头晕或晕厥？", "keyword": "晕", "yes": "是", "lang": "中文"},
+    {"field": "Is there dizziness or fainting?", "keyword": "dizzy", "yes": "Yes", "lang": "English"},
+    {"field": "是否心悸？", "keyword": "心悸", "yes": "是", "lang": "中文"},
+    {"field": "Is there palpitations?", "keyword": "palpitation", "yes": "Yes", "lang": "English"},
+]
+
+
+def build_free_text_matcher():
+    """
+    Compile keywords and critical-symptom terms (both languages) into one matcher.
+    """
+    vocabulary = {}
+    for word in FREE_TEXT_KEYWORDS:
+        vocabulary.setdefault(word, set()).add("keyword")
+    for item in CRITICAL_SYMPTOM_MAP:
+        vocabulary.setdefault(item["keyword"], set()).add("critical")
+    return PhraseMatcher({term: sorted(tags) for term, tags in vocabulary.items()})
+
+
+# Built once at startup and shared by all requests (read-only)
+FREE_TEXT_MATCHER = build_free_text_matcher()
+
+
+def analyze_extra_text(extra_text, symptoms, lang):
+    """
+    Analyze the free-text box in a single pass: keyword extraction, negation
+    ("no chest pain", "没有胸痛") and mismatch warnings against the structured
+    symptom answers.
+    Returns (keywords, negated_keywords, mismatch_warnings, matches).
+    """
+    if not (extra_text and isinstance(extra_text, str) and extra_text.strip()):
+        return [], [], [], []
+    matches = FREE_TEXT_MATCHER.find(extra_text)
+
+    # First affirmed (non-negated) mention of every term
+    mentions = {}
+    negated = set()
+    for m in matches:
+        if m.negated:
+            negated.add(m.term)
+        else:
+            mentions.setdefault(m.term, m)
+    keywords = [word for word in FREE_TEXT_KEYWORDS if word in mentions]
+    negated_keywords = [word for word in FREE_TEXT_KEYWORDS if word in negated and word not in mentions]
+
+    # --- Mismatch detection for critical symptoms ---
+    mismatch_warnings = []
+    for item in CRITICAL_SYMPTOM_MAP:
+        if item["lang"] == lang:
+            field_val = symptoms.get(item["field"])
+            mention = mentions.get(item["keyword"])
+            # If structured says No, but the symptom is mentioned (not negated) in free text, warn
+            if field_val is not None and field_val != item["yes"] and mention is not None:
+                quoted = extra_text[mention.start:mention.end]
+                if lang == "中文":
+                    mismatch_warnings.append(f"⚠️ 结构化输入“{item['field']}”为“否”，但自由文本提及“{quoted}”。请注意信息不一致！")
+                else:
+                    mismatch_warnings.append(f"⚠️ Structured input '{item['field']}' is 'No', but free text mentions '{quoted}'. Please note the inconsistency!")
+    return keywords, negated_keywords, mismatch_warnings, matches
+
+
+# Weight of every model in the combined risk score
+MODEL_WEIGHTS = {"BioBERT": 0.3, "ClinicalBERT": 0.3, "PubMedBERT": 0.4}
+
+
+def score_model_outputs(predictions_by_model, count, lang):
+    """
+    Turn raw classifier outputs into per-model rankings and weighted risk scores.
+    Args:
+        predictions_by_model: {model_name: [prediction per text]}, where a
+            prediction is a {"label", "score"} dict (top-1) or a list of them
+        count: number of texts
+    Returns one (outputs, risk_scores) per text; outputs maps model name to
+    (sorted_result, result).
+    """
+    risk_labels = ["低风险", "中风险", "高风险"] if lang == "中文" else ["Low Risk", "Moderate Risk", "High Risk"]
+    batch = [({}, {label: 0 for label in risk_labels}) for _ in range(count)]
+    for model_name, batch_predictions in predictions_by_model.items():
+        for (outputs, risk_scores), predictions in zip(batch, batch_predictions):
+            # The pipeline returns a dict per text (top-1) or a list of dicts (top_k)
+            if isinstance(predictions, dict):
+                predictions = [predictions]
+            result = {LABEL_MAPPING[p['label']][lang]: p['score'] for p in predictions if p['label'] in LABEL_MAPPING}
+            sorted_result = sorted(result.items(), key=lambda x: x[1], reverse=True)
+            outputs[model_name] = (sorted_result, result)
+            for label, score in result.items():
+                if model_name in MODEL_WEIGHTS and label in risk_scores:
+                    risk_scores[label] += score * MODEL_WEIGHTS[model_name]
+    return batch
+
+
+def build_assessment_result(models, heart, alerts, rules, summary, extra_text, free_text, file_result, overlap_keys, lang,
+                            trends=None):
+    """
+    Combine the stage outputs into an AssessmentResult (see report_renderer.py).
+    models is None when model scoring was skipped under load; the result is
+    then the degraded rules + HEART score assessment.
+    trends: optional [LabTrend, ...] of the patient (lab_trends.py).
+    """
+    heart_score, heart_risk = heart
+    keywords, negated_keywords, mismatch_warnings, text_matches = free_text
+    file_data, file_mapping, _ = file_result
+
+    if models is None:
+        outputs, risk_scores = {}, {}
+        final_risk = heart_risk
+        conditions, rule_recommendations = rules
+        degraded = ["models"]
+    else:
+        outputs, risk_scores = models
+        # Final risk level
+        ai_risk = max(risk_scores, key=risk_scores.get)
+        final_risk = heart_risk if heart_score >= 4 else ai_risk
+        conditions, rule_recommendations = [], []
+        degraded = None
+    recommendations = rule_recommendations + [
+        rec for rec in generate_recommendations(final_risk, heart_score, lang) if rec not in rule_recommendations]
+
+    no_description = '暂无说明' if lang == '中文' else 'No description available'
+    return AssessmentResult(
+        lang=lang,
+        final_risk=final_risk,
+        heart_score=heart_score,
+        heart_risk=heart_risk,
+        risk_scores=risk_scores,
+        models=[
+            ModelPrediction(
+                name=model_name,
+                ranked=sorted_result,
+                explanation=MODEL_EXPLANATIONS.get(model_name, {}).get(lang, no_description))
+            for model_name, (sorted_result, _) in outputs.items()
+        ],
+        alerts=alerts,
+        recommendations=recommendations,
+        summary=summary,
+        extra_text=extra_text if extra_text and isinstance(extra_text, str) and extra_text.strip() else None,
+        keywords=keywords,
+        negated_keywords=negated_keywords,
+        text_matches=text_matches,
+        mismatch_warnings=mismatch_warnings,
+        file_data=file_data or None,
+        file_labs=file_mapping if file_data else None,
+        lab_overrides=overlap_keys,
+        conditions=conditions,
+        degraded=degraded,
+        trends=trends or [],
+    )
+
+
+def map_uploaded_file(data):
+    """
+    Map the uploaded file to the appropriate key-value pairs.
+    支持 value 为 "数值 单位 (参考范围)" 的字符串格式。
+    """
+    if data is None:
+        return "No content returned."
+    result = {}
+    for name, entry in data.items():
+        # 用正则提取数值和单位
+        match = re.match(r"([-\d.]+)\s*([a-zA-Zµ/%]+)", entry)
+        if match:
+            value_str, unit = match.groups()
+            try:
+                value = float(value_str)
+                result[f"{name} ({unit})"] = value
+            except Exception:
+                continue
+    return result
+
+
+def convert_chinese_lab_units(result_dict):
+    # Conversion factors
+    conversion_map = {
+        "高密度脂蛋白胆固醇": (38.67, "mg/dL"),
+        "低密度脂蛋臼胆固醇": (38.67, "mg/dL"),
+        "总胆固酪": (38.67, "mg/dL"),
+        "甘油三醋": (88.57, "mg/dL"),
+        "尿素": (6.0, "mg/dL"),
+        "尿酸": (59.48, "mg/dL"),
+        "肌酐": (88.4, "mg/dL"),
+    }
+    def convert_value(val, factor):
+        # Find float in string
+        m = re.search(r"([\d.]+)", val)
+        if m:
+            return round(float(m.group(1)) * factor, 1)
+        return val
+    def convert_range(rng, factor):
+        # Convert ranges like "3.10-8.80 mmol/L" or ">1.04 mmol/L" or "<5.18 mmol/L"
+        # Replace all numbers
+        def repl(m):
+            return str(round(float(m.group(0)) * factor, 1))
+        return re.sub(r"[\d.]+", repl, rng)
+    for k, v in result_dict.items():
+        if k in conversion_map:
+            factor, new_unit = conversion_map[k]
+            # Parse value and reference range
+            m = re.match(r"([\d.]+)[^\d]*([a-zA-Z/]+)? ?\(([^)]*)\)", v)
+            if m:
+                value = convert_value(m.group(1), factor)
+                ref = convert_range(m.group(3), factor)
+                result_dict[k] = f"{value} {new_unit} ({ref})"
+            else:
+                # Try to parse value only
+                m2 = re.match(r"([\d.]+)[^\d]*([a-zA-Z/]+)?", v)
+                if m2:
+                    value = convert_value(m2.group(1), factor)
+                    result_dict[k] = f"{value} {new_unit}"
+    # Special cases for µmol/L to mg/dL
+    for k in ["尿酸", "肌酐"]:
+        if k in result_dict:
+            v = result_dict[k]
+            factor = conversion_map[k][0]
+            new_unit = conversion_map[k][1]
+            m = re.match(r"([\d.]+)[^\d]*([a-zA-Z/µ]+)? ?\(([^)]*)\)", v)
+            if m:
+                value = round(float(m.group(1)) / factor, 1)
+                ref = re.sub(r"[\d.]+", lambda m: str(round(float(m.group(0)) / factor, 1)), m.group(3))
+                result_dict[k] = f"{value} {new_unit} ({ref})"
+    return result_dict
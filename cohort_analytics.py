@@ -0,0 +1,313 @@
+import argparse
+import json
+import os
+import sqlite3
+import time
+from collections import Counter, defaultdict
+from itertools import combinations
+
+from cardio_core import COMPACT_LABS, MODEL_WEIGHTS
+from history_store import HISTORY_DB
+
+# Columnar export of the assessment history (history_store.py) and cohort
+# analytics on it. The export streams the database in chunks into a Parquet
+# file (or an Arrow IPC file); the analytics read it back in record batches
+# of at most AIGNOSIS_ANALYTICS_BATCH_ROWS rows and only the columns they
+# need, with vectorized pyarrow.compute kernels, and keep nothing but the
+# running counts between batches. Memory stays bounded for any number of rows.
+#
+#   python cohort_analytics.py export --out history.parquet [--days 365]
+#   python cohort_analytics.py report history.parquet [--by heart_band] [--memory-mb 256]
+#
+# Needs pyarrow (pip install pyarrow); the rest of the app does not.
+BATCH_ROWS = int(os.getenv("AIGNOSIS_ANALYTICS_BATCH_ROWS", 65536))
+EXPORT_CHUNK = 20000
+MODELS = list(MODEL_WEIGHTS)
+LABS = list(COMPACT_LABS)
+RISKS = ["Low Risk", "Moderate Risk", "High Risk"]
+GROUPINGS = ("heart_band", "heart_risk", "lang", "month", "patient")
+
+
+def _pyarrow():
+    try:
+        import pyarrow
+        import pyarrow.compute
+        import pyarrow.ipc
+        import pyarrow.parquet
+    except ImportError as e:
+        raise ImportError("cohort analytics need pyarrow: pip install pyarrow") from e
+    return pyarrow
+
+
+def export_schema():
+    pa = _pyarrow()
+    return pa.schema(
+        [("id", pa.int64()), ("created_at", pa.timestamp("ms", tz="UTC")), ("patient_id", pa.string()),
+         ("lang", pa.string()), ("final_risk", pa.string()), ("heart_score", pa.int16()),
+         ("heart_risk", pa.string())]
+        + [(f"risk_{risk.split()[0].lower()}", pa.float32()) for risk in RISKS]
+        + [field for name in MODELS for field in ((f"model_{name}_label", pa.string()), (f"model_{name}_prob", pa.float32()))]
+        + [(lab, pa.float32()) for lab in LABS]
+        + [("rules", pa.list_(pa.string())), ("degraded", pa.bool_()), ("total_seconds", pa.float32())]
+    )
+
+
+def _chunk_columns(rows, labs):
+    # Column lists of one chunk of assessments rows; labs: {(assessment id, lab): value}
+    columns = defaultdict(list)
+    for row in rows:
+        (assessment_id, created_at, patient_id, lang, final_risk, heart_score, heart_risk,
+         risk_scores, models, degraded, timings, rules) = row
+        risk_scores = json.loads(risk_scores or "{}")
+        models = json.loads(models or "{}")
+        columns["id"].append(assessment_id)
+        columns["created_at"].append(int(created_at * 1000))
+        columns["patient_id"].append(patient_id)
+        columns["lang"].append(lang)
+        columns["final_risk"].append(final_risk)
+        columns["heart_score"].append(heart_score)
+        columns["heart_risk"].append(heart_risk)
+        for risk in RISKS:
+            columns[f"risk_{risk.split()[0].lower()}"].append(risk_scores.get(risk))
+        for name in MODELS:
+            ranked = models.get(name) or {}
+            label = max(ranked, key=ranked.get) if ranked else None
+            columns[f"model_{name}_label"].append(label)
+            columns[f"model_{name}_prob"].append(ranked.get(label))
+        for lab in LABS:
+            columns[lab].append(labs.get((assessment_id, lab)))
+        columns["rules"].append(json.loads(rules) if rules else [])
+        columns["degraded"].append(degraded is not None)
+        columns["total_seconds"].append(json.loads(timings or "{}").get("total"))
+    return columns
+
+
+def export_history(out_path, db_path=HISTORY_DB, since=None, until=None, file_format="parquet",
+                   chunk_rows=EXPORT_CHUNK):
+    """
+    Write the assessments recorded within [since, until) (unix times) to a
+    Parquet or Arrow IPC file, one row group / record batch per chunk of
+    `chunk_rows` assessments. Returns the number of rows written.
+    """
+    pa = _pyarrow()
+    schema = export_schema()
+    where, params = ["id > ?"], []
+    if since is not None:
+        where.append("created_at >= ?")
+        params.append(since)
+    if until is not None:
+        where.append("created_at < ?")
+        params.append(until)
+    sql = ("SELECT id, created_at, patient_id, lang, final_risk, heart_score, heart_risk, risk_scores, models,"
+           f" degraded, timings, rules FROM assessments WHERE {' AND '.join(where)} ORDER BY id LIMIT ?")
+    lab_sql = (f"SELECT assessment_id, lab, value FROM lab_values WHERE assessment_id BETWEEN ? AND ?"
+               f" AND lab IN ({', '.join('?' * len(LABS))})")
+    conn = sqlite3.connect(db_path)
+    if file_format == "parquet":
+        writer = pa.parquet.ParquetWriter(out_path, schema, compression="zstd")
+        write = writer.write_batch
+    else:
+        sink = pa.OSFile(out_path, "wb")
+        writer = pa.ipc.new_file(sink, schema)
+        write = writer.write_batch
+    written, last_id = 0, 0
+    try:
+        while True:
+            rows = conn.execute(sql, [last_id] + params + [chunk_rows]).fetchall()
+            if not rows:
+                break
+            labs = {(aid, lab): value for aid, lab, value in conn.execute(lab_sql, [rows[0][0], rows[-1][0]] + LABS)}
+            columns = _chunk_columns(rows, labs)
+            write(pa.record_batch([pa.array(columns[field.name], field.type) for field in schema], schema=schema))
+            written += len(rows)
+            last_id = rows[-1][0]
+    finally:
+        writer.close()
+        if file_format != "parquet":
+            sink.close()
+        conn.close()
+    return written
+
+
+def _files(path):
+    if os.path.isdir(path):
+        return sorted(os.path.join(path, name) for name in os.listdir(path)
+                      if name.endswith((".parquet", ".arrow", ".feather")))
+    return [path]
+
+
+def batch_rows_for(path, memory_mb):
+    """Batch size that keeps one decoded batch (and its intermediates) within `memory_mb`."""
+    pa = _pyarrow()
+    row_bytes = 256
+    for file in _files(path):
+        if file.endswith(".parquet"):
+            meta = pa.parquet.ParquetFile(file).metadata
+            if meta.num_rows:
+                size = sum(meta.row_group(i).total_byte_size for i in range(meta.num_row_groups))
+                row_bytes = max(row_bytes, size // meta.num_rows)
+    # Room for the batch, the compute intermediates and the reader's buffers
+    return max(1024, int(memory_mb * 2 ** 20 / (row_bytes * 4)))
+
+
+def iter_batches(path, columns, batch_rows=BATCH_ROWS):
+    """Record batches of the exported file(s) at `path` with only `columns`."""
+    pa = _pyarrow()
+    for file in _files(path):
+        if file.endswith(".parquet"):
+            yield from pa.parquet.ParquetFile(file).iter_batches(batch_size=batch_rows, columns=columns)
+        else:
+            with pa.memory_map(file) as source:
+                reader = pa.ipc.open_file(source)
+                for i in range(reader.num_record_batches):
+                    batch = reader.get_batch(i).select(columns)
+                    for start in range(0, batch.num_rows, batch_rows):
+                        yield batch.slice(start, batch_rows)
+
+
+def _group_key(batch, by):
+    pa = _pyarrow()
+    pc = pa.compute
+    if by == "heart_band":
+        score = batch.column("heart_score")
+        return pc.if_else(pc.less_equal(score, 3), "0-3", pc.if_else(pc.less_equal(score, 6), "4-6", "7-10"))
+    if by == "month":
+        return pc.strftime(batch.column("created_at"), format="%Y-%m")
+    if by == "patient":
+        return batch.column("patient_id")
+    return batch.column(by)
+
+
+def risk_distribution(path, by="heart_band", batch_rows=BATCH_ROWS):
+    """
+    Share of each final risk per group: by heart_band (HEART score 0-3,
+    4-6, 7-10), heart_risk, lang, month or patient.
+    Returns {group: {"count": n, "risks": {risk: share}}}.
+    """
+    if by not in GROUPINGS:
+        raise ValueError(f"unknown grouping {by!r} (use {', '.join(GROUPINGS)})")
+    pa = _pyarrow()
+    source = {"heart_band": "heart_score", "month": "created_at", "patient": "patient_id"}.get(by, by)
+    counts = Counter()
+    for batch in iter_batches(path, sorted({source, "final_risk"}), batch_rows):
+        table = pa.table({"group": _group_key(batch, by), "risk": batch.column("final_risk")})
+        grouped = table.group_by(["group", "risk"]).aggregate([([], "count_all")])
+        counts.update(dict(zip(zip(grouped["group"].to_pylist(), grouped["risk"].to_pylist()),
+                               grouped["count_all"].to_pylist())))
+    totals = Counter()
+    for (group, _), n in counts.items():
+        totals[group] += n
+    return {
+        group: {"count": total,
+                "risks": {risk: round(n / total, 4) for (g, risk), n in sorted(counts.items(), key=str) if g == group}}
+        for group, total in sorted(totals.items(), key=lambda item: str(item[0]))
+    }
+
+
+def rule_fire_rates(path, batch_rows=BATCH_ROWS):
+    """
+    How often each rule-based finding fires: {"assessments": n, "none": share
+    with no finding, "rules": {finding: share}} (most frequent first).
+    """
+    pa = _pyarrow()
+    pc = pa.compute
+    fired, rows, none = Counter(), 0, 0
+    for batch in iter_batches(path, ["rules"], batch_rows):
+        rules = batch.column("rules")
+        rows += batch.num_rows
+        none += pc.sum(pc.equal(pc.list_value_length(rules), 0)).as_py() or 0
+        counts = pc.value_counts(pc.list_flatten(rules))
+        fired.update(dict(zip(counts.field("values").to_pylist(), counts.field("counts").to_pylist())))
+    return {
+        "assessments": rows,
+        "none": round(none / rows, 4) if rows else 0.0,
+        "rules": {rule: round(n / rows, 4) for rule, n in fired.most_common()},
+    }
+
+
+def model_disagreement(path, models=MODELS, batch_rows=BATCH_ROWS):
+    """
+    How much the models disagree: share of assessments where their top
+    labels differ, pairwise agreement, the mean spread of their top
+    probabilities, and how often the final risk matches the HEART risk.
+    """
+    pa = _pyarrow()
+    pc = pa.compute
+    labels = [f"model_{name}_label" for name in models]
+    probs = [f"model_{name}_prob" for name in models]
+    pairs = list(combinations(range(len(models)), 2))
+    agree, scored, disagree, spread_sum, spread_bins = Counter(), 0, 0, 0.0, Counter()
+    rows, heart_match = 0, 0
+    for batch in iter_batches(path, labels + probs + ["final_risk", "heart_risk"], batch_rows):
+        rows += batch.num_rows
+        heart_match += pc.sum(pc.equal(batch.column("final_risk"), batch.column("heart_risk"))).as_py() or 0
+        # Only assessments every model scored (not degraded)
+        valid = batch.column(labels[0]).is_valid()
+        for column in labels[1:]:
+            valid = pc.and_(valid, batch.column(column).is_valid())
+        batch = batch.filter(valid)
+        if not batch.num_rows:
+            continue
+        scored += batch.num_rows
+        all_equal = None
+        for a, b in pairs:
+            equal = pc.equal(batch.column(labels[a]), batch.column(labels[b]))
+            agree[(models[a], models[b])] += pc.sum(equal).as_py() or 0
+            all_equal = equal if all_equal is None else pc.and_(all_equal, equal)
+        if all_equal is not None:
+            disagree += batch.num_rows - (pc.sum(all_equal).as_py() or 0)
+        columns = [batch.column(column) for column in probs]
+        spread = pc.subtract(pc.max_element_wise(*columns), pc.min_element_wise(*columns))
+        spread_sum += pc.sum(spread).as_py() or 0.0
+        bins = pc.value_counts(pc.cast(pc.floor(pc.multiply(spread, 10)), pa.int8()))
+        spread_bins.update(dict(zip(bins.field("values").to_pylist(), bins.field("counts").to_pylist())))
+    return {
+        "assessments": rows,
+        "scored_by_all_models": scored,
+        "top_label_disagreement": round(disagree / scored, 4) if scored else None,
+        "pairwise_agreement": {f"{a}/{b}": round(n / scored, 4) if scored else None
+                               for (a, b), n in ((pair, agree[pair]) for pair in
+                                                 ((models[i], models[j]) for i, j in pairs))},
+        "mean_probability_spread": round(spread_sum / scored, 4) if scored else None,
+        # Spread histogram: "0.1" counts spreads in [0.1, 0.2)
+        "probability_spread_histogram": {f"{min(b, 9) / 10:.1f}": n for b, n in sorted(spread_bins.items())
+                                         if b is not None},
+        "final_matches_heart_risk": round(heart_match / rows, 4) if rows else None,
+    }
+
+
+def cohort_report(path, by="heart_band", batch_rows=BATCH_ROWS):
+    return {
+        "risk_distribution": {"by": by, "groups": risk_distribution(path, by, batch_rows)},
+        "rule_fire_rates": rule_fire_rates(path, batch_rows),
+        "model_disagreement": model_disagreement(path, batch_rows=batch_rows),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Export the assessment history and compute cohort statistics")
+    sub = parser.add_subparsers(dest="command", required=True)
+    export = sub.add_parser("export", help="write the history to a Parquet or Arrow file")
+    export.add_argument("--db", default=HISTORY_DB or None, required=not HISTORY_DB,
+                        help="history database (default: AIGNOSIS_HISTORY_DB)")
+    export.add_argument("--out", required=True)
+    export.add_argument("--format", choices=("parquet", "arrow"), default="parquet")
+    export.add_argument("--days", type=float, help="only the last DAYS days")
+    report = sub.add_parser("report", help="risk distribution, rule-fire rates and model disagreement")
+    report.add_argument("path", help="exported file, or a directory of them")
+    report.add_argument("--by", choices=GROUPINGS, default="heart_band")
+    report.add_argument("--memory-mb", type=float, help="memory budget of one batch (default: fixed batch size)")
+    args = parser.parse_args(argv)
+
+    if args.command == "export":
+        since = time.time() - args.days * 86400 if args.days else None
+        start = time.perf_counter()
+        rows = export_history(args.out, args.db, since=since, file_format=args.format)
+        print(f"exported {rows} assessments to {args.out} in {time.perf_counter() - start:.1f}s")
+    else:
+        batch_rows = batch_rows_for(args.path, args.memory_mb) if args.memory_mb else BATCH_ROWS
+        print(json.dumps(cohort_report(args.path, args.by, batch_rows), ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,512 +1,8 @@
 import gradio as gr
-from transformers import pipeline, AutoModelForSequenceClassification, AutoTokenizer
-import openai
-import docx
-import os
-from dotenv import load_dotenv
-from process_file import extract_key_value_pairs
-from process_health_docx import extract_medical_data
-from summary_result import summarize_model_outputs_llm
-import json
-import re
+from assessment import AssessmentSession, analyze_structured_inputs_stream, prefetch_file, start_inference_workers
+from metrics import start_metrics_server
+from serving import launch
 
-# Load environment variables from .env file
-load_dotenv()
-
-# Define label mapping
-LABEL_MAPPING = {
-    "LABEL_0": {
-        "中文": "低风险",
-        "English": "Low Risk"
-    },
-    "LABEL_1": {
-        "中文": "中风险",
-        "English": "Moderate Risk"
-    },
-    "LABEL_2": {
-        "中文": "高风险",
-        "English": "High Risk"
-    }
-}
-
-# Define the models
-MODELS = {
-    "BioBERT": "dmis-lab/biobert-base-cased-v1.1",
-    "PubMedBERT": "microsoft/BiomedNLP-PubMedBERT-base-uncased-abstract",
-    "ClinicalBERT": "emilyalsentzer/Bio_ClinicalBERT"
-}
-
-# Load pipelines for each model
-pipelines = {}
-for model_name, model_path in MODELS.items():
-    tokenizer = AutoTokenizer.from_pretrained(model_path)
-    model = AutoModelForSequenceClassification.from_pretrained(model_path, num_labels=3)
-    pipelines[model_name] = pipeline(
-        "text-classification", model=model, tokenizer=tokenizer)
-
-# Define cardiovascular disease classification logic
-
-
-def classify_cardiovascular_disease(symptoms, history, lab_params, lang="中文"):
-    diseases = []
-    recommendations = []
-
-    if lang == "English":
-        # Hypertension
-        if lab_params.get("Systolic BP (mmHg)", 0) > 180 or lab_params.get("Diastolic BP (mmHg)", 0) > 120:
-            diseases.append("Hypertension (Severe)")
-            recommendations.append(
-                "This is an emergency. Please seek medical attention immediately.")
-        elif lab_params.get("Systolic BP (mmHg)", 0) > 160 or lab_params.get("Diastolic BP (mmHg)", 0) > 100:
-            diseases.append("Hypertension (Moderate)")
-            recommendations.append(
-                "Monitor your blood pressure, reduce salt intake, maintain a healthy diet, and consult your doctor.")
-        elif lab_params.get("Systolic BP (mmHg)", 0) > 140 or lab_params.get("Diastolic BP (mmHg)", 0) > 90:
-            diseases.append("Hypertension (Mild)")
-            recommendations.append(
-                "Regularly monitor your blood pressure and maintain a healthy lifestyle.")
-
-        # Coronary Artery Disease (CAD)
-        if history.get("Family history of heart disease?", "No") == "Yes" or lab_params.get("LDL-C (mg/dL)", 0) > 130:
-            diseases.append("Coronary Artery Disease")
-            recommendations.append(
-                "Consider a cardiac health check, avoid high-fat diets, and maintain regular exercise.")
-
-        # Myocardial Infarction (MI)
-        if symptoms.get("Chest pain triggered by exertion?", "No") == "Yes" and lab_params.get("Troponin I/T (ng/mL)", 0) > 0.04:
-            diseases.append("Myocardial Infarction")
-            recommendations.append(
-                "This is an emergency. Please seek medical attention immediately.")
-
-        # Hyperlipidemia
-        if lab_params.get("Total Cholesterol (mg/dL)", 0) > 200 or lab_params.get("LDL-C (mg/dL)", 0) > 130:
-            diseases.append("Hyperlipidemia")
-            recommendations.append(
-                "Reduce high-fat foods, increase fiber-rich foods, and consult your doctor.")
-
-        # Heart Failure
-        if symptoms.get("Shortness of breath?", "No") == "Yes" and lab_params.get("Troponin I/T (ng/mL)", 0) > 0.1:
-            diseases.append("Heart Failure")
-            recommendations.append(
-                "This is an emergency. Please seek medical attention immediately.")
-
-        if not diseases:
-            diseases.append(
-                "No significant cardiovascular disease risk detected")
-            recommendations.append(
-                "Maintain a healthy lifestyle and have regular health check-ups.")
-
-    else:
-        # Hypertension
-        if lab_params.get("收缩压 (mmHg)", 0) > 180 or lab_params.get("舒张压 (mmHg)", 0) > 120:
-            diseases.append("高血压 (严重)")
-            recommendations.append("这是紧急情况，请立即就医。")
-        elif lab_params.get("收缩压 (mmHg)", 0) > 160 or lab_params.get("舒张压 (mmHg)", 0) > 100:
-            diseases.append("高血压 (中度)")
-            recommendations.append("建议监测血压，减少盐分摄入，保持健康饮食，并咨询医生。")
-        elif lab_params.get("收缩压 (mmHg)", 0) > 140 or lab_params.get("舒张压 (mmHg)", 0) > 90:
-            diseases.append("高血压 (轻度)")
-            recommendations.append("建议定期监测血压，保持健康生活方式。")
-
-        # Coronary Artery Disease (CAD)
-        if history.get("是否有心脏病家族史？", "否") == "是" or lab_params.get("低密度脂蛋白 (LDL-C, mg/dL)", 0) > 130:
-            diseases.append("冠心病")
-            recommendations.append("建议进行心脏健康检查，避免高脂饮食，并保持适度运动。")
-
-        # Myocardial Infarction (MI)
-        if symptoms.get("胸痛是否在劳累时加重？", "否") == "是" and lab_params.get("肌钙蛋白 (Troponin I/T, ng/mL)", 0) > 0.04:
-            diseases.append("心肌梗塞")
-            recommendations.append("这是紧急情况，请立即就医。")
-
-        # Hyperlipidemia
-        if lab_params.get("总胆固醇 (Total Cholesterol, mg/dL)", 0) > 200 or lab_params.get("低密度脂蛋白 (LDL-C, mg/dL)", 0) > 130:
-            diseases.append("高脂血症")
-            recommendations.append("建议减少高脂饮食，增加富含纤维的食物，并咨询医生。")
-
-        # Heart Failure
-        if symptoms.get("是否呼吸困难？", "否") == "是" and lab_params.get("肌钙蛋白 (Troponin I/T, ng/mL)", 0) > 0.1:
-            diseases.append("心力衰竭")
-            recommendations.append("这是紧急情况，请立即就医。")
-
-        if not diseases:
-            diseases.append("无明显心血管疾病风险")
-            recommendations.append("保持健康的生活方式，定期进行健康检查。")
-
-    return diseases, recommendations
-
-MODEL_EXPLANATIONS = {
-    "BioBERT": {
-        "中文": "BioBERT 是一个专门针对生物医学文本训练的模型，适用于分析医学相关的文本。",
-        "English": "BioBERT is a model pre-trained on biomedical text, suitable for analyzing medical-related content."
-    },
-    "PubMedBERT": {
-        "中文": "PubMedBERT 是基于 PubMed 数据训练的模型，专注于生物医学文献的理解。",
-        "English": "PubMedBERT is trained on PubMed data and focuses on understanding biomedical literature."
-    },
-    "ClinicalBERT": {
-        "中文": "ClinicalBERT 是针对临床文本（如电子病历）优化的模型，适合分析患者相关的临床数据。",
-        "English": "ClinicalBERT is optimized for clinical text (such as electronic medical records) and is suitable for analyzing patient-related clinical data."
-    }
-}
-
-
-def aggregate_model_predictions(results, lang="中文"):
-    """
-    Aggregates probabilities from all models to determine the overall risk level,
-    and outputs labels in the specified language.
-    """
-    # Define risk labels based on language
-    if lang == "English":
-        risk_labels = ["Low Risk", "Moderate Risk", "High Risk"]
-    else:
-        risk_labels = ["低风险", "中风险", "高风险"]
-
-    # Initialize aggregated probabilities
-    aggregated_probabilities = {label: 0 for label in risk_labels}
-    model_count = 0
-
-    for model_result in results:
-        if isinstance(model_result, dict) and "probabilities" in model_result:
-            for risk, score in model_result["probabilities"].items():
-                # Only aggregate if the risk label matches the current language
-                if risk in aggregated_probabilities:
-                    aggregated_probabilities[risk] += score
-            model_count += 1
-
-    # Avoid division by zero
-    if model_count == 0:
-        return None, aggregated_probabilities
-
-    # Average the probabilities
-    for risk in aggregated_probabilities:
-        aggregated_probabilities[risk] /= model_count
-
-    # Determine the most likely risk level
-    most_likely = max(aggregated_probabilities, key=aggregated_probabilities.get)
-    return most_likely, aggregated_probabilities
-
-def generate_summary_text(symptoms, history, lab_params, lang):
-    """
-    Generate a summary text from structured inputs for model analysis.
-    """
-    if lang == "中文":
-        section_user = "### 📝 用户输入"
-        section_symptoms = "#### 🩺 症状"
-        section_history = "#### 🏥 病史"
-        section_lab = "#### 🧪 实验室参数"
-        bullet = "🔹"
-    else:
-        section_user = "### 📝 User Inputs"
-        section_symptoms = "#### 🩺 Symptoms"
-        section_history = "#### 🏥 Medical History"
-        section_lab = "#### 🧪 Lab Parameters"
-        bullet = "🔹"
-
-    summary = (
-        f"{section_user}:\n\n"
-        f"{section_symptoms}:\n" +
-        "\n".join([f"{bullet} {q}: {a}" for q, a in symptoms.items()]) +
-        f"\n\n{section_history}:\n" +
-        "\n".join([f"{bullet} {q}: {a}" for q, a in history.items()]) +
-        f"\n\n{section_lab}:\n" +
-        "\n".join([f"{bullet} {q}: {a}" for q, a in lab_params.items()])
-    )
-    return summary
-
-def generate_recommendations(final_risk, heart_score, lang):
-    recommendations = []
-    if lang == "中文":
-        if final_risk == "高风险":
-            recommendations.append("这是紧急情况，请立即就医。")
-        elif final_risk == "中风险":
-            recommendations.append("建议尽快咨询医生，进一步检查心脏健康。")
-        else:
-            recommendations.append("风险较低，建议定期体检，保持健康生活方式。")
-        if heart_score >= 4:
-            recommendations.append(f"HEART评分较高（{heart_score}分），请高度重视心脏健康。")
-    else:
-        if final_risk == "High Risk":
-            recommendations.append("This is an emergency. Please seek medical attention immediately.")
-        elif final_risk == "Moderate Risk":
-            recommendations.append("It is recommended to consult a doctor soon for further cardiac evaluation.")
-        else:
-            recommendations.append("Risk is low. Regular check-ups and a healthy lifestyle are recommended.")
-        if heart_score >= 4:
-            recommendations.append(f"HEART score is high ({heart_score} points). Please pay close attention to your heart health.")
-    return recommendations
-
-def generate_clinical_alerts(symptoms, history, lab_params, lang):
-    alerts = []
-    # Example: Troponin alert
-    if lang == "中文":
-        if lab_params.get("肌钙蛋白 (Troponin I/T, ng/mL)", 0) > 0.04:
-            alerts.append("肌钙蛋白升高，提示心肌损伤风险。")
-        if lab_params.get("收缩压 (mmHg)", 0) > 180 or lab_params.get("舒张压 (mmHg)", 0) > 120:
-            alerts.append("血压极高，存在高血压急症风险。")
-        if symptoms.get("胸痛是否在劳累时加重？", "否") == "是":
-            alerts.append("存在心绞痛症状，请注意心脏健康。")
-    else:
-        if lab_params.get("Troponin I/T (ng/mL)", 0) > 0.04:
-            alerts.append("Elevated troponin indicates risk of myocardial injury.")
-        if lab_params.get("Systolic BP (mmHg)", 0) > 180 or lab_params.get("Diastolic BP (mmHg)", 0) > 120:
-            alerts.append("Extremely high blood pressure, risk of hypertensive emergency.")
-        if symptoms.get("Is chest pain aggravated by exertion?", "No") == "Yes":
-            alerts.append("Angina symptoms present, please monitor heart health.")
-    return alerts
-
-def calculate_heart_score(symptoms, history, lab_params, lang):
-    """
-    Calculate a simplified HEART score based on inputs.
-    Returns (score, risk_level).
-    """
-    score = 0
-
-    # Example scoring logic (customize for your needs)
-    # History
-    if history.get("是否有心脏病家族史？", "否") == "是" or history.get("Family history of heart disease?", "No") == "Yes":
-        score += 1
-    if history.get("是否患有高血压？", "否") == "是" or history.get("Do you have hypertension?", "No") == "Yes":
-        score += 1
-    if history.get("是否患糖尿病？", "否") == "是" or history.get("Do you have diabetes?", "No") == "Yes":
-        score += 1
-
-    # Symptoms
-    if symptoms.get("胸痛是否在劳累时加重？", "否") == "是" or symptoms.get("Is chest pain aggravated by exertion?", "No") == "Yes":
-        score += 2
-    if symptoms.get("是否呼吸困难？", "否") == "是" or symptoms.get("Is there shortness of breath?", "No") == "Yes":
-        score += 1
-
-    # Lab parameters (example: Troponin)
-    if lab_params.get("肌钙蛋白 (Troponin I/T, ng/mL)", 0) > 0.04 or lab_params.get("Troponin I/T (ng/mL)", 0) > 0.04:
-        score += 2
-
-    # Risk level mapping
-    if score >= 4:
-        risk = "高风险" if lang == "中文" else "High Risk"
-    elif score >= 2:
-        risk = "中风险" if lang == "中文" else "Moderate Risk"
-    else:
-        risk = "低风险" if lang == "中文" else "Low Risk"
-
-    return score, risk
-
-
-def handle_file_output(file_output, lang):
-    """
-    Process uploaded files，return file_data, file_mapping, file_section
-    """
-    file_data = None
-    file_mapping = None
-    file_section = None
-    if file_output:
-        file_data = process_file(file_output, lang)
-        if isinstance(file_data, str):
-            try:
-                file_data = json.loads(file_data)
-            except json.JSONDecodeError:
-                return None, None, f"Error processing file: {file_data}"
-    if file_data:
-        file_section = "### 上传文件内容解析" if lang == "中文" else "### File Content Analysis"
-        file_mapping = map_uploaded_file(file_data)
-        print(f"File mapping: {file_mapping}")
-    return file_data, file_mapping, file_section
-
-
-def analyze_structured_inputs(symptoms, history, lab_params, file_output, lang):
-    # Accept extra_text as a new argument
-    extra_text = None
-    if isinstance(symptoms, dict) and "__extra_text__" in symptoms:
-        extra_text = symptoms.pop("__extra_text__")
-    # 1. Process uploaded file if provided
-    file_data, file_mapping, file_section = handle_file_output(
-        file_output, lang)
-    overlap_keys = []
-    if file_data:
-        # Merge overlapping lab parameters
-        for k, v in file_mapping.items():
-            if k in lab_params:
-                if lang == "中文":
-                    overlap_keys.append(
-                        f"文件覆盖实验室参数： {k}:{v} 替换  {lab_params[k]}")
-                else:
-                    overlap_keys.append(
-                        f"Overriding lab parameter {k}:{v} with original value {lab_params[k]}")
-                lab_params[k] = v
-    print(f"Processing symptoms: {symptoms}")
-    print(f"Processing history: {history}")
-    print(f"Processing lab parameters: {lab_params}")
-    # 2. Generate summary text
-    summary = generate_summary_text(symptoms, history, lab_params, lang)
-
-    # --- Analyze extra free text ---
-    extra_analysis = ""
-    mismatch_warnings = []
-    if extra_text and isinstance(extra_text, str) and extra_text.strip():
-        # Simple keyword extraction (example)
-        keywords = []
-        # Example: look for some common concerning words
-        keyword_list = [
-            "pain", "chest", "dizzy", "sweat", "palpitation", "nausea", "vomit", "shortness", "pressure", "anxiety",
-            "疼", "胸", "晕", "出汗", "心悸", "恶心", "呕吐", "呼吸", "压力", "焦虑"
-        ]
-        for word in keyword_list:
-            if word in extra_text.lower():
-                keywords.append(word)
-        # --- Mismatch detection for critical symptoms ---
-        # Define mapping of structured field to keyword(s)
-        critical_map = [
-            {"field": "是否伴冷汗？", "keyword": "冷汗", "yes": "是", "lang": "中文"},
-            {"field": "Is it accompanied by cold sweat?", "keyword": "cold sweat", "yes": "Yes", "lang": "English"},
-            {"field": "是否呼吸困难？", "keyword": "呼吸", "yes": "是", "lang": "中文"},
-            {"field": "Is there shortness of breath?", "keyword": "shortness", "yes": "Yes", "lang": "English"},
-            {"field": "是否头晕或晕厥？", "keyword": "晕", "yes": "是", "lang": "中文"},
-            {"field": "Is there dizziness or fainting?", "keyword": "dizzy", "yes": "Yes", "lang": "English"},
-            {"field": "是否心悸？", "keyword": "心悸", "yes": "是", "lang": "中文"},
-            {"field": "Is there palpitations?", "keyword": "palpitation", "yes": "Yes", "lang": "English"},
-        ]
-        for item in critical_map:
-            if item["lang"] == lang:
-                field_val = symptoms.get(item["field"])
-                if field_val is not None:
-                    # If structured says No, but keyword is in free text, warn
-                    if field_val != item["yes"] and item["keyword"] in extra_text:
-                        if lang == "中文":
-                            mismatch_warnings.append(f"⚠️ 结构化输入“{item['field']}”为“否”，但自由文本提及“{item['keyword']}”。请注意信息不一致！")
-                        else:
-                            mismatch_warnings.append(f"⚠️ Structured input '{item['field']}' is 'No', but free text mentions '{item['keyword']}'. Please note the inconsistency!")
-        if lang == "中文":
-            extra_analysis = f"\n## 📝 其他症状/关注点分析\n输入内容: {extra_text}\n关键词: {', '.join(keywords) if keywords else '无明显关键词'}\n"
-        else:
-            extra_analysis = f"\n## 📝 Extra Symptoms/Concerns Analysis\nInput: {extra_text}\nKeywords: {', '.join(keywords) if keywords else 'No significant keywords found'}\n"
-
-    # 3. Classify cardiovascular diseases and get recommendations
-    diseases, recommendations = classify_cardiovascular_disease(
-        symptoms, history, lab_params, lang)
-
-    # 4. Model predictions (weighted aggregation)
-    model_weights = {"BioBERT": 0.3, "ClinicalBERT": 0.3, "PubMedBERT": 0.4}
-    risk_labels = ["低风险", "中风险", "高风险"] if lang == "中文" else ["Low Risk", "Moderate Risk", "High Risk"]
-    risk_scores = {label: 0 for label in risk_labels}
-    outputs = {}
-    for model_name, clf in pipelines.items():
-        predictions = clf(summary)
-        result = {LABEL_MAPPING[p['label']][lang]: p['score'] for p in predictions if p['label'] in LABEL_MAPPING}
-        sorted_result = sorted(result.items(), key=lambda x: x[1], reverse=True)
-        outputs[model_name] = (sorted_result, result)
-        for label, score in result.items():
-            if model_name in model_weights and label in risk_scores:
-                risk_scores[label] += score * model_weights[model_name]
-
-    ai_risk = max(risk_scores, key=risk_scores.get)
-
-    # 5. HEART score
-    heart_score, heart_risk = calculate_heart_score(symptoms, history, lab_params, lang)
-
-    # 6. Final risk level
-    final_risk = heart_risk if heart_score >= 4 else ai_risk
-
-    # 7. Clinical alerts
-    alerts = generate_clinical_alerts(symptoms, history, lab_params, lang)
-
-    # 8. Recommendations
-    recommendations = generate_recommendations(final_risk, heart_score, lang)
-
-    # 9. Output formatting
-    output = f"## 🩺 综合风险等级\n🔹 **{final_risk}**\n\n" if lang == "中文" else f"## 🩺 Overall risk\n🔹 **{final_risk}**\n\n"
-    if alerts:
-        output += "## 🚨 临床警报\n" if lang == "中文" else "## 🚨 Clinical Alerts\n"
-        for alert in alerts:
-            output += f"- {alert}\n"
-        output += "\n"
-    output += "## 📊 模型概率分布\n" if lang == "中文" else "## 📊 Model Probability Distribution\n"
-    for model_name in outputs:
-        output += f"### 🔸 {model_name}\n"
-        for label, score in outputs[model_name][0]:
-            output += f"- {label}: {score:.2f}\n"
-    output += f"\n## ❤️ HEART评分: {heart_score}分 ({heart_risk})\n" if lang == "中文" else f"\n## ❤️ HEART Score: {heart_score} points ({heart_risk})\n"
-    output += "## ⚖️ 加权风险分数\n" if lang == "中文" else "## ⚖️ Weighted Risk Scores\n"
-    for risk, score in risk_scores.items():
-        output += f"- {risk}: {score:.3f}\n"
-    output += "\n## 🩺 临床建议\n" if lang == "中文" else "\n## 🩺 Clinical Recommendations\n"
-    for rec in recommendations:
-        output += f"- {rec}\n"
-    output += f"\n## 💬 模型说明\n" if lang == "中文" else f"\n## 💬 Model Explanation\n"
-    for model_name in outputs:
-        output += f"### {model_name}\n"
-        output += f"{MODEL_EXPLANATIONS.get(model_name, {}).get(lang, '暂无说明' if lang == '中文' else 'No description available')}\n\n"
-    output += f"\n## 📝 输入摘要\n{summary}\n" if lang == "中文" else f"\n## 📝 Input Summary\n{summary}\n"
-    if extra_analysis:
-        output += extra_analysis
-    if mismatch_warnings:
-        output += ("\n## ⚠️ 信息不一致警告\n" if lang == "中文" else "\n## ⚠️ Inconsistency Warning\n")
-        for warn in mismatch_warnings:
-            output += f"- {warn}\n"
-    if file_data:
-        output += f"{file_section}"
-        output += f"\n{json.dumps(file_data, indent=2, ensure_ascii=False)}\n\n"
-    if overlap_keys:
-        output += "\n".join(overlap_keys)
-
-    # print(f"Final output:\n{output}")
-    # call openai API to summarize the output
-    if lang == "中文":
-        output1 = summarize_model_outputs(model_outputs=output, language="中文", mock=True)
-    else:
-        output1 = summarize_model_outputs(model_outputs=output, language="English", mock=True)
-
-    # print(f"open ai :\n{output1}")
-    if lang == "中文":
-        output += f"\n## 📝 模型输出总结\n{output1}\n"
-    else:
-        output += f"\n## 📝 Model Output Summary\n{output1}\n"
-    return output
-
-# Create Gradio interface for each language
-def summarize_model_outputs(model_outputs, language="中文", mock= False):
-    """
-    Summarizes model outputs and returns a formatted string.
-    Args:
-        model_outputs: list of dicts with model results
-
-    """
-    mock_chinese_text = """
-根据您提供的信息和模型分析，您的综合风险等级被评为高风险。这是由BioBERT、PubMedBERT和ClinicalBERT三个模型共同评估得出的结果，其中ClinicalBERT给出的高风险评估最高，达到0.67，而BioBERT和PubMedBERT的评估较低，分别为0.38和0.51。这可能是由于ClinicalBERT模型更侧重于临床数据的分析
-。
-
-尽管您的HEART评分为1分，属于低风险，但综合模型的加权风险分数显示您的高风险评级为0.521，因此我们建议您高度重视。
-
-根据您的症状和病史，以及实验室参数的结果，我们强烈建议您立即就医。虽然您的胸痛并未在劳累时加重，也没有表现为压迫感或紧缩感，也没有放射至 
-肩/背/下巴，也没有在休息后缓解，也没有伴随呼吸困难、恶心或呕吐、头晕或晕厥、心悸等症状，但您的胸痛持续超过5分钟并伴有冷汗，这是需要引起高
-度警惕的症状。
-
-此外，您的病史显示您患有糖尿病并且有吸烟的习惯，这都是心血管疾病的风险因素。您的实验室参数显示，您的低密度脂蛋白胆固醇和总胆固醇水平超标 
-，这也可能增加心血管疾病的风险。
-
-因此，我们建议您立即就医，并向医生详细描述您的症状、病史和实验室参数结果，以便医生能够做出准确的诊断。
-    """
-    
-
-    mock_english_text = """
-    Based on the analysis, the overall risk level for your health condition is high. This assessment is primarily derived from the evaluations of two models, PubMedBERT and ClinicalBERT, both of which have classified your condition as high risk. However, the BioBERT model suggests a moderate risk level. Despite this discrepancy, the weighted risk scores lean towards a high-risk classification.
-
-The HEART Score, a clinical tool used to evaluate the risk of major adverse cardiac events, classifies your condition as low risk. This score seems to contradict the high-risk assessment from the models. However, the HEART Score is based on a limited set of parameters and may not fully capture the complexity of your situation.
-
-Given the high risk indicated by the models, it is strongly recommended that you seek immediate medical attention. This is not a situation where waiting and observing is advisable. The symptoms you have reported, particularly chest pain lasting more than 5 minutes and accompanied by cold sweat, are concerning and warrant immediate evaluation.
-
-When you visit the doctor, be prepared to provide a detailed account of your symptoms and medical history. This includes the fact that you are a smoker and have diabetes, both of which can contribute to cardiovascular risk. Also, share the lab parameters, especially the overridden values for LDL Cholesterol, Total Cholesterol, and HDL Cholesterol. These factors will help the healthcare professionals to make 
-a comprehensive assessment of your condition.
-
-Remember, this analysis is based on the information provided and models' predictions. It is intended to support, not replace, the relationship between a patient and his/her physician. Always consult with a healthcare professional for a definitive diagnosis and treatment
-    """
-
-    if mock:
-        if language == "中文":
-            return mock_chinese_text
-        else:
-            return mock_english_text
-    else:
-        return summarize_model_outputs_llm(model_outputs, language)
-    
 
 def make_tab(lang):
     """
@@ -584,16 +80,38 @@ def make_tab(lang):
         file_input = gr.File(label=label, file_types=[
                              ".txt", ".pdf", ".docx"], elem_id="file_upload")
 
+    # Start extracting the file as soon as it is attached; submit reuses the result
+    file_input.change(
+        fn=lambda file_val: prefetch_file(file_val, lang),
+        inputs=[file_input],
+        outputs=None,
+        queue=False,
+        show_progress="hidden",
+        api_name=False
+    )
+
     # Combine all fields
     fields = symptom_fields + [extra_textbox] + history_fields + lab_fields + [file_input]
 
+    # Optional id the assessments are recorded under in the history (history_store.py)
+    patient_label = "患者编号 (可选)" if lang == "中文" else "Patient ID (optional)"
+    patient_box = gr.Textbox(label=patient_label, max_lines=1)
+
     # Output and submit button
     output_text = gr.Textbox(label="结果 / Results" if lang == "中文" else "Results")
     reset_button = gr.Button("重置" if lang == "中文" else "Reset")
     submit_button = gr.Button("提交 / Submit" if lang == "中文" else "Submit")
 
-    # Submit button functionality
-    def submit_fn(*inputs):
+    # Per-session cache of assessment stages, so resubmitting after a single
+    # edit only recomputes the affected stages
+    session_state = gr.State(None)
+
+    # Submit button functionality: the report is shown in stages (rules and
+    # HEART score first, then the models, then the LLM summary)
+    async def submit_fn(*inputs):
+        inputs, patient_id, session = inputs[:-2], inputs[-2], inputs[-1]
+        if session is None:
+            session = AssessmentSession()
         # Unpack inputs
         n_symptoms = len(symptom_fields)
         n_history = len(history_fields)
@@ -609,18 +127,27 @@ def make_tab(lang):
             if inputs[i + n_symptoms + 1 + n_history] not in (None, 0)
         }
         file_val = inputs[-1]
-        return analyze_structured_inputs(
+        # Lab fields start at these values; a value left there was not entered
+        form_defaults = {q: val for q, minv, maxv, val in L["nums"]}
+        updates = analyze_structured_inputs_stream(
             symptoms=symptoms_dict,
             history=history_dict,
             lab_params=lab_dict,
             file_output=file_val,
-            lang=lang
+            lang=lang,
+            session=session,
+            patient_id=(patient_id or "").strip() or None,
+            form_defaults=form_defaults
         )
+        async for _, _, result in updates:
+            yield result, session
 
+    # Named API endpoint (/assess_zh, /assess_en) for gradio_client and load tests
     submit_button.click(
         fn=submit_fn,
-        inputs=fields,
-        outputs=[output_text]
+        inputs=fields + [patient_box, session_state],
+        outputs=[output_text, session_state],
+        api_name="assess_zh" if lang == "中文" else "assess_en"
     )
 
     default_values = (
@@ -632,93 +159,21 @@ def make_tab(lang):
     )
 
     reset_button.click(
-        fn=lambda: default_values,
+        fn=lambda: list(default_values),
         inputs=None,
         outputs=fields
     )
 
     # Create Gradio interface
-    return gr.Column(fields + [submit_button, output_text, reset_button, gr.Markdown("---")])
-
-def process_file(file, lang="English", mock=True):
-    """
-    Process the uploaded docx file and use OpenAI API to extract key-value pairs.
-    If mock is True, return a fixed JSON structure for testing.
-    """
-    if mock:
-        if lang == "中文":
-            mock_data = {
-                "癌胚抗原 (CEA)": "3.22 ng/ml (≤5)",
-                "甲胎蛋白": "3.52 ng/ml (≤7)",
-                "高密度脂蛋白胆固醇": "78.15 mg/dL (>40)",
-                "低密度脂蛋白胆固醇": "171.4 mg/dL (<130) ↑",
-                "甘油三酯": "110.7 mg/dL (<150)",
-                "总胆固醇": "266.5 mg/dL (<200) ↑",
-                "尿素": "37.64 mg/dL (18.63–52.85)",
-                "总二氧化碳": "26.8 mEq/L (22.0–29.0)",
-                "尿酸": "3.97 mg/dL (2.61–6.00)",
-                "肌酐": "0.71 mg/dL (0.46–0.92)"
-            }
-        else:
-            mock_data = {
-                "LDL Cholesterol": "84 mg/dL (Ref: < 135 mg/dL)",
-                "Total Cholesterol": "185 mg/dL (Ref: < 200 mg/dL)",
-                "HDL Cholesterol": "76 mg/dL (Ref: ≥ 40 mg/dL)",
-                "Non-HDL Cholesterol": "109 mg/dL (Ref: < 162 mg/dL)",
-                "Triglycerides": "144 mg/dL (Ref: < 150 mg/dL)",
-                "A1c": "5.4% (Ref: < 6.0%)",
-                "eGFR": "72 mL/min/1.73m² (Ref: ≥ 60)",
-                "Urea (BUN equivalent)": "23 mg/dL (Ref: ~7 – 23 mg/dL)",
-                "Iron": "67 µg/dL (Ref: 40 – 160 µg/dL)",
-                "Vitamin B12": "149 pg/mL (Ref: 148–220: Insufficiency)",
-                "PSA (Prostate Specific Antigen)": "1.68 ng/mL (Ref: < 3.5 ng/mL)",
-                "DHEAS": "148 µg/dL (Ref: ~69 – 305 µg/dL)",
-                "WBC Count": "4.1 x10⁹/L (Ref: 4.5 – 11.0 x10⁹/L)",
-                "RBC Count": "4.9 x10¹²/L (Ref: 4.4 – 5.9 x10¹²/L)",
-                "Hemoglobin": "15.2 g/dL (Ref: 14.0 – 18.0 g/dL)",
-                "Lymphocytes": "0.8 x10⁹/L (Ref: 1.0 – 3.3 x10⁹/L)",
-                "Ferritin": "473 ng/mL (Ref: > 220 ng/mL)",
-                "Platelets": "170 x10⁹/L (Ref: 140 – 440 x10⁹/L)"
-            }
-        
-        return json.dumps(mock_data, indent=2, ensure_ascii=False)
-    if file is None:
-        return "No file uploaded."
-    try:
-        # Save uploaded file to a temp path
-        temp_path = file.name
-        result = extract_key_value_pairs(temp_path)
-        if result is None:
-            return "Could not extract key-value pairs. See logs for details."
-        # Pretty print JSON result
-        return json.dumps(result, indent=2, ensure_ascii=False)
-    except Exception as e:
-        return f"Error processing file: {e}"
-
-
-def map_uploaded_file(data):
-    """
-    Map the uploaded file to the appropriate key-value pairs.
-    支持 value 为 "数值 单位 (参考范围)" 的字符串格式。
-    """
-    if data is None:
-        return "No content returned."
-    result = {}
-    for name, entry in data.items():
-        # 用正则提取数值和单位
-        match = re.match(r"([-\d.]+)\s*([a-zA-Zµ/%]+)", entry)
-        if match:
-            value_str, unit = match.groups()
-            try:
-                value = float(value_str)
-                result[f"{name} ({unit})"] = value
-            except Exception:
-                continue
-    return result
+    return gr.Column(fields + [patient_box, submit_button, output_text, reset_button, gr.Markdown("---")])
 
 
 # Launch Gradio app
 if __name__ == "__main__":
+    # Fork inference workers (if configured) before Gradio starts its threads
+    start_inference_workers()
+    # Prometheus metrics on http://127.0.0.1:9464/metrics (AIGNOSIS_METRICS_PORT=0 disables)
+    start_metrics_server()
     with gr.Blocks() as app:
         gr.Markdown("## 🌐 智能心血管评估系统 | Bilingual Cardiovascular Assistant")
         with gr.Tabs():
@@ -726,4 +181,4 @@ if __name__ == "__main__":
                 make_tab("中文")
             with gr.TabItem("English"):
                 make_tab("English")
-        app.launch(share=True)
\ No newline at end of file
+    launch(app, share=True)
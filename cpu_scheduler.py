@@ -0,0 +1,332 @@
+import argparse
+import contextvars
+import json
+import logging
+import os
+import statistics
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+
+from metrics import MODEL_SECONDS
+from profiling import wrap
+from tracing import get_logger, log_event
+
+logger = get_logger("cpu_scheduler")
+
+# ---------------------- Configuration ----------------------
+# AIGNOSIS_CPU_LAYOUT   run the models through a ModelScheduler with this layout:
+#                       a planned one ("sequential", "per_model", "per_model_smt",
+#                       "shared") or explicit slots, MODELS=CPUS[:THREADS] separated
+#                       by commas, e.g. "BioBERT=0-3:4,ClinicalBERT+PubMedBERT=4-7:4"
+#                       (models joined by "+", CPUS like "0-3" or "0-1+8-9", "*" =
+#                       not pinned, THREADS defaults to the number of CPUs);
+#                       unset = models run in the request thread (default)
+# AIGNOSIS_PIN_WORKERS  set to 1 to pin every inference worker process to its own cores
+CPU_LAYOUT = os.getenv("AIGNOSIS_CPU_LAYOUT") or None
+PIN_WORKERS = os.getenv("AIGNOSIS_PIN_WORKERS", "0") == "1"
+
+
+def detect_topology():
+    """
+    Usable CPUs grouped by physical core.
+    Returns a list of cores, each a sorted list of logical CPU ids (SMT
+    siblings); falls back to one logical CPU per core where sysfs is missing.
+    """
+    cpus = sorted(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else list(range(os.cpu_count() or 1))
+    cores = {}
+    for cpu in cpus:
+        base = f"/sys/devices/system/cpu/cpu{cpu}/topology"
+        try:
+            with open(f"{base}/physical_package_id") as f:
+                package = int(f.read())
+            with open(f"{base}/core_id") as f:
+                core = int(f.read())
+        except (OSError, ValueError):
+            package, core = 0, cpu
+        cores.setdefault((package, core), []).append(cpu)
+    return [sorted(siblings) for _, siblings in sorted(cores.items(), key=lambda item: item[1][0])]
+
+
+def partition_cores(cores, parts, smt=False):
+    """
+    Split physical cores into `parts` contiguous groups of (almost) equal size.
+    Returns one sorted CPU list per part; with smt=False only the first
+    logical CPU of every core is used. With fewer cores than parts, parts
+    share cores round-robin.
+    """
+    groups = [[] for _ in range(parts)]
+    if len(cores) >= parts:
+        size, extra = divmod(len(cores), parts)
+        start = 0
+        for i in range(parts):
+            end = start + size + (1 if i < extra else 0)
+            for siblings in cores[start:end]:
+                groups[i].extend(siblings if smt else siblings[:1])
+            start = end
+    else:
+        for i in range(parts):
+            siblings = cores[i % len(cores)]
+            groups[i].extend(siblings if smt else siblings[:1])
+    return [sorted(group) for group in groups]
+
+
+@dataclass(frozen=True)
+class Slot:
+    """Models executed one after another by one pinned thread."""
+    models: tuple
+    cpus: tuple        # logical CPU ids, empty = not pinned
+    threads: int       # torch intra-op threads
+
+
+@dataclass(frozen=True)
+class Layout:
+    name: str
+    slots: tuple
+
+    def describe(self):
+        return [{"models": list(s.models), "cpus": list(s.cpus), "threads": s.threads} for s in self.slots]
+
+    def merged(self):
+        """The same models, CPUs and threads as a single slot (models run in turn)."""
+        models = tuple(name for slot in self.slots for name in slot.models)
+        cpus = tuple(sorted({cpu for slot in self.slots for cpu in slot.cpus}))
+        if any(not slot.cpus for slot in self.slots):
+            cpus = ()
+        return Layout(self.name, (Slot(models, cpus, sum(slot.threads for slot in self.slots)),))
+
+
+def plan_layouts(model_names, cores=None):
+    """
+    Candidate layouts for running `model_names` on this machine:
+      sequential     one thread runs the models in turn, using every core
+      per_model      every model gets its own physical cores and runs concurrently
+      per_model_smt  as per_model, including the SMT siblings of those cores
+      shared         models run concurrently without pinning, cores split evenly
+    """
+    cores = cores or detect_topology()
+    names = tuple(model_names)
+    logical = sorted(cpu for siblings in cores for cpu in siblings)
+    layouts = {
+        "sequential": Layout("sequential", (Slot(names, tuple(logical), len(cores)),)),
+        "per_model": Layout("per_model", tuple(
+            Slot((name,), tuple(cpus), len(cpus))
+            for name, cpus in zip(names, partition_cores(cores, len(names))))),
+        "shared": Layout("shared", tuple(
+            Slot((name,), (), max(1, len(cores) // len(names))) for name in names)),
+    }
+    if any(len(siblings) > 1 for siblings in cores):
+        layouts["per_model_smt"] = Layout("per_model_smt", tuple(
+            Slot((name,), tuple(cpus), len(cpus))
+            for name, cpus in zip(names, partition_cores(cores, len(names), smt=True))))
+    return layouts
+
+
+def _parse_cpus(text, usable):
+    if text == "*":
+        return ()
+    cpus = set()
+    for part in text.split("+"):
+        first, _, last = part.partition("-")
+        try:
+            cpus.update(range(int(first), int(last or first) + 1))
+        except ValueError:
+            raise ValueError(f"invalid CPU list {text!r}") from None
+    if not cpus or not cpus <= usable:
+        raise ValueError(f"CPU list {text!r} is empty or has CPUs this process may not use ({sorted(usable)})")
+    return tuple(sorted(cpus))
+
+
+def parse_layout(spec, model_names, cores=None):
+    """
+    Layout from an explicit spec, MODELS=CPUS[:THREADS] per slot separated by
+    commas (see AIGNOSIS_CPU_LAYOUT). Every model must be in exactly one slot.
+    """
+    cores = cores or detect_topology()
+    usable = {cpu for siblings in cores for cpu in siblings}
+    names = list(model_names)
+    slots, seen = [], []
+    for part in spec.split(","):
+        models, sep, placement = part.strip().partition("=")
+        if not sep:
+            raise ValueError(f"invalid layout slot {part!r} (use MODELS=CPUS[:THREADS])")
+        models = tuple(name.strip() for name in models.split("+"))
+        unknown = [name for name in models if name not in names]
+        if unknown:
+            raise ValueError(f"unknown model(s) {unknown} in layout slot {part!r} (models: {names})")
+        cpu_text, _, thread_text = placement.strip().partition(":")
+        cpus = _parse_cpus(cpu_text.strip(), usable)
+        try:
+            threads = int(thread_text) if thread_text else len(cpus) or max(1, len(cores) // len(names))
+        except ValueError:
+            raise ValueError(f"invalid thread count in layout slot {part!r}") from None
+        if threads < 1:
+            raise ValueError(f"invalid thread count in layout slot {part!r}")
+        slots.append(Slot(models, cpus, threads))
+        seen.extend(models)
+    if sorted(seen) != sorted(names):
+        raise ValueError(f"layout {spec!r} must place every model exactly once (models: {names})")
+    return Layout("custom", tuple(slots))
+
+
+def resolve_layout(value, model_names, cores=None):
+    """The Layout named by AIGNOSIS_CPU_LAYOUT: a planned layout's name or an explicit spec."""
+    if "=" in value:
+        return parse_layout(value, model_names, cores)
+    layouts = plan_layouts(model_names, cores)
+    if value not in layouts:
+        raise ValueError(f"AIGNOSIS_CPU_LAYOUT must be one of {sorted(layouts)} or a slot spec, got {value!r}")
+    return layouts[value]
+
+
+def intra_op_threads_per_thread():
+    """
+    True if torch's intra-op thread count applies to the calling thread only
+    (OpenMP backend), False if it is process-wide, None without torch.
+    """
+    try:
+        import torch
+    except ImportError:
+        return None
+    return "parallel backend: OpenMP" in torch.__config__.parallel_info()
+
+
+def _set_torch_threads(threads):
+    try:
+        import torch
+        torch.set_num_threads(threads)
+    except ImportError:
+        pass
+
+
+def _start_slot_thread(cpus, threads):
+    pin_current_thread(cpus)
+    _set_torch_threads(threads)
+
+
+def pin_current_thread(cpus):
+    """Restrict the calling thread (and threads it starts later) to `cpus`."""
+    if cpus and hasattr(os, "sched_setaffinity"):
+        os.sched_setaffinity(0, cpus)
+
+
+class ModelScheduler:
+    """
+    Runs the models of `pipelines` according to a Layout: every slot has one
+    dedicated thread pinned to the slot's CPUs, so models in different slots
+    run concurrently on disjoint cores instead of all competing for every
+    core. Calls of one model from several requests queue on its slot thread.
+    Every slot thread sets its own torch intra-op thread count (Slot.threads);
+    the intra-op workers inherit its affinity. That count is per thread only
+    with torch's OpenMP backend: with a process-wide backend (native, TBB)
+    the slots are merged into one slot that runs the models in turn.
+    """
+
+    def __init__(self, pipelines, layout):
+        self.pipelines = pipelines
+        if len(layout.slots) > 1 and intra_op_threads_per_thread() is False:
+            log_event(logger, logging.WARNING, "cpu_layout_merged", layout=layout.name,
+                      reason="torch intra-op thread count is process-wide")
+            layout = layout.merged()
+        self.layout = layout
+        self.executors = {}
+        for slot in layout.slots:
+            executor = ThreadPoolExecutor(
+                max_workers=1, thread_name_prefix=f"aignosis-slot-{'-'.join(slot.models)}",
+                initializer=_start_slot_thread, initargs=(slot.cpus, slot.threads))
+            for name in slot.models:
+                self.executors[name] = executor
+
+    def predict_all(self, texts, **kwargs):
+        """
+        Run every model on `texts` (a list for all models or {model_name:
+        texts}); returns {model_name: pipeline output}.
+        """
+        futures = {
+            name: self.executors[name].submit(contextvars.copy_context().run, wrap(self._timed), name, clf,
+                                              texts[name] if isinstance(texts, dict) else texts, kwargs)
+            for name, clf in self.pipelines.items()
+        }
+        return {name: future.result() for name, future in futures.items()}
+
+    @staticmethod
+    def _timed(name, clf, texts, kwargs):
+        with MODEL_SECONDS.labels(model=name).time():
+            return clf(texts, **kwargs)
+
+    def shutdown(self):
+        for executor in set(self.executors.values()):
+            executor.shutdown(wait=False)
+
+
+def benchmark_layouts(pipelines, texts, clients=None, rounds=5, layouts=None, batch_size=8):
+    """
+    Run every layout with `clients` concurrent callers, each scoring `texts`
+    `rounds` times, and measure throughput (texts/s) and per-call latency.
+    Returns a list of result dicts sorted by throughput, best first.
+    """
+    cores = detect_topology()
+    layouts = layouts or plan_layouts(pipelines, cores)
+    clients = clients or len(pipelines)
+    results = []
+    for name, layout in layouts.items():
+        scheduler = ModelScheduler(pipelines, layout)
+        scheduler.predict_all(texts[:1], batch_size=batch_size)  # warm-up
+        latencies = []
+        lock = threading.Lock()
+
+        def client():
+            for _ in range(rounds):
+                start = time.perf_counter()
+                scheduler.predict_all(texts, batch_size=batch_size)
+                with lock:
+                    latencies.append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        threads = [threading.Thread(target=client) for _ in range(clients)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        elapsed = time.perf_counter() - start
+        scheduler.shutdown()
+        results.append({
+            "layout": name,
+            "slots": layout.describe(),
+            "throughput": round(len(texts) * rounds * clients / elapsed, 2),
+            "latency_p50_ms": round(statistics.median(latencies) * 1000, 1),
+            "latency_max_ms": round(max(latencies) * 1000, 1),
+        })
+    return sorted(results, key=lambda r: r["throughput"], reverse=True)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Sweep CPU layouts for the assessment models")
+    parser.add_argument("--clients", type=int, default=None, help="concurrent callers (default: number of models)")
+    parser.add_argument("--rounds", type=int, default=5)
+    parser.add_argument("--batch", type=int, default=8, help="texts per call")
+    parser.add_argument("--output", help="write the results as JSON to this file")
+    args = parser.parse_args()
+
+    from cardio_core import generate_summary_text
+    from model_artifacts import load_pipelines
+
+    cores = detect_topology()
+    print(f"cores={len(cores)} logical={sum(len(c) for c in cores)}")
+    texts = [
+        generate_summary_text({"Is chest pain aggravated by exertion?": "Yes" if i % 2 else "No"},
+                              {"Do you have hypertension?": "Yes"},
+                              {"Systolic BP (mmHg)": 120 + 5 * i}, "English")
+        for i in range(args.batch)
+    ]
+    results = benchmark_layouts(load_pipelines(), texts, args.clients, args.rounds, batch_size=args.batch)
+    for r in results:
+        print(f"{r['layout']:14s} throughput={r['throughput']:8.2f} texts/s  "
+              f"p50={r['latency_p50_ms']:8.1f} ms  max={r['latency_max_ms']:8.1f} ms")
+    print(f"best layout: {results[0]['layout']}  (set AIGNOSIS_CPU_LAYOUT={results[0]['layout']})")
+    if intra_op_threads_per_thread() is False:
+        print("note: torch's intra-op thread count is process-wide here; multi-slot layouts run as one slot")
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump({"cores": cores, "results": results}, f, indent=2)
@@ -1,18 +1,26 @@
+import logging
+
 import gradio as gr
 
 from transformers import pipeline, AutoModelForSequenceClassification, AutoTokenizer
 
+from serving import PerThreadPipeline, launch
+from text_matcher import PhraseMatcher
+from tracing import get_logger, log_event, span
+
+logger = get_logger("dual_language")
+
 # Load the Hugging Face model and tokenizer explicitly
 model = AutoModelForSequenceClassification.from_pretrained("dmis-lab/biobert-base-cased-v1.1")
 tokenizer = AutoTokenizer.from_pretrained("dmis-lab/biobert-base-cased-v1.1")
 
 # Create the pipeline using the loaded model and tokenizer
-text_analysis_pipeline = pipeline(
+text_analysis_pipeline = PerThreadPipeline(pipeline(
     "text-classification",
     model=model,
     tokenizer=tokenizer,
     framework="pt"  # Explicitly specify PyTorch framework
-)
+))
 # 定义标签映射
 LABEL_MAPPING = {
     "LABEL_0": "低风险 / Low Risk",
@@ -26,22 +34,33 @@ def analyze_free_text(free_text):
         return "无额外信息 / No additional information provided."
     
     try:
-        results = text_analysis_pipeline(free_text)
+        with span("model", model="BioBERT"):
+            results = text_analysis_pipeline(free_text)
         analysis = "\n".join([
             f"{LABEL_MAPPING.get(label['label'], label['label'])}: {label['score']:.2f}"
             for label in results
         ])
-        print(f"Debug: Free Text Analysis = {analysis}")  # 调试输出
+        log_event(logger, logging.DEBUG, "free_text_analysis", analysis=analysis)
         return f"分析结果 / Analysis Results:\n{analysis}"
     except Exception as e:
-        print(f"Error in analyze_free_text: {e}")  # 错误日志
+        log_event(logger, logging.ERROR, "free_text_analysis_failed", error=repr(e))
         return f"无法分析自由文本信息 / Unable to analyze free text information: {e}"
 
+# 风险标签匹配器（启动时构建一次）
+RISK_LABEL_MATCHER = PhraseMatcher({"低风险": ["low"], "高风险": ["high"]}, negation_cues=[])
+
+
+def _risk_levels(text):
+    return {tag for m in RISK_LABEL_MATCHER.find(text) for tag in m.tags}
+
+
 # 检测结构化问题和自由文本分析的冲突
 def detect_conflicts(structured_result, huggingface_analysis):
-    if "低风险" in structured_result and "高风险" in huggingface_analysis:
+    structured_levels = _risk_levels(structured_result)
+    analysis_levels = _risk_levels(huggingface_analysis)
+    if "low" in structured_levels and "high" in analysis_levels:
         return True
-    if "高风险" in structured_result and "低风险" in huggingface_analysis:
+    if "high" in structured_levels and "low" in analysis_levels:
         return True
     return False
 
@@ -49,40 +68,30 @@ def detect_conflicts(structured_result, huggingface_analysis):
 def evaluate_cardiovascular_disease(symptoms, history, lab_params):
     diseases = []
 
-    print(f"Debug: Symptoms = {symptoms}")
-    print(f"Debug: History = {history}")
-    print(f"Debug: Lab Parameters = {lab_params}")
-
     # 高血压（Hypertension）
     if lab_params.get("Systolic BP", 0) > 140 or lab_params.get("Diastolic BP", 0) > 90:
         diseases.append("高血压 / Hypertension")
-        print("Debug: Detected 高血压 / Hypertension")
 
     # 冠心病（Coronary Artery Disease, CAD）
     if history.get("Family History of Heart Disease", False) or lab_params.get("LDL-C", 0) > 130:
         diseases.append("冠心病 / Coronary Artery Disease")
-        print("Debug: Detected 冠心病 / Coronary Artery Disease")
 
     # 心肌梗塞（Myocardial Infarction, MI）
     if symptoms.get("Chest Pain", False) and lab_params.get("Troponin I/T", 0) > 0.04:
         diseases.append("心肌梗塞 / Myocardial Infarction")
-        print("Debug: Detected 心肌梗塞 / Myocardial Infarction")
 
     # 高脂血症（Hyperlipidemia）
     if lab_params.get("Total Cholesterol", 0) > 200 or lab_params.get("LDL-C", 0) > 130:
         diseases.append("高脂血症 / Hyperlipidemia")
-        print("Debug: Detected 高脂血症 / Hyperlipidemia")
 
     # 心力衰竭（Heart Failure）
     if symptoms.get("Shortness of Breath", False) and lab_params.get("BNP", 0) > 100:
         diseases.append("心力衰竭 / Heart Failure")
-        print("Debug: Detected 心力衰竭 / Heart Failure")
 
     if not diseases:
         diseases.append("无明显心血管疾病风险 / No significant cardiovascular disease risk detected")
-        print("Debug: No diseases detected")
 
-    print(f"Debug: Final Detected Diseases = {diseases}")
+    log_event(logger, logging.DEBUG, "diseases_detected", diseases=diseases)
     return diseases
 
 # 综合评估
@@ -90,26 +99,24 @@ def evaluate_cardiovascular_disease(symptoms, history, lab_params):
 def assess_with_huggingface(lang, *inputs):
     if not any(inputs):
         return "⚠️ 输入数据不足，无法完成评估 / Insufficient input data to complete the assessment."
-    
+    with span("assessment", app="dual_language", lang=lang):
+        return _assess_with_huggingface(lang, *inputs)
+
+
+def _assess_with_huggingface(lang, *inputs):
     structured_inputs = inputs[:-1]
     free_text_input = inputs[-1]
 
-    # Debug: Print structured inputs and free text input
-    print(f"Debug: Structured Inputs = {structured_inputs}")
-    print(f"Debug: Free Text Input = {free_text_input}")
+    log_event(logger, logging.DEBUG, "assessment_inputs",
+              structured_inputs=structured_inputs, free_text=free_text_input)
 
     # Process structured inputs
-    structured_result = assess(lang, *structured_inputs)
-
-    # Debug: Print structured result
-    print(f"Debug: Structured Result = {structured_result}")
+    with span("rules.structured"):
+        structured_result = assess(lang, *structured_inputs)
 
     # Analyze free text
     huggingface_analysis = analyze_free_text(free_text_input)
 
-    # Debug: Print Hugging Face analysis result
-    print(f"Debug: Hugging Face Analysis = {huggingface_analysis}")
-
     # Extract symptoms, history, and lab parameters
     symptoms = {
         "Chest Pain": "是" in (structured_inputs[0] or "") if lang == "中文" else "Yes" in (structured_inputs[0] or ""),
@@ -127,16 +134,9 @@ def assess_with_huggingface(lang, *inputs):
         "Troponin I/T": structured_inputs[-1],
     }
 
-    # Debug: Print extracted symptoms, history, and lab parameters
-    print(f"Debug: Symptoms = {symptoms}")
-    print(f"Debug: History = {history}")
-    print(f"Debug: Lab Parameters = {lab_params}")
-
     # Evaluate diseases
-    diseases = evaluate_cardiovascular_disease(symptoms, history, lab_params)
-
-    # Debug: Print detected diseases
-    print(f"Debug: Detected Diseases = {diseases}")
+    with span("rules.diseases"):
+        diseases = evaluate_cardiovascular_disease(symptoms, history, lab_params)
 
     # Detect conflicts
     conflict_detected = detect_conflicts(structured_result, huggingface_analysis)
@@ -159,9 +159,8 @@ def assess_with_huggingface(lang, *inputs):
     combined_result += "\n\n### 综合评估 / Combined Assessment:\n"
     combined_result += "综合考虑结构化问题和自由输入的结果，建议用户根据以上信息采取适当的行动。"
 
-    # Debug: Print combined result
-    print(f"Debug: Combined Result = {combined_result}")
-
+    log_event(logger, logging.DEBUG, "assessment_result",
+              structured_result=structured_result, diseases=diseases, conflict=conflict_detected)
     return combined_result
 
 def assess_with_huggingface_1(lang, *inputs):
@@ -170,23 +169,15 @@ def assess_with_huggingface_1(lang, *inputs):
     structured_inputs = inputs[:-1]
     free_text_input = inputs[-1]
 
-    # Debug: Print structured inputs and free text input
-    print(f"Debug: Structured Inputs = {structured_inputs}")
-    print(f"Debug: Free Text Input = {free_text_input}")
-
+    log_event(logger, logging.DEBUG, "assessment_inputs",
+              structured_inputs=structured_inputs, free_text=free_text_input)
 
     # Process structured inputs
     structured_result = assess(lang, *structured_inputs)
 
-    # Debug: Print structured result
-    print(f"Debug: Structured Result = {structured_result}")
-
     # Analyze free text
     huggingface_analysis = analyze_free_text(free_text_input)
 
-    # Debug: Print Hugging Face analysis result
-    print(f"Debug: Hugging Face Analysis = {huggingface_analysis}")
-
     # Detect conflicts
     conflict_detected = detect_conflicts(structured_result, huggingface_analysis)
 
@@ -205,13 +196,14 @@ def assess_with_huggingface_1(lang, *inputs):
     combined_result += "### 综合评估 / Combined Assessment:\n"
     combined_result += "综合考虑结构化问题和自由输入的结果，建议用户根据以上信息采取适当的行动。"
 
-    print(f"Debug: Combined Result = {combined_result}")  # 调试输出
+    log_event(logger, logging.DEBUG, "assessment_result",
+              structured_result=structured_result, conflict=conflict_detected)
     return combined_result
 
 # 评估结构化问题
 def assess(lang, *inputs):
     risk_score = sum(1 for i in inputs if i == ("是" if lang == "中文" else "Yes"))
-    print(f"Debug: Risk Score = {risk_score}")  # 调试输出
+    log_event(logger, logging.DEBUG, "structured_risk_score", risk_score=risk_score)
     if risk_score >= 5:
         return "🔴 高风险 / High Risk"
     elif risk_score >= 3:
@@ -341,13 +333,6 @@ def make_tab(lang):
             outputs=symptom_fields + history_fields + lab_fields + [free_text, output]
         )
 
-        # Debugging: Print the reset values
-        print(f"Reset Values for Symptom Fields: {[L['no']] * len(symptom_fields)}")
-        print(f"Reset Values for History Fields: {[L['no']] * len(history_fields)}")
-        print(f"Reset Values for Number Fields: {[val for _, _, _, val in L['nums']]}")
-        print(f"Reset Value for Free Text: {''}")
-        print(f"Reset Value for Output: {''}")
-
 def make_tab_1(lang):
     L = {
         "yes": "是", 
@@ -426,4 +411,4 @@ if __name__ == "__main__":
         with gr.Tabs():
             make_tab("中文")
             make_tab("English")
-        app.launch(share=True)
\ No newline at end of file
+    launch(app, share=True)
\ No newline at end of file
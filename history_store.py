@@ -0,0 +1,366 @@
+import argparse
+import atexit
+import json
+import logging
+import os
+import queue
+import sqlite3
+import threading
+import time
+
+from cardio_core import LABEL_MAPPING, canonical_lab_key, encode_compact
+from metrics import ERRORS, QUEUE_DEPTH, REGISTRY, simple_collector
+from tracing import get_logger, log_event
+
+# ---------------------- Configuration ----------------------
+# Opt-in: with AIGNOSIS_HISTORY_DB set, every assessment is recorded in an
+# embedded SQLite database (WAL mode): canonical features, lab values, model
+# probabilities, HEART score, final risk and stage timings. This is patient
+# data, so nothing is recorded unless the database is configured. Requests
+# only queue the record; a background thread writes the queue in batches,
+# one transaction per batch.
+# AIGNOSIS_HISTORY_DB              database file (unset/empty = assessments are not recorded)
+# AIGNOSIS_HISTORY_RETENTION_DAYS  assessments older than this are deleted (0 = keep all)
+# AIGNOSIS_HISTORY_BATCH           max assessments written per transaction
+# AIGNOSIS_HISTORY_FLUSH_MS        max time a record waits in the queue for more to batch with
+# AIGNOSIS_HISTORY_QUEUE           max records waiting; further ones are dropped (and counted)
+HISTORY_DB = os.getenv("AIGNOSIS_HISTORY_DB", "")
+RETENTION_DAYS = float(os.getenv("AIGNOSIS_HISTORY_RETENTION_DAYS", 365))
+BATCH_SIZE = int(os.getenv("AIGNOSIS_HISTORY_BATCH", 200))
+FLUSH_MS = int(os.getenv("AIGNOSIS_HISTORY_FLUSH_MS", 250))
+QUEUE_SIZE = int(os.getenv("AIGNOSIS_HISTORY_QUEUE", 10000))
+# Retention and compaction run at startup and then at this interval
+COMPACT_INTERVAL = 3600
+
+logger = get_logger("history_store")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS assessments (
+    id          INTEGER PRIMARY KEY,
+    created_at  REAL NOT NULL,      -- unix time
+    patient_id  TEXT,
+    lang        TEXT NOT NULL,
+    features    TEXT NOT NULL,      -- cardio_core.encode_compact of the answers and labs
+    final_risk  TEXT,               -- English risk label, whatever the language
+    heart_score INTEGER,
+    heart_risk  TEXT,
+    risk_scores TEXT,               -- JSON {risk label: weighted score}
+    models      TEXT,               -- JSON {model: {risk label: probability}}
+    degraded    TEXT,               -- JSON list of the stages skipped under load, or NULL
+    timings     TEXT,               -- JSON {stage: seconds, "total": seconds}
+    rules       TEXT                -- JSON list of the rule-based findings (English)
+);
+CREATE TABLE IF NOT EXISTS lab_values (
+    assessment_id INTEGER NOT NULL REFERENCES assessments(id) ON DELETE CASCADE,
+    patient_id    TEXT,
+    created_at    REAL NOT NULL,
+    lab           TEXT NOT NULL,    -- cardio_core.canonical_lab_key
+    value         REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS lab_trends (
+    patient_id  TEXT NOT NULL,
+    lab         TEXT NOT NULL,
+    updated_at  REAL NOT NULL,
+    state       TEXT NOT NULL,      -- JSON running statistics (lab_trends.AnalyteStats)
+    PRIMARY KEY (patient_id, lab)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS assessments_patient ON assessments (patient_id, created_at);
+CREATE INDEX IF NOT EXISTS assessments_created ON assessments (created_at);
+CREATE INDEX IF NOT EXISTS lab_values_patient ON lab_values (patient_id, lab, created_at);
+CREATE INDEX IF NOT EXISTS lab_values_assessment ON lab_values (assessment_id);
+"""
+JSON_COLUMNS = ("risk_scores", "models", "degraded", "timings", "rules")
+# Columns added after the first release: (name, declaration), added to older databases on open
+ADDED_COLUMNS = (("rules", "TEXT"),)
+
+# Risk label in either language -> English label
+RISK_LABELS = {names[lang]: names["English"] for names in LABEL_MAPPING.values() for lang in names}
+# Rule-based finding (cardio_core.classify_cardiovascular_disease) -> English name; None = no finding
+RULE_LABELS = {
+    "高血压 (严重)": "Hypertension (Severe)", "高血压 (中度)": "Hypertension (Moderate)",
+    "高血压 (轻度)": "Hypertension (Mild)", "冠心病": "Coronary Artery Disease", "心肌梗塞": "Myocardial Infarction",
+    "高脂血症": "Hyperlipidemia", "心力衰竭": "Heart Failure",
+    "无明显心血管疾病风险": None, "No significant cardiovascular disease risk detected": None,
+}
+
+
+def _json(value):
+    return None if value is None else json.dumps(value, ensure_ascii=False, separators=(",", ":"))
+
+
+def history_entry(patient_id, lang, symptoms, history, labs, result, timings, trend_states=None, rules=None,
+                  created_at=None):
+    """
+    The record of one assessment: the form answers and merged lab values of
+    the request, and its AssessmentResult (see report_renderer.py).
+    trend_states: {lab: state} of the lab trend series the assessment changed
+    (lab_trends.TrendTracker.observe).
+    rules: the findings of the rules stage (classify_cardiovascular_disease).
+    """
+    lab_values = []
+    for label, value in labs.items():
+        try:
+            lab_values.append((canonical_lab_key(label), float(value)))
+        except (TypeError, ValueError):
+            continue
+    return {
+        "created_at": time.time() if created_at is None else created_at,
+        "patient_id": patient_id or None,
+        "lang": lang,
+        "features": encode_compact(symptoms, history, labs),
+        "final_risk": RISK_LABELS.get(result.final_risk, result.final_risk),
+        "heart_score": result.heart_score,
+        "heart_risk": RISK_LABELS.get(result.heart_risk, result.heart_risk),
+        "risk_scores": {RISK_LABELS.get(k, k): round(v, 4) for k, v in result.risk_scores.items()},
+        "models": {m.name: {RISK_LABELS.get(k, k): round(v, 4) for k, v in m.ranked} for m in result.models},
+        "degraded": result.degraded or None,
+        "timings": {stage: round(seconds, 6) for stage, seconds in timings.items()},
+        "rules": [name for name in (RULE_LABELS.get(finding, finding) for finding in rules or []) if name],
+        "labs": lab_values,
+        "trend_states": trend_states or {},
+    }
+
+
+class HistoryStore:
+    """
+    Assessment history in a SQLite database. record() only queues the entry;
+    one writer thread (started on first use) writes the queue in batches and
+    applies the retention policy. Queries open their own connection, so they
+    run alongside the writer (WAL).
+    """
+
+    def __init__(self, path=HISTORY_DB, retention_days=RETENTION_DAYS, batch_size=BATCH_SIZE,
+                 flush_ms=FLUSH_MS, queue_size=QUEUE_SIZE):
+        self.path = path
+        self.retention_days = retention_days
+        self.batch_size = batch_size
+        self.flush_interval = flush_ms / 1000
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._thread = None
+        self._lock = threading.Lock()
+        self.written = 0
+        self.dropped = 0
+        self.failed = 0
+        self.deleted = 0
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=30)
+        conn.execute("PRAGMA foreign_keys = ON")
+        return conn
+
+    def _create(self):
+        directory = os.path.dirname(os.path.abspath(self.path))
+        os.makedirs(directory, exist_ok=True)
+        conn = self._connect()
+        # auto_vacuum only takes effect before the first table is created
+        conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+        conn.execute("PRAGMA journal_mode = WAL")
+        # With WAL, NORMAL only risks the last transactions on power loss, never corruption
+        conn.execute("PRAGMA synchronous = NORMAL")
+        conn.executescript(SCHEMA)
+        columns = {row[1] for row in conn.execute("PRAGMA table_info(assessments)")}
+        for name, declaration in ADDED_COLUMNS:
+            if name not in columns:
+                conn.execute(f"ALTER TABLE assessments ADD COLUMN {name} {declaration}")
+        return conn
+
+    def start(self):
+        with self._lock:
+            if self._thread is None:
+                # Create the schema before any request can query it
+                self._create().close()
+                self._thread = threading.Thread(target=self._run, name="history-writer", daemon=True)
+                self._thread.start()
+                atexit.register(self.close)
+        return self
+
+    def record(self, entry):
+        """Queue an entry from history_entry(); never blocks the request."""
+        if self._thread is None:
+            self.start()
+        try:
+            self._queue.put_nowait(entry)
+        except queue.Full:
+            self.dropped += 1
+
+    def pending(self):
+        return self._queue.qsize()
+
+    def flush(self):
+        """Wait until every queued entry is written."""
+        if self._thread is not None:
+            self._queue.join()
+
+    def close(self):
+        """Write what is queued and stop the writer thread."""
+        with self._lock:
+            thread, self._thread = self._thread, None
+        if thread is not None and thread.is_alive():
+            self._queue.put(None)
+            thread.join()
+
+    def _run(self):
+        conn = self._create()
+        next_compaction = time.monotonic()
+        while True:
+            try:
+                first = self._queue.get(timeout=max(0.0, next_compaction - time.monotonic()))
+            except queue.Empty:
+                self._compact(conn)
+                next_compaction = time.monotonic() + COMPACT_INTERVAL
+                continue
+            batch = [first]
+            deadline = time.monotonic() + self.flush_interval
+            while first is not None and batch[-1] is not None and len(batch) < self.batch_size:
+                try:
+                    batch.append(self._queue.get(timeout=max(0.0, deadline - time.monotonic())))
+                except queue.Empty:
+                    break
+            entries = [entry for entry in batch if entry is not None]
+            if entries:
+                self._write(conn, entries)
+            for _ in batch:
+                self._queue.task_done()
+            if len(entries) < len(batch):
+                conn.close()
+                return
+
+    def _write(self, conn, entries):
+        try:
+            with conn:
+                for entry in entries:
+                    cursor = conn.execute(
+                        "INSERT INTO assessments (created_at, patient_id, lang, features, final_risk, heart_score,"
+                        " heart_risk, risk_scores, models, degraded, timings, rules)"
+                        " VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                        (entry["created_at"], entry["patient_id"], entry["lang"], entry["features"],
+                         entry["final_risk"], entry["heart_score"], entry["heart_risk"],
+                         *(_json(entry[column]) for column in JSON_COLUMNS)))
+                    conn.executemany(
+                        "INSERT INTO lab_values (assessment_id, patient_id, created_at, lab, value) VALUES (?, ?, ?, ?, ?)",
+                        [(cursor.lastrowid, entry["patient_id"], entry["created_at"], lab, value)
+                         for lab, value in entry["labs"]])
+                    conn.executemany(
+                        "INSERT OR REPLACE INTO lab_trends (patient_id, lab, updated_at, state) VALUES (?, ?, ?, ?)",
+                        [(entry["patient_id"], lab, entry["created_at"], _json(state))
+                         for lab, state in entry["trend_states"].items()])
+            self.written += len(entries)
+        except sqlite3.Error as e:
+            self.failed += len(entries)
+            ERRORS.labels(where="history").inc()
+            log_event(logger, logging.ERROR, "history_write_failed", entries=len(entries), error=repr(e))
+
+    def _compact(self, conn):
+        # Retention, then return the freed pages to the file system and trim the WAL
+        try:
+            if self.retention_days:
+                cutoff = time.time() - self.retention_days * 86400
+                with conn:
+                    deleted = conn.execute("DELETE FROM assessments WHERE created_at < ?", (cutoff,)).rowcount
+                    conn.execute("DELETE FROM lab_trends WHERE updated_at < ?", (cutoff,))
+                self.deleted += deleted
+                if deleted:
+                    log_event(logger, logging.INFO, "history_retention", deleted=deleted)
+            conn.execute("PRAGMA incremental_vacuum")
+            conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        except sqlite3.Error as e:
+            ERRORS.labels(where="history").inc()
+            log_event(logger, logging.ERROR, "history_compaction_failed", error=repr(e))
+
+    def _query(self, sql, params):
+        if not os.path.exists(self.path):
+            return []
+        conn = sqlite3.connect(self.path, timeout=30)
+        conn.row_factory = sqlite3.Row
+        try:
+            return [dict(row) for row in conn.execute(sql, params)]
+        finally:
+            conn.close()
+
+    def assessments(self, patient_id=None, since=None, until=None, limit=100):
+        """
+        Recorded assessments, newest first, of one patient and/or within
+        [since, until) (unix times); JSON columns are decoded.
+        """
+        where, params = [], []
+        if patient_id is not None:
+            where.append("patient_id = ?")
+            params.append(patient_id)
+        if since is not None:
+            where.append("created_at >= ?")
+            params.append(since)
+        if until is not None:
+            where.append("created_at < ?")
+            params.append(until)
+        sql = "SELECT * FROM assessments"
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+        rows = self._query(sql + " ORDER BY created_at DESC LIMIT ?", params + [limit])
+        for row in rows:
+            for column in JSON_COLUMNS:
+                if row[column] is not None:
+                    row[column] = json.loads(row[column])
+        return rows
+
+    def lab_values(self, patient_id, lab=None, since=None):
+        """[(created_at, lab, value), ...] of one patient, oldest first."""
+        sql = "SELECT created_at, lab, value FROM lab_values WHERE patient_id = ?"
+        params = [patient_id]
+        if lab is not None:
+            sql += " AND lab = ?"
+            params.append(lab)
+        if since is not None:
+            sql += " AND created_at >= ?"
+            params.append(since)
+        return [(r["created_at"], r["lab"], r["value"]) for r in self._query(sql + " ORDER BY created_at", params)]
+
+    def trend_states(self, patient_id):
+        """{lab: state} of the patient's lab trend series (see lab_trends.py)."""
+        rows = self._query("SELECT lab, state FROM lab_trends WHERE patient_id = ?", [patient_id])
+        return {row["lab"]: json.loads(row["state"]) for row in rows}
+
+    def stats(self):
+        return {"path": self.path, "queued": self.pending(), "written": self.written,
+                "dropped": self.dropped, "failed": self.failed, "deleted": self.deleted}
+
+
+def open_history_store(path=HISTORY_DB):
+    """The HistoryStore of `path` with its metrics registered, or None when recording is disabled."""
+    if not path:
+        return None
+    store = HistoryStore(path)
+    QUEUE_DEPTH.labels(queue="history").set_function(store.pending)
+    REGISTRY.register_collector(simple_collector(
+        "aignosis_history_records_total", "counter", "Assessment history records by outcome",
+        lambda: [({"outcome": outcome}, getattr(store, outcome)) for outcome in ("written", "dropped", "failed")]))
+    return store
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Query the assessment history")
+    parser.add_argument("--db", default=HISTORY_DB or None, required=not HISTORY_DB,
+                        help="database file (default: AIGNOSIS_HISTORY_DB)")
+    sub = parser.add_subparsers(dest="command", required=True)
+    show = sub.add_parser("show", help="print recorded assessments as JSON lines")
+    show.add_argument("--patient")
+    show.add_argument("--days", type=float, help="only the last DAYS days")
+    show.add_argument("--limit", type=int, default=20)
+    compact = sub.add_parser("compact", help="apply the retention policy and compact the database now")
+    compact.add_argument("--retention-days", type=float, default=RETENTION_DAYS)
+    args = parser.parse_args(argv)
+
+    store = HistoryStore(args.db)
+    if args.command == "show":
+        since = time.time() - args.days * 86400 if args.days else None
+        for row in store.assessments(args.patient, since=since, limit=args.limit):
+            print(json.dumps(row, ensure_ascii=False))
+    else:
+        store.retention_days = args.retention_days
+        conn = store._create()
+        store._compact(conn)
+        conn.close()
+        print(f"deleted {store.deleted} assessments")
+
+
+if __name__ == "__main__":
+    main()
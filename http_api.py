@@ -0,0 +1,199 @@
+import argparse
+import gzip
+import json
+import logging
+import math
+import os
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import admission
+import assessment
+import metrics
+from tracing import get_logger, log_event, span
+
+# Headless JSON API around the assessment pipeline (no Gradio import).
+#
+#   GET  /healthz           liveness check
+#   POST /v1/assess         one patient  -> JSON payload
+#   POST /v1/assess/batch   {"patients": [...]} -> {"results": [...]}
+#   GET  /v1/assess/pending/<id>   full result of a degraded assessment
+#   GET  /metrics           Prometheus text metrics
+#
+# Under load a result may be "degraded" (rules + HEART score only); its
+# "pending_id" then points to the full result once the models have finished.
+#
+# A patient is {"symptoms": {...}, "history": {...}, "lab_params": {...},
+# "extra_text": "...", "lang": "中文" | "English", "with_summary": false,
+# "patient_id": "..."}; the patient_id (optional) keys the assessment history
+# and the lab trends in the result.
+# With AIGNOSIS_API_PROFILING=1, "debug": true on POST /v1/assess profiles
+# the request and returns the profile file names under "profile".
+# Keys of symptoms/history/lab_params are the same question labels used by the
+# Gradio form of the chosen language; lab_params values must be numbers.
+
+MAX_BATCH = int(os.getenv("AIGNOSIS_API_MAX_BATCH", 64))
+MAX_BODY_BYTES = int(os.getenv("AIGNOSIS_API_MAX_BODY", 2 * 1024 * 1024))
+GZIP_MIN_BYTES = 1024
+API_PROFILING = os.getenv("AIGNOSIS_API_PROFILING", "0") == "1"
+
+logger = get_logger("http_api")
+
+
+class ApiError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+
+
+def _validate_patient(patient):
+    if not isinstance(patient, dict):
+        raise ApiError(400, "patient must be a JSON object")
+    for key in ("symptoms", "history", "lab_params"):
+        if not isinstance(patient.get(key, {}), dict):
+            raise ApiError(400, f"'{key}' must be an object")
+    for label, value in (patient.get("lab_params") or {}).items():
+        if isinstance(value, bool) or not isinstance(value, (int, float)) or not math.isfinite(value):
+            raise ApiError(400, f"'lab_params' value of '{label}' must be a number")
+    if patient.get("lang", "English") not in ("中文", "English"):
+        raise ApiError(400, "'lang' must be '中文' or 'English'")
+    if not isinstance(patient.get("patient_id", ""), (str, type(None))):
+        raise ApiError(400, "'patient_id' must be a string")
+    return patient
+
+
+def assess_one(patient):
+    patient = _validate_patient(patient)
+    if patient.get("debug"):
+        if not API_PROFILING:
+            raise ApiError(403, "profiling is disabled (AIGNOSIS_API_PROFILING=1)")
+        symptoms = dict(patient.get("symptoms") or {}, __extra_text__=patient.get("extra_text") or "")
+        return json.loads(assessment.analyze_structured_inputs(
+            symptoms, patient.get("history") or {}, patient.get("lab_params") or {}, None,
+            patient.get("lang", "English"), output_format="json",
+            with_summary=bool(patient.get("with_summary")), debug=True, patient_id=patient.get("patient_id")))
+    return assessment.analyze_batch([patient])[0]
+
+
+def assess_many(patients):
+    if not isinstance(patients, list) or not patients:
+        raise ApiError(400, "'patients' must be a non-empty list")
+    if len(patients) > MAX_BATCH:
+        raise ApiError(413, f"batch too large (max {MAX_BATCH})")
+    return assessment.analyze_batch([_validate_patient(p) for p in patients])
+
+
+class AssessmentHandler(BaseHTTPRequestHandler):
+    # HTTP/1.1 keeps connections alive between requests
+    protocol_version = "HTTP/1.1"
+    server_version = "aignosis-api"
+    # Headers and body are separate writes; with Nagle on, keep-alive
+    # responses wait for the client's delayed ACK (~40 ms each)
+    disable_nagle_algorithm = True
+
+    def do_GET(self):
+        if self.path == "/healthz":
+            status = {"status": "ok", "models": list(assessment.pipelines), "admission": admission.stats()}
+            if assessment.model_manager is not None:
+                status["model_memory"] = assessment.model_manager.stats()
+            if assessment.HISTORY_STORE is not None:
+                status["history"] = assessment.HISTORY_STORE.stats()
+            if assessment.inference_pool is not None:
+                status["workers"] = assessment.inference_pool.health()
+                status["pending"] = assessment.inference_pool.pending()
+                if not all(w["alive"] for w in status["workers"]):
+                    status["status"] = "degraded"
+            self._send(200, status)
+        elif self.path == "/metrics":
+            self._send_text(200, metrics.REGISTRY.render(), metrics.CONTENT_TYPE)
+        elif self.path.startswith("/v1/assess/pending/"):
+            pending = admission.PENDING.get(self.path.rsplit("/", 1)[1])
+            if pending is None:
+                self._send(404, {"error": "unknown or expired pending id"})
+            else:
+                self._send(200, pending)
+        else:
+            self._send(404, {"error": "not found"})
+
+    def do_POST(self):
+        try:
+            body = self._read_json()
+            with span("http", path=self.path):
+                if self.path == "/v1/assess":
+                    self._send(200, assess_one(body))
+                elif self.path == "/v1/assess/batch":
+                    self._send(200, {"results": assess_many(body.get("patients") if isinstance(body, dict) else None)})
+                else:
+                    self._send(404, {"error": "not found"})
+        except ApiError as e:
+            self._send(e.status, {"error": e.message})
+        except Exception as e:
+            metrics.ERRORS.labels(where="http").inc()
+            log_event(logger, logging.ERROR, "request_failed", path=self.path, error=repr(e))
+            self._send(500, {"error": "internal error"})
+
+    def _read_json(self):
+        try:
+            length = int(self.headers.get("Content-Length") or 0)
+        except ValueError:
+            length = -1
+        if length < 0 or length > MAX_BODY_BYTES:
+            # The body is left unread: close the connection after the error,
+            # or its bytes would be parsed as the next request
+            self.close_connection = True
+            if length < 0:
+                raise ApiError(400, "invalid Content-Length")
+            raise ApiError(413, "request body too large")
+        raw = self.rfile.read(length)
+        if self.headers.get("Content-Encoding", "").lower() == "gzip":
+            # The limit applies to the decompressed body too (no gzip bombs)
+            decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+            try:
+                raw = decompressor.decompress(raw, MAX_BODY_BYTES + 1)
+            except zlib.error:
+                raise ApiError(400, "invalid gzip body")
+            if len(raw) > MAX_BODY_BYTES:
+                raise ApiError(413, "request body too large")
+        try:
+            return json.loads(raw or b"{}")
+        except ValueError:
+            raise ApiError(400, "invalid JSON")
+
+    def _send(self, status, payload):
+        body = json.dumps(payload, ensure_ascii=False, separators=(",", ":"))
+        self._send_text(status, body, "application/json; charset=utf-8")
+
+    def _send_text(self, status, body, content_type):
+        body = body.encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        if len(body) >= GZIP_MIN_BYTES and "gzip" in self.headers.get("Accept-Encoding", ""):
+            body = gzip.compress(body, compresslevel=5)
+            self.send_header("Content-Encoding", "gzip")
+        self.send_header("Content-Length", str(len(body)))
+        if self.close_connection:
+            self.send_header("Connection", "close")
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        log_event(logger, logging.DEBUG, "access", client=self.client_address[0], line=format % args)
+
+
+def make_server(host="127.0.0.1", port=8080):
+    server = ThreadingHTTPServer((host, port), AssessmentHandler)
+    server.daemon_threads = True
+    return server
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Headless JSON API for the cardiovascular assessment")
+    parser.add_argument("--host", default=os.getenv("AIGNOSIS_API_HOST", "127.0.0.1"))
+    parser.add_argument("--port", type=int, default=int(os.getenv("AIGNOSIS_API_PORT", 8080)))
+    args = parser.parse_args()
+    # Fork inference workers (if configured) before the server starts its threads
+    assessment.start_inference_workers()
+    server = make_server(args.host, args.port)
+    print(f"Serving assessment API on http://{args.host}:{args.port}")
+    server.serve_forever()
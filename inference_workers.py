@@ -0,0 +1,376 @@
+import gc
+import itertools
+import logging
+import multiprocessing as mp
+import multiprocessing.connection as mp_connection
+import multiprocessing.reduction as mp_reduction
+import os
+import signal
+import threading
+import time
+from concurrent.futures import Future
+
+from metrics import MODEL_SECONDS
+from tracing import get_logger, log_event
+
+logger = get_logger("inference_workers")
+
+# ---------------------- Configuration ----------------------
+# AIGNOSIS_INFERENCE_WORKERS   number of pre-forked inference processes (0 = run models in-process)
+# AIGNOSIS_INFERENCE_THREADS   torch intra-op threads per worker process
+# AIGNOSIS_INFERENCE_TIMEOUT   seconds a job may run before its worker is considered hung
+WORKERS = int(os.getenv("AIGNOSIS_INFERENCE_WORKERS", 0))
+WORKER_THREADS = int(os.getenv("AIGNOSIS_INFERENCE_THREADS", 1))
+JOB_TIMEOUT = float(os.getenv("AIGNOSIS_INFERENCE_TIMEOUT", 60))
+HEALTH_INTERVAL = 1.0
+HEARTBEAT_TIMEOUT = 10.0
+
+
+class WorkerCrashed(RuntimeError):
+    """The worker running a job died or hung before returning a result."""
+
+
+def _worker_main(index, pipelines, conn, heartbeats, current_jobs, job_started, torch_threads, cpus):
+    # Ctrl-C is handled by the parent, which shuts the pool down
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    if cpus:
+        os.sched_setaffinity(0, cpus)
+        torch_threads = torch_threads or len(cpus)
+    if torch_threads:
+        try:
+            import torch
+            torch.set_num_threads(torch_threads)
+        except ImportError:
+            pass
+    while True:
+        heartbeats[index] = time.time()
+        if not conn.poll(1.0):
+            continue
+        try:
+            job = conn.recv()
+        except EOFError:
+            break
+        if job is None:
+            break
+        job_id, texts, kwargs = job
+        current_jobs[index] = job_id
+        job_started[index] = time.time()
+        try:
+            outputs, timings = {}, {}
+            for name, clf in pipelines.items():
+                start = time.perf_counter()
+                outputs[name] = clf(texts[name] if isinstance(texts, dict) else texts, **kwargs)
+                timings[name] = time.perf_counter() - start
+            conn.send((job_id, True, (outputs, timings)))
+        except Exception as e:
+            conn.send((job_id, False, repr(e)))
+        current_jobs[index] = 0
+
+
+def _zygote_main(pipelines, control, heartbeats, current_jobs, job_started, torch_threads):
+    # Fork server: forked by start() while the parent has no other thread, it
+    # stays single-threaded and forks the replacement workers, which get the
+    # same copy-on-write weights without inheriting the parent's locks
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    # Its workers are watched by the pool through their pid; let the kernel reap them
+    signal.signal(signal.SIGCHLD, signal.SIG_IGN)
+    while True:
+        try:
+            request = control.recv()
+            if request is None:
+                break
+            index, cpus = request
+            fd = mp_reduction.recv_handle(control)
+        except (EOFError, OSError):
+            break
+        pid = os.fork()
+        if pid == 0:
+            code = 0
+            try:
+                control.close()
+                signal.signal(signal.SIGCHLD, signal.SIG_DFL)
+                _worker_main(index, pipelines, mp_connection.Connection(fd), heartbeats, current_jobs,
+                             job_started, torch_threads, cpus)
+            except BaseException:
+                code = 1
+            finally:
+                os._exit(code)
+        os.close(fd)
+        control.send(pid)
+
+
+class _ForkedWorker:
+    """A worker forked by the fork server, with the Process methods the pool uses."""
+
+    def __init__(self, pid):
+        self.pid = pid
+        self.exitcode = None    # reaped by the fork server, not known here
+
+    def is_alive(self):
+        try:
+            os.kill(self.pid, 0)
+        except ProcessLookupError:
+            return False
+        except PermissionError:
+            pass
+        return True
+
+    def kill(self):
+        try:
+            os.kill(self.pid, signal.SIGKILL)
+        except ProcessLookupError:
+            pass
+
+    def join(self, timeout=None):
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while self.is_alive() and (deadline is None or time.monotonic() < deadline):
+            time.sleep(0.01)
+
+
+class InferenceWorkerPool:
+    """
+    Pre-fork pool of inference processes.
+    The parent loads the model weights once; `start()` forks the workers, which
+    inherit the weights copy-on-write (gc.freeze() keeps the garbage collector
+    from dirtying the inherited pages). Every worker has its own pipe, so a
+    crashed worker cannot leave a shared queue locked; jobs go to the worker
+    with the fewest outstanding jobs and every worker runs all models on the
+    texts of a job.
+    A monitor thread stops workers that died or hung, fails their outstanding
+    jobs with WorkerCrashed and starts a replacement. The parent does not fork
+    it itself: by then it runs other threads, and a fork could inherit a lock
+    one of them holds (logging, queues, tokenizer pools) and deadlock. start()
+    also forks a fork server (zygote) while the parent is still
+    single-threaded, and the monitor asks it for the replacements. If the fork
+    server is gone, a failed worker stays retired; once none is left,
+    available() is False and the caller runs inference in-process.
+
+    Start the pool before launching any other threads and before running any
+    inference in the parent.
+    cpu_sets: optional list with the CPUs of every worker (see
+    cpu_scheduler.partition_cores); a pinned worker uses one torch thread per
+    CPU unless torch_threads is given.
+    """
+
+    def __init__(self, pipelines, workers, torch_threads=WORKER_THREADS, job_timeout=JOB_TIMEOUT, cpu_sets=None):
+        self.pipelines = pipelines
+        self.workers = workers
+        self.torch_threads = torch_threads
+        self.cpu_sets = cpu_sets or [None] * workers
+        self.job_timeout = job_timeout
+        self.ctx = mp.get_context("fork")
+        self.heartbeats = self.ctx.Array("d", workers, lock=False)
+        self.current_jobs = self.ctx.Array("q", workers, lock=False)
+        self.job_started = self.ctx.Array("d", workers, lock=False)
+        self.processes = [None] * workers
+        self.conns = [None] * workers
+        self.outstanding = [dict() for _ in range(workers)]   # job_id -> Future
+        self.retired = [None] * workers   # why a worker was stopped (died/hung/stalled), None while serving
+        self.restarts = [0] * workers
+        self.zygote = None
+        self._control = None    # pipe to the fork server
+        self._lock = threading.Lock()
+        self._zygote_lock = threading.Lock()
+        self._ids = itertools.count(1)
+        self._closed = False
+
+    def start(self):
+        gc.collect()
+        gc.freeze()
+        # The fork server first, so it holds none of the workers' pipes
+        self._control, child_control = self.ctx.Pipe()
+        self.zygote = self.ctx.Process(
+            target=_zygote_main,
+            args=(self.pipelines, child_control, self.heartbeats, self.current_jobs, self.job_started,
+                  self.torch_threads),
+            name="aignosis-inference-zygote",
+            daemon=True)
+        self.zygote.start()
+        child_control.close()
+        for index in range(self.workers):
+            self._spawn(index)
+        threading.Thread(target=self._collect, name="aignosis-inference-results", daemon=True).start()
+        threading.Thread(target=self._monitor, name="aignosis-inference-monitor", daemon=True).start()
+        return self
+
+    def _spawn(self, index):
+        self.heartbeats[index] = time.time()
+        self.current_jobs[index] = 0
+        parent_conn, child_conn = self.ctx.Pipe()
+        process = self.ctx.Process(
+            target=_worker_main,
+            args=(index, self.pipelines, child_conn, self.heartbeats,
+                  self.current_jobs, self.job_started, self.torch_threads, self.cpu_sets[index]),
+            name=f"aignosis-inference-{index}",
+            daemon=True)
+        process.start()
+        child_conn.close()
+        self.processes[index] = process
+        self.conns[index] = parent_conn
+
+    def _respawn(self, index):
+        # A replacement for worker `index`, forked by the fork server; None if it is gone
+        parent_conn, child_conn = self.ctx.Pipe()
+        try:
+            with self._zygote_lock:
+                self.heartbeats[index] = time.time()
+                self.current_jobs[index] = 0
+                self._control.send((index, self.cpu_sets[index]))
+                mp_reduction.send_handle(self._control, child_conn.fileno(), self.zygote.pid)
+                if not self._control.poll(5):
+                    raise OSError("fork server did not answer")
+                pid = self._control.recv()
+        except (EOFError, OSError) as e:
+            parent_conn.close()
+            log_event(logger, logging.ERROR, "inference_zygote_failed", worker=index, error=repr(e))
+            return None
+        finally:
+            child_conn.close()
+        return _ForkedWorker(pid), parent_conn
+
+    def submit(self, texts, **kwargs):
+        """
+        Queue a job; the Future resolves to {model_name: pipeline output}.
+        `texts` is a list for all models or {model_name: texts}.
+        """
+        if self._closed:
+            raise RuntimeError("inference pool is shut down")
+        future = Future()
+        job_id = next(self._ids)
+        with self._lock:
+            serving = [i for i in range(self.workers) if self.retired[i] is None]
+            if not serving:
+                future.set_exception(WorkerCrashed("no inference worker is running"))
+                return future
+            index = min(serving, key=lambda i: len(self.outstanding[i]))
+            self.outstanding[index][job_id] = future
+            try:
+                self.conns[index].send((job_id, texts if isinstance(texts, dict) else list(texts), kwargs))
+            except OSError:
+                # Worker is gone; the monitor replaces it
+                del self.outstanding[index][job_id]
+                future.set_exception(WorkerCrashed(f"inference worker {index} is not running"))
+        return future
+
+    def available(self):
+        """True while at least one worker is serving."""
+        return not self._closed and any(reason is None for reason in self.retired)
+
+    def pending(self):
+        """Jobs queued or running (queue depth)."""
+        with self._lock:
+            return sum(len(jobs) for jobs in self.outstanding)
+
+    def _collect(self):
+        while not self._closed:
+            with self._lock:
+                conns = {conn: index for index, conn in enumerate(self.conns) if self.retired[index] is None}
+            if not conns:
+                time.sleep(0.5)
+                continue
+            try:
+                ready = mp_connection.wait(list(conns), timeout=0.5)
+            except OSError:
+                # A connection was closed by the monitor while we were waiting
+                continue
+            for conn in ready:
+                try:
+                    job_id, ok, value = conn.recv()
+                except (EOFError, OSError):
+                    # Worker died; give the monitor time to retire it
+                    time.sleep(0.05)
+                    continue
+                with self._lock:
+                    future = self.outstanding[conns[conn]].pop(job_id, None)
+                if future is None:
+                    continue
+                if ok:
+                    outputs, timings = value
+                    for name, seconds in timings.items():
+                        MODEL_SECONDS.labels(model=name).observe(seconds)
+                    future.set_result(outputs)
+                else:
+                    future.set_exception(RuntimeError(value))
+
+    def _monitor(self):
+        while not self._closed:
+            time.sleep(HEALTH_INTERVAL)
+            now = time.time()
+            for index, process in enumerate(self.processes):
+                if self.retired[index] is not None:
+                    continue
+                job_id = self.current_jobs[index]
+                hung = job_id and now - self.job_started[index] > self.job_timeout
+                stalled = not job_id and now - self.heartbeats[index] > HEARTBEAT_TIMEOUT
+                if process.is_alive() and not hung and not stalled:
+                    continue
+                if self._closed:
+                    # Workers stopped by shutdown()
+                    return
+                reason = "hung" if hung else "stalled" if process.is_alive() else "died"
+                if process.is_alive():
+                    process.kill()
+                process.join(timeout=5)
+                with self._lock:
+                    failed, self.outstanding[index] = self.outstanding[index], {}
+                    self.conns[index].close()
+                    self.retired[index] = reason
+                for failed_id, future in failed.items():
+                    future.set_exception(WorkerCrashed(
+                        f"inference worker {index} (pid {process.pid}) failed before finishing job {failed_id}"))
+                replacement = self._respawn(index) if not self._closed else None
+                with self._lock:
+                    if replacement is not None:
+                        self.processes[index], self.conns[index] = replacement
+                        self.retired[index] = None
+                        self.restarts[index] += 1
+                    serving = sum(r is None for r in self.retired)
+                log_event(logger, logging.ERROR, "inference_worker_failed", worker=index, pid=process.pid,
+                          reason=reason, exitcode=process.exitcode, failed_jobs=len(failed),
+                          replacement=replacement[0].pid if replacement else None, serving=serving)
+                if not serving:
+                    log_event(logger, logging.ERROR, "inference_pool_failover",
+                              message="no inference worker left; running models in-process")
+
+    def health(self):
+        """
+        Per-worker status: pid, alive, busy, seconds since last heartbeat,
+        restarts, and why it was retired (None while serving).
+        """
+        now = time.time()
+        return [
+            {
+                "worker": index,
+                "pid": process.pid,
+                "alive": process.is_alive(),
+                "busy": bool(self.current_jobs[index]),
+                "heartbeat_age": round(now - self.heartbeats[index], 3),
+                "restarts": self.restarts[index],
+                "retired": self.retired[index],
+                "cpus": self.cpu_sets[index],
+            }
+            for index, process in enumerate(self.processes)
+        ]
+
+    def shutdown(self, timeout=5):
+        self._closed = True
+        with self._lock:
+            for conn in self.conns:
+                try:
+                    conn.send(None)
+                except OSError:
+                    pass
+            if self._control is not None:
+                try:
+                    self._control.send(None)
+                except OSError:
+                    pass
+        for process in self.processes + ([self.zygote] if self.zygote is not None else []):
+            process.join(timeout=timeout)
+            if process.is_alive():
+                process.kill()
+        with self._lock:
+            failed = [f for jobs in self.outstanding for f in jobs.values()]
+            self.outstanding = [dict() for _ in range(self.workers)]
+        for future in failed:
+            future.set_exception(RuntimeError("inference pool is shut down"))
@@ -0,0 +1,270 @@
+import itertools
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+
+from cardio_core import COMPACT_LABS, canonical_lab_key
+from report_renderer import LabTrend
+
+# ---------------------- Configuration ----------------------
+# Per-patient lab trends: every assessment with a patient id adds its lab
+# values (form and uploaded report) to a time series per analyte. Each series
+# keeps running statistics (Welford mean/variance, least-squares slope over
+# time, out-of-range streak) that are updated in O(1) per value; the history
+# is never rescanned. The state is kept in the history database
+# (history_store.py) and cached here for recently seen patients.
+# AIGNOSIS_TREND_PATIENTS   patients whose trend state is cached in memory
+TREND_PATIENTS = int(os.getenv("AIGNOSIS_TREND_PATIENTS", 1000))
+# The same value again within this many seconds is a resubmit, not a new measurement
+DUPLICATE_WINDOW = 3600
+# Fitted change over the observed period, relative to the mean, that counts as rising/falling
+TREND_THRESHOLD = 0.05
+# Direction that is a concern, per analyte
+ADVERSE = {"ldl": "rising", "tc": "rising", "sbp": "rising", "dbp": "rising", "troponin": "rising", "hdl": "falling"}
+
+LAB_NAMES = {
+    "中文": {"sbp": "收缩压", "dbp": "舒张压", "ldl": "低密度脂蛋白胆固醇", "hdl": "高密度脂蛋白胆固醇",
+             "tc": "总胆固醇", "troponin": "肌钙蛋白"},
+    "English": {"sbp": "Systolic BP", "dbp": "Diastolic BP", "ldl": "LDL cholesterol", "hdl": "HDL cholesterol",
+                "tc": "Total cholesterol", "troponin": "Troponin I/T"},
+}
+
+# Analytes of uploaded reports that continue a form series: name -> key,
+# and unit -> factor to the form unit (mg/dL)
+REPORT_ANALYTES = {
+    "total cholesterol": "tc", "总胆固醇": "tc",
+    "ldl cholesterol": "ldl", "低密度脂蛋白胆固醇": "ldl",
+    "hdl cholesterol": "hdl", "高密度脂蛋白胆固醇": "hdl",
+}
+CHOLESTEROL_UNITS = {"mg/dl": 1.0, "mmol/l": 38.67}
+
+
+def trend_values(labs, file_mapping=None, form_defaults=None):
+    """
+    {series key: value} of one assessment: the merged form labs and the
+    other values of the uploaded report (cholesterol converted to mg/dL).
+    form_defaults: {lab label: initial value} of the web form the labs were
+    entered in. A value still equal to its field's initial value was most
+    likely never entered and is left out, unless the report has it too.
+    Callers without a form (API, batch) pass None and keep every value.
+    """
+    values = {}
+    for label, value in labs.items():
+        key = canonical_lab_key(label)
+        try:
+            value = float(value)
+        except (TypeError, ValueError):
+            continue
+        if form_defaults and value == form_defaults.get(label) and label not in (file_mapping or {}):
+            continue
+        values[key] = value
+    for label, value in (file_mapping or {}).items():
+        if label in labs:
+            continue
+        match = re.match(r"(.*?)\s*\(([^)]*)\)$", label)
+        name, unit = (match.group(1).strip().lower(), match.group(2).strip().lower()) if match else (label, "")
+        key, factor = REPORT_ANALYTES.get(name), CHOLESTEROL_UNITS.get(unit)
+        try:
+            if key is not None and factor is not None:
+                values.setdefault(key, round(float(value) * factor, 1))
+            else:
+                values.setdefault(canonical_lab_key(label), float(value))
+        except (TypeError, ValueError):
+            continue
+    return values
+
+
+class AnalyteStats:
+    """
+    Running statistics of one analyte series. Time is in days since the
+    first value; add() is O(1).
+    """
+    FIELDS = ("n", "mean", "m2", "mean_t", "m2_t", "c_tv", "first_at", "first", "last_at", "last",
+              "previous", "low", "high", "streak")
+
+    def __init__(self, low=None, high=None):
+        self.n = 0
+        self.mean = self.m2 = 0.0                     # value mean and sum of squared deviations
+        self.mean_t = self.m2_t = self.c_tv = 0.0     # time mean, its squared deviations, co-moment with value
+        self.first_at = self.first = self.last_at = self.last = self.previous = None
+        self.low, self.high = low, high
+        self.streak = 0                               # +k: last k values high, -k: last k values low
+
+    def add(self, at, value):
+        """Add a value measured at unix time `at`; False for a duplicate of the last one."""
+        if self.n and value == self.last and at - self.last_at < DUPLICATE_WINDOW:
+            return False
+        if not self.n:
+            self.first_at, self.first = at, value
+        t = (at - self.first_at) / 86400
+        self.n += 1
+        dt, dv = t - self.mean_t, value - self.mean
+        self.mean_t += dt / self.n
+        self.mean += dv / self.n
+        self.m2_t += dt * (t - self.mean_t)
+        self.m2 += dv * (value - self.mean)
+        self.c_tv += dt * (value - self.mean)
+        self.previous, self.last, self.last_at = self.last, value, at
+        if self.high is not None and value > self.high:
+            self.streak = self.streak + 1 if self.streak > 0 else 1
+        elif self.low is not None and value < self.low:
+            self.streak = self.streak - 1 if self.streak < 0 else -1
+        else:
+            self.streak = 0
+        return True
+
+    @property
+    def slope(self):
+        """Least-squares change per day, or None without two distinct times."""
+        return self.c_tv / self.m2_t if self.m2_t > 0 else None
+
+    @property
+    def direction(self):
+        if self.n < 2:
+            return "stable"
+        slope = self.slope
+        change = slope * (self.last_at - self.first_at) / 86400 if slope is not None else self.last - self.previous
+        if abs(change) <= TREND_THRESHOLD * max(abs(self.mean), 1e-9):
+            return "stable"
+        return "rising" if change > 0 else "falling"
+
+    def to_dict(self):
+        return {name: getattr(self, name) for name in self.FIELDS}
+
+    @classmethod
+    def from_dict(cls, state):
+        stats = cls()
+        for name in cls.FIELDS:
+            setattr(stats, name, state[name])
+        return stats
+
+    def copy(self):
+        return AnalyteStats.from_dict(self.to_dict())
+
+
+def _normal_range(key):
+    _, low, high = COMPACT_LABS.get(key, (None, None, None))
+    return low, high
+
+
+def describe(key, stats, lang):
+    """LabTrend of a series, for the report (no slope for series spanning less than a day)."""
+    slope = stats.slope if stats.last_at - stats.first_at >= 86400 else None
+    direction = stats.direction
+    return LabTrend(
+        lab=LAB_NAMES.get(lang, LAB_NAMES["English"]).get(key, key),
+        count=stats.n,
+        first=stats.first,
+        last=stats.last,
+        delta=round(stats.last - stats.previous, 4) if stats.previous is not None else 0.0,
+        slope=round(slope * 30, 4) if slope is not None else None,
+        direction=direction,
+        streak=stats.streak,
+        concern=ADVERSE.get(key) == direction or abs(stats.streak) >= 2,
+    )
+
+
+class TrendTracker:
+    """
+    Trend state per patient and analyte. preview() shows the trends with the
+    values of an assessment added, without keeping them; observe() adds them
+    and returns the changed series to store. The state of a patient is loaded
+    from `store` (a HistoryStore, or None to keep it in memory only) on first
+    use and cached for the TREND_PATIENTS most recent patients.
+    A form session (session_id) adds one point per series: submitting again
+    after an edit replaces the session's values instead of adding new ones.
+    version() changes whenever a patient's series may have changed, so cached
+    previews can be keyed on it.
+    """
+
+    def __init__(self, store=None, max_patients=TREND_PATIENTS):
+        self.store = store
+        self.max_patients = max_patients
+        self._patients = OrderedDict()     # patient id -> {series key: AnalyteStats}
+        self._versions = {}                # patient id -> version of its cached series
+        self._next_version = itertools.count(1)
+        # session id -> (patient id, {series key: (state before the session's point, n after it)})
+        self._sessions = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _series(self, patient_id):
+        # Caller holds self._lock
+        series = self._patients.get(patient_id)
+        if series is None:
+            states = self.store.trend_states(patient_id) if self.store is not None else {}
+            series = {key: AnalyteStats.from_dict(state) for key, state in states.items()}
+            self._patients[patient_id] = series
+            # A reloaded series may have changed while it was not cached
+            self._versions[patient_id] = next(self._next_version)
+            while len(self._patients) > self.max_patients:
+                evicted, _ = self._patients.popitem(last=False)
+                del self._versions[evicted]
+        else:
+            self._patients.move_to_end(patient_id)
+        return series
+
+    def _session_points(self, patient_id, series, session_id):
+        # Caller holds self._lock. {series key: state before the point} of the
+        # points this session added that are still the last of their series
+        record = self._sessions.get(session_id) if session_id is not None else None
+        if record is None or record[0] != patient_id:
+            return {}
+        return {key: before for key, (before, n) in record[1].items() if key in series and series[key].n == n}
+
+    def version(self, patient_id):
+        """Version of the patient's series; observe() changes it."""
+        with self._lock:
+            self._series(patient_id)
+            return self._versions[patient_id]
+
+    def preview(self, patient_id, values, lang, at=None, session_id=None):
+        """[LabTrend, ...] of the series with at least two values, concerns first."""
+        at = time.time() if at is None else at
+        with self._lock:
+            series = self._series(patient_id)
+            replaced = self._session_points(patient_id, series, session_id)
+            trends = []
+            for key in sorted(set(series) | set(values)):
+                if key in replaced:
+                    stats = replaced[key].copy()
+                else:
+                    stats = series[key].copy() if key in series else AnalyteStats(*_normal_range(key))
+                if key in values:
+                    stats.add(at, values[key])
+                if stats.n >= 2:
+                    trends.append(describe(key, stats, lang))
+        trends.sort(key=lambda trend: not trend.concern)
+        return trends
+
+    def observe(self, patient_id, values, at=None, session_id=None):
+        """
+        Add the values of an assessment; returns {series key: state dict} of
+        the changed series. The values of an earlier observe with the same
+        session_id are replaced.
+        """
+        at = time.time() if at is None else at
+        changed = {}
+        with self._lock:
+            series = self._series(patient_id)
+            points = {}
+            for key, before in self._session_points(patient_id, series, session_id).items():
+                series[key] = before.copy()
+                changed[key] = before.to_dict()
+            for key, value in values.items():
+                stats = series.get(key)
+                if stats is None:
+                    stats = series[key] = AnalyteStats(*_normal_range(key))
+                before = stats.copy()
+                if stats.add(at, value):
+                    changed[key] = stats.to_dict()
+                    points[key] = (before, stats.n)
+            if changed:
+                self._versions[patient_id] = next(self._next_version)
+            if session_id is not None:
+                self._sessions.pop(session_id, None)
+                self._sessions[session_id] = (patient_id, points)
+                while len(self._sessions) > self.max_patients:
+                    self._sessions.popitem(last=False)
+        return changed
@@ -0,0 +1,16 @@
+import functools
+import os
+
+
+@functools.lru_cache(maxsize=None)
+def get_openai_client():
+    """
+    OpenAI client shared by the LLM helpers, created on first use: openai is
+    imported and the .env file loaded only when an LLM call is actually made.
+    OPENAI_BASE_URL points the helpers at another endpoint, e.g. the local
+    stand-in server (llm_standin.py) for offline load tests.
+    """
+    import openai
+    from dotenv import load_dotenv
+    load_dotenv()
+    return openai.OpenAI(api_key=os.getenv("OPENAI_API_KEY"), base_url=os.getenv("OPENAI_BASE_URL") or None)
@@ -0,0 +1,337 @@
+import argparse
+import hashlib
+import json
+import os
+import random
+import threading
+import time
+import urllib.error
+import urllib.request
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Local stand-in for the OpenAI chat-completions API, so the LLM paths
+# (file extraction, report summary) can be load-tested offline.
+#
+#   python llm_standin.py --port 8900 --latency 0.8 --jitter 0.3 --error-rate 0.02
+#   OPENAI_BASE_URL=http://127.0.0.1:8900/v1 OPENAI_API_KEY=local python comparemodel.py
+#
+# Responses are replayed from a JSONL recordings file: an exact match on
+# (model, messages) first, then a recording of the same prompt template,
+# then a canned answer for the prompts of this repo. With --record the
+# requests are forwarded to --upstream (the real API) and the answers are
+# appended to the recordings file for later replay.
+#
+# Endpoints: POST /v1/chat/completions (also "stream": true, as server-sent
+# events), GET /v1/models, GET /healthz.
+DEFAULT_RECORDINGS = "llm_recordings.jsonl"
+DEFAULT_UPSTREAM = "https://api.openai.com/v1"
+TEMPLATE_PREFIX = 120   # leading characters of every message that identify its prompt template
+
+# Canned answers when nothing was recorded: (marker in the prompt, content)
+CANNED_RESPONSES = [
+    ("medical document analysis assistant", json.dumps({
+        "Total Cholesterol": "185.5 mg/dL (< 201.1 mg/dL)",
+        "LDL Cholesterol": "84.3 mg/dL (< 135.3 mg/dL)",
+        "HDL Cholesterol": "76.6 mg/dL (≥ 38.7 mg/dL)",
+        "Triglycerides": "144.4 mg/dL (< 150.6 mg/dL)",
+    }, ensure_ascii=False)),
+    ("医学风险分析助手", "1. 总体风险等级：中风险。\n2. 各模型结果基本一致。\n3. 建议尽快咨询医生。\n4. 如出现胸痛加重、冷汗或呼吸困难，请立即就医。"),
+    ("medical risk analysis assistant", "1. Overall risk: moderate.\n2. The models largely agree.\n3. A doctor's visit soon is recommended.\n4. Seek emergency care if chest pain worsens or comes with cold sweat or shortness of breath."),
+]
+GENERIC_RESPONSE = "OK"
+ERROR_STATUSES = (429, 500, 503)
+
+
+def request_key(model, messages):
+    """Exact-match key of a chat request."""
+    data = json.dumps([model, messages], ensure_ascii=False, sort_keys=True)
+    return hashlib.blake2b(data.encode("utf-8"), digest_size=16).hexdigest()
+
+
+def template_key(model, messages):
+    """Key of the prompt template: model, roles and the start of every message."""
+    data = json.dumps([model, [(m.get("role"), str(m.get("content", ""))[:TEMPLATE_PREFIX]) for m in messages]],
+                      ensure_ascii=False)
+    return hashlib.blake2b(data.encode("utf-8"), digest_size=16).hexdigest()
+
+
+class Recordings:
+    """
+    Recorded chat responses, loaded from and appended to a JSONL file.
+    Each line: {"key", "template", "model", "messages", "content", "latency"}.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.by_key = {}
+        self.by_template = {}
+        self._lock = threading.Lock()
+        if path and os.path.exists(path):
+            with open(path, encoding="utf-8") as f:
+                for line in f:
+                    if line.strip():
+                        self._index(json.loads(line))
+
+    def _index(self, entry):
+        self.by_key[entry["key"]] = entry
+        self.by_template.setdefault(entry["template"], []).append(entry)
+
+    def __len__(self):
+        return len(self.by_key)
+
+    def lookup(self, model, messages, choose):
+        """
+        Returns (entry or None, how it matched: "exact", "template", "canned" or "generic").
+        """
+        entry = self.by_key.get(request_key(model, messages))
+        if entry is not None:
+            return entry, "exact"
+        candidates = self.by_template.get(template_key(model, messages))
+        if candidates:
+            return choose(candidates), "template"
+        prompt = "\n".join(str(m.get("content", "")) for m in messages)
+        for marker, content in CANNED_RESPONSES:
+            if marker in prompt:
+                return {"content": content, "latency": None}, "canned"
+        return {"content": GENERIC_RESPONSE, "latency": None}, "generic"
+
+    def add(self, model, messages, content, latency):
+        entry = {
+            "key": request_key(model, messages),
+            "template": template_key(model, messages),
+            "model": model,
+            "messages": messages,
+            "content": content,
+            "latency": round(latency, 4),
+        }
+        with self._lock:
+            self._index(entry)
+            if self.path:
+                with open(self.path, "a", encoding="utf-8") as f:
+                    f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+        return entry
+
+
+class StandinConfig:
+    """Latency model, error injection and record mode of the server."""
+
+    def __init__(self, latency=0.0, jitter=0.0, replay_latency=False, token_delay=0.0,
+                 error_rate=0.0, hang_rate=0.0, hang_seconds=120.0,
+                 record=False, upstream=DEFAULT_UPSTREAM, seed=None):
+        self.latency = latency
+        self.jitter = jitter
+        self.replay_latency = replay_latency
+        self.token_delay = token_delay
+        self.error_rate = error_rate
+        self.hang_rate = hang_rate
+        self.hang_seconds = hang_seconds
+        self.record = record
+        self.upstream = upstream.rstrip("/")
+        self.rng = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def random(self):
+        with self._lock:
+            return self.rng.random()
+
+    def choice(self, items):
+        with self._lock:
+            return self.rng.choice(items)
+
+    def delay(self, recorded):
+        """Seconds to wait before answering."""
+        if self.replay_latency and recorded:
+            base = recorded
+        else:
+            base = self.latency
+        with self._lock:
+            jitter = self.rng.uniform(-self.jitter, self.jitter) if self.jitter else 0.0
+        return max(0.0, base + jitter)
+
+
+class StandinStats:
+    def __init__(self):
+        self.counts = {}
+        self._lock = threading.Lock()
+
+    def inc(self, name):
+        with self._lock:
+            self.counts[name] = self.counts.get(name, 0) + 1
+
+    def snapshot(self):
+        with self._lock:
+            return dict(self.counts)
+
+
+def completion(model, content):
+    return {
+        "id": f"chatcmpl-{uuid.uuid4().hex[:24]}",
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": model,
+        "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}],
+        "usage": {"prompt_tokens": 0, "completion_tokens": len(content.split()), "total_tokens": len(content.split())},
+    }
+
+
+def completion_chunks(model, content):
+    """chat.completion.chunk events of `content`, one per word."""
+    chunk_id = f"chatcmpl-{uuid.uuid4().hex[:24]}"
+    created = int(time.time())
+
+    def chunk(delta, finish_reason=None):
+        return {"id": chunk_id, "object": "chat.completion.chunk", "created": created, "model": model,
+                "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}]}
+
+    yield chunk({"role": "assistant", "content": ""})
+    words = content.split(" ")
+    for i, word in enumerate(words):
+        yield chunk({"content": word if i == len(words) - 1 else word + " "})
+    yield chunk({}, "stop")
+
+
+def error_body(status):
+    kind = {429: "rate_limit_exceeded", 500: "server_error", 503: "service_unavailable"}.get(status, "error")
+    return {"error": {"message": f"injected {kind}", "type": kind, "code": kind}}
+
+
+class StandinHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+    recordings = None
+    config = None
+    stats = None
+
+    def do_GET(self):
+        if self.path == "/healthz":
+            self._send_json(200, {"status": "ok", "recordings": len(self.recordings), "requests": self.stats.snapshot()})
+        elif self.path == "/v1/models":
+            models = sorted({e["model"] for e in self.recordings.by_key.values()} | {"gpt-4"})
+            self._send_json(200, {"object": "list", "data": [{"id": m, "object": "model", "owned_by": "local"} for m in models]})
+        else:
+            self._send_json(404, {"error": {"message": "not found"}})
+
+    def do_POST(self):
+        if self.path.rstrip("/") not in ("/v1/chat/completions", "/chat/completions"):
+            self._send_json(404, {"error": {"message": "not found"}})
+            return
+        length = int(self.headers.get("Content-Length", 0))
+        request = json.loads(self.rfile.read(length) or b"{}")
+        model = request.get("model", "gpt-4")
+        messages = request.get("messages", [])
+
+        roll = self.config.random()
+        if roll < self.config.error_rate:
+            status = ERROR_STATUSES[int(roll / self.config.error_rate * len(ERROR_STATUSES)) % len(ERROR_STATUSES)]
+            self.stats.inc(f"error_{status}")
+            self._send_json(status, error_body(status))
+            return
+        if roll < self.config.error_rate + self.config.hang_rate:
+            self.stats.inc("hang")
+            time.sleep(self.config.hang_seconds)
+            self._send_json(504, error_body(504))
+            return
+
+        if self.config.record:
+            try:
+                content, latency = self._forward(request)
+            except urllib.error.HTTPError as e:
+                self.stats.inc(f"upstream_{e.code}")
+                self._send_json(e.code, json.loads(e.read() or b"{}"))
+                return
+            self.recordings.add(model, messages, content, latency)
+            self.stats.inc("recorded")
+        else:
+            entry, match = self.recordings.lookup(model, messages, self.config.choice)
+            self.stats.inc(match)
+            content = entry["content"]
+            time.sleep(self.config.delay(entry.get("latency")))
+
+        if request.get("stream"):
+            self._stream(model, content)
+        else:
+            self._send_json(200, completion(model, content))
+
+    def _forward(self, request):
+        # Non-streaming upstream call; the answer is streamed locally if the client asked for it
+        body = dict(request, stream=False)
+        upstream = urllib.request.Request(
+            f"{self.config.upstream}/chat/completions",
+            data=json.dumps(body).encode("utf-8"),
+            headers={"Content-Type": "application/json",
+                     "Authorization": self.headers.get("Authorization") or f"Bearer {os.getenv('OPENAI_API_KEY', '')}"})
+        start = time.perf_counter()
+        with urllib.request.urlopen(upstream, timeout=300) as resp:
+            answer = json.loads(resp.read())
+        return answer["choices"][0]["message"]["content"], time.perf_counter() - start
+
+    def _stream(self, model, content):
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-cache")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        for chunk in completion_chunks(model, content):
+            self._write_chunk(f"data: {json.dumps(chunk, ensure_ascii=False)}\n\n")
+            if self.config.token_delay:
+                time.sleep(self.config.token_delay)
+        self._write_chunk("data: [DONE]\n\n")
+        self.wfile.write(b"0\r\n\r\n")
+
+    def _write_chunk(self, text):
+        data = text.encode("utf-8")
+        self.wfile.write(f"{len(data):x}\r\n".encode("ascii") + data + b"\r\n")
+        self.wfile.flush()
+
+    def _send_json(self, status, payload):
+        body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def make_server(host="127.0.0.1", port=8900, recordings=DEFAULT_RECORDINGS, config=None):
+    """
+    Build the stand-in server (not started; call serve_forever()).
+    """
+    handler = type("Handler", (StandinHandler,), {
+        "recordings": Recordings(recordings),
+        "config": config or StandinConfig(),
+        "stats": StandinStats(),
+    })
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    return server
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Local OpenAI-compatible chat-completions server with record/replay")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8900)
+    parser.add_argument("--recordings", default=DEFAULT_RECORDINGS, help="JSONL file to replay from / record to")
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds before every answer")
+    parser.add_argument("--jitter", type=float, default=0.0, help="+/- seconds of uniform random latency")
+    parser.add_argument("--replay-latency", action="store_true", help="use the recorded latency where known")
+    parser.add_argument("--token-delay", type=float, default=0.0, help="seconds between streamed chunks")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="share of requests answered with 429/500/503")
+    parser.add_argument("--hang-rate", type=float, default=0.0, help="share of requests that hang for --hang-seconds")
+    parser.add_argument("--hang-seconds", type=float, default=120.0)
+    parser.add_argument("--record", action="store_true", help="forward to --upstream and record the answers")
+    parser.add_argument("--upstream", default=DEFAULT_UPSTREAM)
+    parser.add_argument("--seed", type=int, default=None, help="seed of latency jitter and error injection")
+    args = parser.parse_args()
+
+    config = StandinConfig(
+        latency=args.latency, jitter=args.jitter, replay_latency=args.replay_latency, token_delay=args.token_delay,
+        error_rate=args.error_rate, hang_rate=args.hang_rate, hang_seconds=args.hang_seconds,
+        record=args.record, upstream=args.upstream, seed=args.seed)
+    server = make_server(args.host, args.port, args.recordings, config)
+    mode = f"recording from {config.upstream}" if args.record else f"replaying {len(server.RequestHandlerClass.recordings)} recordings"
+    print(f"LLM stand-in on http://{args.host}:{args.port}/v1 ({mode})")
+    server.serve_forever()
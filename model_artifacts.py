@@ -0,0 +1,283 @@
+import argparse
+import copy
+import json
+import logging
+import os
+import subprocess
+import sys
+import threading
+import time
+
+from serving import LENGTH_BUCKETING, length_buckets
+from tracing import get_logger, log_event
+
+# Ready-to-run model artifacts: every model of MODELS is traced to
+# TorchScript once ("compile"), and stored with its tokenizer files in
+# ARTIFACT_DIR. At startup the runtime loads these instead of instantiating
+# the Hugging Face checkpoints and pipelines.
+#
+#   python model_artifacts.py compile      build the artifacts
+#   python model_artifacts.py benchmark    compare cold start: checkpoints vs artifacts
+#
+# AIGNOSIS_ARTIFACT_DIR    artifact directory (default: ./model_artifacts)
+# AIGNOSIS_USE_ARTIFACTS   set to 0 to always load the Hugging Face checkpoints
+ARTIFACT_DIR = os.getenv("AIGNOSIS_ARTIFACT_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "model_artifacts"))
+USE_ARTIFACTS = os.getenv("AIGNOSIS_USE_ARTIFACTS", "1") != "0"
+MANIFEST = "manifest.json"
+
+logger = get_logger("model_artifacts")
+
+# Define the models
+MODELS = {
+    "BioBERT": "dmis-lab/biobert-base-cased-v1.1",
+    "PubMedBERT": "microsoft/BiomedNLP-PubMedBERT-base-uncased-abstract",
+    "ClinicalBERT": "emilyalsentzer/Bio_ClinicalBERT"
+}
+MAX_LENGTH = 512
+NUM_LABELS = 3
+
+# Texts of different lengths, used to trace and to check the traced model
+EXAMPLE_TEXTS = [
+    "Chest pain on exertion with shortness of breath.",
+    "胸痛在劳累时加重，伴冷汗、心悸和呼吸困难，既往高血压病史，收缩压 160 mmHg，肌钙蛋白 0.05 ng/mL。",
+]
+
+
+def _torch_version():
+    import torch
+    return ".".join(torch.__version__.split(".")[:2])
+
+
+def compile_models(models, cache_dir=ARTIFACT_DIR):
+    """
+    Trace every model to TorchScript and save it with its tokenizer.
+    Args:
+        models: dict of name -> Hugging Face model path
+        cache_dir: output directory
+    Returns the manifest dict written to cache_dir/manifest.json.
+    """
+    import torch
+    import transformers
+    from transformers import AutoModelForSequenceClassification, AutoTokenizer
+
+    os.makedirs(cache_dir, exist_ok=True)
+    manifest = {
+        "torch": _torch_version(),
+        "transformers": transformers.__version__,
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "models": {},
+    }
+    for name, model_path in models.items():
+        start = time.perf_counter()
+        tokenizer = AutoTokenizer.from_pretrained(model_path)
+        model = AutoModelForSequenceClassification.from_pretrained(
+            model_path, num_labels=NUM_LABELS, torchscript=True).eval()
+
+        encoded = tokenizer(EXAMPLE_TEXTS, padding=True, truncation=True, max_length=MAX_LENGTH, return_tensors="pt")
+        example = (encoded["input_ids"], encoded["attention_mask"], encoded["token_type_ids"])
+        with torch.inference_mode():
+            traced = torch.jit.freeze(torch.jit.trace(model, example, strict=False))
+            # Shapes other than the traced one must give the eager result
+            single = tokenizer(EXAMPLE_TEXTS[:1], return_tensors="pt")
+            single = (single["input_ids"], single["attention_mask"], single["token_type_ids"])
+            dynamic_shapes = torch.allclose(traced(*single)[0], model(*single)[0], atol=1e-4)
+
+        model_dir = os.path.join(cache_dir, name)
+        os.makedirs(model_dir, exist_ok=True)
+        torch.jit.save(traced, os.path.join(model_dir, "model.pt"))
+        tokenizer.save_pretrained(os.path.join(model_dir, "tokenizer"))
+        manifest["models"][name] = {
+            "source": model_path,
+            "module": f"{name}/model.pt",
+            "tokenizer": f"{name}/tokenizer",
+            "id2label": {str(k): v for k, v in model.config.id2label.items()},
+            "max_length": MAX_LENGTH,
+            # If the trace baked in the example shape, pad every batch to max_length
+            "dynamic_shapes": bool(dynamic_shapes),
+        }
+        print(f"compiled {name} in {time.perf_counter() - start:.1f}s (dynamic shapes: {dynamic_shapes})")
+
+    with open(os.path.join(cache_dir, MANIFEST), "w", encoding="utf-8") as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
+    return manifest
+
+
+class TracedClassifier:
+    """
+    Text classifier over a TorchScript model, called like a Hugging Face
+    text-classification pipeline (top-1 {"label", "score"} per text).
+    Every thread gets its own tokenizer copy; the TorchScript module is shared.
+    With dynamic shapes, texts are batched by token length (length_buckets)
+    and each batch is padded to its longest text; the outputs keep the
+    order of the texts.
+    """
+    task = "text-classification"
+
+    def __init__(self, module, tokenizer, id2label, max_length=MAX_LENGTH, dynamic_shapes=True,
+                 length_bucketing=LENGTH_BUCKETING):
+        self.model = module
+        self.tokenizer = tokenizer
+        self.id2label = {int(k): v for k, v in id2label.items()}
+        self.max_length = max_length
+        self.padding = True if dynamic_shapes else "max_length"
+        self.length_bucketing = length_bucketing
+        self._local = threading.local()
+        self._owner = threading.get_ident()
+
+    def _get_tokenizer(self):
+        tokenizer = getattr(self._local, "tokenizer", None)
+        if tokenizer is None:
+            tokenizer = self.tokenizer if threading.get_ident() == self._owner else copy.deepcopy(self.tokenizer)
+            self._local.tokenizer = tokenizer
+        return tokenizer
+
+    def __call__(self, texts, batch_size=8, **kwargs):
+        import torch
+        single = isinstance(texts, str)
+        items = [texts] if single else list(texts)
+        tokenizer = self._get_tokenizer()
+        # Tokenize once without padding; every batch is padded on its own
+        encoded = tokenizer(items, truncation=True, max_length=self.max_length)
+        if self.length_bucketing and self.padding is True:
+            batches = length_buckets([len(ids) for ids in encoded["input_ids"]], batch_size)
+        else:
+            batches = [list(range(start, min(start + batch_size, len(items))))
+                       for start in range(0, len(items), batch_size)]
+        results = [None] * len(items)
+        for batch in batches:
+            padded = tokenizer.pad({key: [values[i] for i in batch] for key, values in encoded.items()},
+                                   padding=self.padding, max_length=self.max_length, return_tensors="pt")
+            with torch.inference_mode():
+                logits = self.model(padded["input_ids"], padded["attention_mask"], padded["token_type_ids"])[0]
+            scores, ids = logits.softmax(-1).max(-1)
+            for i, label_id, score in zip(batch, ids.tolist(), scores.tolist()):
+                results[i] = {"label": self.id2label[label_id], "score": score}
+        return results[:1] if single else results
+
+
+def _usable_manifest(models, cache_dir=ARTIFACT_DIR):
+    """
+    The artifact manifest if the artifacts can be used for `models`, else
+    None (disabled, missing, other models or another torch version).
+    """
+    manifest_path = os.path.join(cache_dir, MANIFEST)
+    if not USE_ARTIFACTS or not os.path.exists(manifest_path):
+        return None
+    with open(manifest_path, encoding="utf-8") as f:
+        manifest = json.load(f)
+    entries = manifest.get("models", {})
+    if set(entries) != set(models) or any(entries[n]["source"] != p for n, p in models.items()):
+        log_event(logger, logging.WARNING, "artifacts_ignored", cache_dir=cache_dir,
+                  reason="artifacts do not match the configured models; run `python model_artifacts.py compile`")
+        return None
+    if manifest.get("torch") != _torch_version():
+        log_event(logger, logging.WARNING, "artifacts_ignored", cache_dir=cache_dir,
+                  reason=f"compiled with torch {manifest.get('torch')}, running {_torch_version()}")
+        return None
+    return manifest
+
+
+def _load_artifact(entry, cache_dir=ARTIFACT_DIR):
+    import torch
+    from transformers import AutoTokenizer
+    module = torch.jit.load(os.path.join(cache_dir, entry["module"]), map_location="cpu")
+    tokenizer = AutoTokenizer.from_pretrained(os.path.join(cache_dir, entry["tokenizer"]))
+    return TracedClassifier(module, tokenizer, entry["id2label"], entry["max_length"], entry["dynamic_shapes"])
+
+
+def _load_checkpoint(model_path, dtype=None):
+    from transformers import pipeline, AutoModelForSequenceClassification, AutoTokenizer
+    from serving import PerThreadPipeline
+    tokenizer = AutoTokenizer.from_pretrained(model_path)
+    kwargs = {}
+    if dtype:
+        # Weights stored (and computed) in e.g. bfloat16 instead of fp32
+        import torch
+        kwargs["torch_dtype"] = getattr(torch, dtype)
+    model = AutoModelForSequenceClassification.from_pretrained(model_path, num_labels=NUM_LABELS, **kwargs)
+    return PerThreadPipeline(pipeline("text-classification", model=model, tokenizer=tokenizer))
+
+
+def load_compiled_pipelines(models, cache_dir=ARTIFACT_DIR):
+    """
+    Load the compiled artifacts of `models`.
+    Returns {name: TracedClassifier}, or None when artifacts are disabled,
+    missing, incomplete or built with another torch version (the caller then
+    loads the Hugging Face checkpoints).
+    """
+    manifest = _usable_manifest(models, cache_dir)
+    if manifest is None:
+        return None
+    return {name: _load_artifact(manifest["models"][name], cache_dir) for name in models}
+
+
+def load_pipelines(models=MODELS, dtype=None):
+    """
+    Load a classifier per model: the compiled artifacts when available,
+    otherwise the Hugging Face checkpoints as (thread-safe) pipelines, with
+    their weights in `dtype` ("bfloat16", "float16"; default fp32).
+    """
+    compiled = load_compiled_pipelines(models)
+    if compiled is not None:
+        return compiled
+    return {model_name: _load_checkpoint(model_path, dtype) for model_name, model_path in models.items()}
+
+
+def load_pipeline(name, models=MODELS, dtype=None):
+    """
+    Load the classifier of one model of `models`, the same way as load_pipelines().
+    """
+    manifest = _usable_manifest(models)
+    if manifest is not None:
+        return _load_artifact(manifest["models"][name])
+    return _load_checkpoint(models[name], dtype)
+
+
+def _ready_time():
+    # Child process of the startup benchmark: time from start to the first prediction
+    start = time.perf_counter()
+    pipelines = load_pipelines()
+    loaded = time.perf_counter() - start
+    for clf in pipelines.values():
+        clf(EXAMPLE_TEXTS[:1])
+    print(json.dumps({"load_s": round(loaded, 3), "ready_s": round(time.perf_counter() - start, 3)}))
+
+
+def benchmark_cold_start(runs=3, cache_dir=ARTIFACT_DIR):
+    """
+    Start fresh processes that load the models from the Hugging Face
+    checkpoints and from the compiled artifacts in `cache_dir`; report the
+    best time (of `runs`) until the models are loaded and until the first
+    prediction.
+    """
+    if not os.path.exists(os.path.join(cache_dir, MANIFEST)):
+        raise SystemExit("no compiled artifacts; run `python model_artifacts.py compile` first")
+    results = {}
+    for source, use_artifacts in (("checkpoints", "0"), ("artifacts", "1")):
+        samples = []
+        for _ in range(runs):
+            out = subprocess.run(
+                [sys.executable, __file__, "_ready"],
+                capture_output=True, text=True, check=True,
+                env=dict(os.environ, AIGNOSIS_USE_ARTIFACTS=use_artifacts, AIGNOSIS_ARTIFACT_DIR=cache_dir))
+            samples.append(json.loads(out.stdout.strip().splitlines()[-1]))
+        results[source] = {
+            "load_s": min(s["load_s"] for s in samples),
+            "ready_s": min(s["ready_s"] for s in samples),
+        }
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compile the assessment models into TorchScript artifacts")
+    parser.add_argument("command", choices=["compile", "benchmark", "_ready"])
+    parser.add_argument("--cache-dir", default=ARTIFACT_DIR)
+    parser.add_argument("--runs", type=int, default=3)
+    args = parser.parse_args()
+    if args.command == "compile":
+        compile_models(MODELS, args.cache_dir)
+    elif args.command == "benchmark":
+        for source, timing in benchmark_cold_start(args.runs, args.cache_dir).items():
+            print(f"{source:12s} load={timing['load_s']:7.2f}s  first prediction={timing['ready_s']:7.2f}s")
+    else:
+        _ready_time()
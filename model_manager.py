@@ -0,0 +1,210 @@
+import gc
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from metrics import REGISTRY, simple_collector
+from model_artifacts import MODELS, load_pipeline, load_pipelines
+
+# ---------------------- Configuration ----------------------
+# AIGNOSIS_MODEL_MEMORY_MB  memory budget of the loaded models in MB; when a
+#                           model is needed and the budget is full, the least
+#                           recently used idle models are unloaded (0 = no
+#                           budget, every model stays loaded)
+# AIGNOSIS_MODEL_DTYPE      weight storage of the checkpoint models: float32
+#                           (default), bfloat16 or float16 (about half the
+#                           memory; float16 matmuls are slow on many CPUs)
+MODEL_MEMORY_MB = float(os.getenv("AIGNOSIS_MODEL_MEMORY_MB", 0))
+MODEL_DTYPE = os.getenv("AIGNOSIS_MODEL_DTYPE", "float32")
+DTYPES = ("float32", "bfloat16", "float16")
+
+
+def _rss_bytes():
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        return 0
+
+
+def _tensor_bytes(clf):
+    """Size of the weights of a pipeline's model, or 0 if they are not visible (TorchScript)."""
+    model = getattr(clf, "model", None)
+    if model is None or not hasattr(model, "parameters"):
+        return 0
+    try:
+        tensors = list(model.parameters()) + list(model.buffers())
+    except Exception:
+        return 0
+    return sum(t.numel() * t.element_size() for t in tensors)
+
+
+class ModelManager:
+    """
+    Keeps the classifiers of `models` within a memory budget.
+    A model is loaded on first use; its resident size is the size of its
+    weights (or the process RSS growth while loading, for TorchScript
+    artifacts). When loading would exceed the budget, the least recently
+    used models that are not running are unloaded first. A model larger than
+    the budget is still loaded (the budget is then exceeded until it is
+    idle and another model is needed).
+    """
+
+    def __init__(self, models=MODELS, budget_mb=MODEL_MEMORY_MB, dtype=MODEL_DTYPE, loader=load_pipeline):
+        if dtype not in DTYPES:
+            raise ValueError(f"unknown model dtype {dtype!r} (use {', '.join(DTYPES)})")
+        self.models = dict(models)
+        self.budget = int(budget_mb * 1024 * 1024) or None
+        self.dtype = None if dtype == "float32" else dtype
+        self.loader = loader
+        self.loaded = OrderedDict()       # name -> classifier, least recently used first
+        self.sizes = {}                   # name -> resident bytes (kept after unloading, for planning)
+        self.in_use = {name: 0 for name in self.models}
+        self.loads = {name: 0 for name in self.models}
+        self.evictions = {name: 0 for name in self.models}
+        self.load_seconds = {name: 0.0 for name in self.models}
+        self._lock = threading.Lock()
+        self._load_locks = {name: threading.Lock() for name in self.models}
+
+    def resident_bytes(self):
+        return sum(self.sizes.get(name, 0) for name in self.loaded)
+
+    def _expected_size(self, name):
+        # Measured size, or the mean of the other models for a first load
+        if name in self.sizes:
+            return self.sizes[name]
+        return sum(self.sizes.values()) // len(self.sizes) if self.sizes else 0
+
+    def _evict_for(self, needed):
+        # Caller holds self._lock; returns the number of unloaded models
+        if self.budget is None:
+            return 0
+        evicted = 0
+        for name in list(self.loaded):
+            if self.resident_bytes() + needed <= self.budget:
+                break
+            if self.in_use[name]:
+                continue
+            del self.loaded[name]
+            self.evictions[name] += 1
+            evicted += 1
+        return evicted
+
+    def acquire(self, name):
+        """
+        The loaded classifier of `name` (loading it if needed), marked as in
+        use until release(name).
+        """
+        with self._lock:
+            clf = self.loaded.get(name)
+            if clf is not None:
+                self.loaded.move_to_end(name)
+                self.in_use[name] += 1
+                return clf
+        with self._load_locks[name]:
+            with self._lock:
+                clf = self.loaded.get(name)
+                if clf is not None:
+                    self.loaded.move_to_end(name)
+                    self.in_use[name] += 1
+                    return clf
+                # Make room before loading, so the peak stays within the budget
+                evicted = self._evict_for(self._expected_size(name))
+            if evicted:
+                gc.collect()
+            start, rss = time.perf_counter(), _rss_bytes()
+            clf = self.loader(name, self.models, self.dtype)
+            elapsed = time.perf_counter() - start
+            size = _tensor_bytes(clf) or max(0, _rss_bytes() - rss)
+            with self._lock:
+                self.sizes[name] = size
+                self.loads[name] += 1
+                self.load_seconds[name] += elapsed
+                evicted = self._evict_for(size)
+                self.loaded[name] = clf
+                self.in_use[name] += 1
+            if evicted:
+                gc.collect()
+            return clf
+
+    def release(self, name):
+        with self._lock:
+            self.in_use[name] -= 1
+
+    def preload(self):
+        """Load models in order while they fit the budget (all without a budget)."""
+        for name in self.models:
+            if self.budget is not None and self.loaded and self.resident_bytes() + self._expected_size(name) > self.budget:
+                break
+            self.acquire(name)
+            self.release(name)
+        return self
+
+    def pipelines(self):
+        """{name: ManagedPipeline}: drop-in for the dict of loaded pipelines."""
+        return {name: ManagedPipeline(self, name) for name in self.models}
+
+    def stats(self):
+        with self._lock:
+            return {
+                "budget_mb": round(self.budget / 2 ** 20, 1) if self.budget else None,
+                "dtype": self.dtype or "float32",
+                "resident_mb": round(self.resident_bytes() / 2 ** 20, 1),
+                "models": {
+                    name: {
+                        "loaded": name in self.loaded,
+                        "resident_mb": round(self.sizes.get(name, 0) / 2 ** 20, 1) if name in self.sizes else None,
+                        "in_use": self.in_use[name],
+                        "loads": self.loads[name],
+                        "evictions": self.evictions[name],
+                        "load_seconds": round(self.load_seconds[name], 3),
+                    }
+                    for name in self.models
+                },
+            }
+
+
+class ManagedPipeline:
+    """
+    Callable like the pipeline of one model; loads the model through the
+    manager for every call and keeps it from being unloaded while it runs.
+    """
+
+    def __init__(self, manager, name):
+        self.manager = manager
+        self.name = name
+
+    def __call__(self, *args, **kwargs):
+        clf = self.manager.acquire(self.name)
+        try:
+            return clf(*args, **kwargs)
+        finally:
+            self.manager.release(self.name)
+
+
+def load_managed_pipelines(models=MODELS, budget_mb=MODEL_MEMORY_MB, dtype=MODEL_DTYPE):
+    """
+    The pipelines of `models`: loaded once as before without a budget,
+    otherwise managed by a ModelManager. Returns (pipelines, manager or None).
+    """
+    if not budget_mb:
+        if dtype not in DTYPES:
+            raise ValueError(f"unknown model dtype {dtype!r} (use {', '.join(DTYPES)})")
+        return load_pipelines(models, None if dtype == "float32" else dtype), None
+    manager = ModelManager(models, budget_mb, dtype).preload()
+    return manager.pipelines(), manager
+
+
+def register_metrics(manager):
+    def samples(key):
+        return lambda: [({"model": name}, s[key] or 0) for name, s in manager.stats()["models"].items()]
+
+    REGISTRY.register_collector(simple_collector(
+        "aignosis_model_resident_mb", "gauge", "Resident size of each loaded model (0 when unloaded)",
+        lambda: [({"model": name}, s["resident_mb"] if s["loaded"] else 0)
+                 for name, s in manager.stats()["models"].items()]))
+    REGISTRY.register_collector(simple_collector(
+        "aignosis_model_loads_total", "counter", "Model loads (first use and reloads after unloading)", samples("loads")))
+    REGISTRY.register_collector(simple_collector(
+        "aignosis_model_evictions_total", "counter", "Models unloaded to stay within the memory budget", samples("evictions")))
@@ -1,15 +1,10 @@
-import openai
 import json
-from docx import Document
-from dotenv import load_dotenv
-import os
 
-# Load environment variables from .env
-load_dotenv()
-openai.api_key = os.getenv("OPENAI_API_KEY")
+from llm_client import get_openai_client
 
 # Load .docx content
 def load_docx_text(path):
+    from docx import Document
     doc = Document(path)
     return "\n".join([para.text.strip() for para in doc.paragraphs if para.text.strip()])
 
@@ -39,7 +34,7 @@ def extract_key_value_pairs(docx_path):
     text = load_docx_text(docx_path)
     prompt = generate_prompt(text)
 
-    client = openai.OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+    client = get_openai_client()
     response = client.chat.completions.create(
         model="gpt-4",  # or "gpt-3.5-turbo"
         messages=[{"role": "user", "content": prompt}],
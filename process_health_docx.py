@@ -1,18 +1,13 @@
-import openai
-import os
 import json
-from docx import Document
-from dotenv import load_dotenv
 
+from cardio_core import convert_chinese_lab_units
+from llm_client import get_openai_client
 
-# --- Set your OpenAI API key ---
-# openai.api_key = os.getenv("OPENAI_API_KEY")  # or paste directly: "sk-..."
-# Load environment variables from .env
-load_dotenv()
-openai.api_key = os.getenv("OPENAI_API_KEY")
+# openai, docx and the .env file are loaded on first use, not at import
 
 # --- Load the .docx file and extract plain text ---
 def load_docx_text(file_path):
+    from docx import Document
     doc = Document(file_path)
     lines = []
     # Extract paragraphs
@@ -77,7 +72,7 @@ Do not group by section. Keep test names and values in original language (e.g.,
 # --- Call OpenAI GPT to extract and convert data ---
 def extract_medical_data(doc_text, model="gpt-4"):
     prompt = build_prompt(doc_text)
-    client = openai.OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+    client = get_openai_client()
     response = client.chat.completions.create(
         model=model,
         messages=[{"role": "user", "content": prompt}],
@@ -110,58 +105,6 @@ def extract_medical_data(doc_text, model="gpt-4"):
     except Exception:
         return content  # fallback to raw string if not pure JSON
 
-def convert_chinese_lab_units(result_dict):
-    # Conversion factors
-    conversion_map = {
-        "高密度脂蛋白胆固醇": (38.67, "mg/dL"),
-        "低密度脂蛋臼胆固醇": (38.67, "mg/dL"),
-        "总胆固酪": (38.67, "mg/dL"),
-        "甘油三醋": (88.57, "mg/dL"),
-        "尿素": (6.0, "mg/dL"),
-        "尿酸": (59.48, "mg/dL"),
-        "肌酐": (88.4, "mg/dL"),
-    }
-    import re
-    def convert_value(val, factor):
-        # Find float in string
-        m = re.search(r"([\d.]+)", val)
-        if m:
-            return round(float(m.group(1)) * factor, 1)
-        return val
-    def convert_range(rng, factor):
-        # Convert ranges like "3.10-8.80 mmol/L" or ">1.04 mmol/L" or "<5.18 mmol/L"
-        # Replace all numbers
-        def repl(m):
-            return str(round(float(m.group(0)) * factor, 1))
-        return re.sub(r"[\d.]+", repl, rng)
-    for k, v in result_dict.items():
-        if k in conversion_map:
-            factor, new_unit = conversion_map[k]
-            # Parse value and reference range
-            m = re.match(r"([\d.]+)[^\d]*([a-zA-Z/]+)? ?\(([^)]*)\)", v)
-            if m:
-                value = convert_value(m.group(1), factor)
-                ref = convert_range(m.group(3), factor)
-                result_dict[k] = f"{value} {new_unit} ({ref})"
-            else:
-                # Try to parse value only
-                m2 = re.match(r"([\d.]+)[^\d]*([a-zA-Z/]+)?", v)
-                if m2:
-                    value = convert_value(m2.group(1), factor)
-                    result_dict[k] = f"{value} {new_unit}"
-    # Special cases for µmol/L to mg/dL
-    for k in ["尿酸", "肌酐"]:
-        if k in result_dict:
-            v = result_dict[k]
-            factor = conversion_map[k][0]
-            new_unit = conversion_map[k][1]
-            m = re.match(r"([\d.]+)[^\d]*([a-zA-Z/µ]+)? ?\(([^)]*)\)", v)
-            if m:
-                value = round(float(m.group(1)) / factor, 1)
-                ref = re.sub(r"[\d.]+", lambda m: str(round(float(m.group(0)) / factor, 1)), m.group(3))
-                result_dict[k] = f"{value} {new_unit} ({ref})"
-    return result_dict
-
 # --- Save result to a file ---
 def save_result(result, output_path="output.json"):
     with open(output_path, "w", encoding="utf-8") as f:
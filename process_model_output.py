@@ -1,10 +1,4 @@
-import openai
-from dotenv import load_dotenv
-import os
-
-# Load environment variables from .env
-load_dotenv()
-openai.api_key = os.getenv("OPENAI_API_KEY")
+from llm_client import get_openai_client
 
 
 def summarize_model_outputs_llm(model_outputs, language="中文"):
@@ -75,7 +69,7 @@ Task:
 3. Suggest whether this case should be treated as "High Risk", "Medium Risk", or "Low Risk" in an automated system.
 4. Please also add a "User Action Suggestion" field to provide non-expert users with advice on whether they need to see a doctor, if it's urgent, if they can wait and observe, and what information they should prepare.
 """
-    client = openai.OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+    client = get_openai_client()
     response = client.chat.completions.create(
         model="gpt-4",
         messages=[
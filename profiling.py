@@ -0,0 +1,168 @@
+import contextlib
+import contextvars
+import cProfile
+import io
+import os
+import pstats
+import threading
+import time
+import uuid
+from collections import defaultdict
+
+# Per-request profiling, switched on with debug=True on
+# assessment.analyze_structured_inputs (or "debug": true on the JSON API
+# when AIGNOSIS_API_PROFILING=1). The request is profiled with cProfile in
+# every thread it uses and, if torch is installed, with the torch profiler.
+# Files written to AIGNOSIS_PROFILE_DIR, named <profile id>.*:
+#   .pstats        cProfile data (snakeviz, gprof2dot, pstats)
+#   .txt           top functions by cumulative time
+#   .folded        collapsed stacks (flamegraph.pl, speedscope, inferno)
+#   .torch.json    torch operator trace (chrome://tracing, Perfetto)
+#   .torch.folded  collapsed stacks of torch operators by self CPU time
+# Model calls inside inference worker processes are not profiled (they show
+# up as waiting for the pool).
+PROFILE_DIR = os.getenv("AIGNOSIS_PROFILE_DIR", "profiles")
+TOP_FUNCTIONS = 40
+MIN_FOLDED_SECONDS = 1e-5
+
+_active = contextvars.ContextVar("aignosis_profile", default=None)
+# torch's profiler is process-wide: profiled requests run one at a time
+_profile_lock = threading.Lock()
+
+
+class RequestProfile:
+    """cProfile data of one request, merged over the threads it ran in."""
+
+    def __init__(self, name, out_dir):
+        self.id = f"{time.strftime('%Y%m%d-%H%M%S')}-{name}-{uuid.uuid4().hex[:6]}"
+        self.out_dir = out_dir
+        self.stats = None
+        self.files = {}
+        self._lock = threading.Lock()
+
+    def add(self, profiler):
+        with self._lock:
+            if self.stats is None:
+                self.stats = pstats.Stats(profiler)
+            else:
+                self.stats.add(profiler)
+
+    def path(self, suffix):
+        return os.path.join(self.out_dir, self.id + suffix)
+
+    def write(self, torch_profiler=None):
+        os.makedirs(self.out_dir, exist_ok=True)
+        if self.stats is not None:
+            self.stats.dump_stats(self.path(".pstats"))
+            self.files["pstats"] = self.path(".pstats")
+            out = io.StringIO()
+            pstats.Stats(self.path(".pstats"), stream=out).sort_stats("cumulative").print_stats(TOP_FUNCTIONS)
+            with open(self.path(".txt"), "w", encoding="utf-8") as f:
+                f.write(out.getvalue())
+            self.files["summary"] = self.path(".txt")
+            with open(self.path(".folded"), "w", encoding="utf-8") as f:
+                f.writelines(f"{stack} {us}\n" for stack, us in folded_stacks(self.stats))
+            self.files["folded"] = self.path(".folded")
+        if torch_profiler is not None:
+            torch_profiler.export_chrome_trace(self.path(".torch.json"))
+            self.files["torch_trace"] = self.path(".torch.json")
+            try:
+                torch_profiler.export_stacks(self.path(".torch.folded"), "self_cpu_time_total")
+                self.files["torch_folded"] = self.path(".torch.folded")
+            except Exception:
+                pass
+        return self.files
+
+
+def _label(func):
+    filename, line, name = func
+    return f"{name} ({os.path.basename(filename)}:{line})" if line else name
+
+
+def folded_stacks(stats):
+    """
+    Collapsed stacks ("a;b;c <microseconds>") from cProfile data.
+    cProfile keeps caller -> callee edges, not full stacks: the time of a
+    function called from several places is split over its stacks in
+    proportion to the time spent under each caller.
+    """
+    table = stats.stats
+    callees = defaultdict(list)
+    for func, (_, _, _, _, callers) in table.items():
+        for caller, edge in callers.items():
+            callees[caller].append((func, edge[3]))
+    totals = defaultdict(float)
+
+    def walk(func, stack, share):
+        _, _, self_time, cumulative, _ = table[func]
+        stack = stack + (_label(func),)
+        totals[";".join(stack)] += self_time * share
+        for callee, edge_time in callees.get(func, ()):
+            callee_total = table[callee][3]
+            child_share = share * edge_time / callee_total if callee_total else 0.0
+            if child_share * callee_total >= MIN_FOLDED_SECONDS and _label(callee) not in stack:
+                walk(callee, stack, child_share)
+
+    for func, (_, _, _, _, callers) in table.items():
+        if not callers:
+            walk(func, (), 1.0)
+    return sorted((stack, int(seconds * 1e6)) for stack, seconds in totals.items() if seconds * 1e6 >= 1)
+
+
+def _start_torch_profiler():
+    try:
+        from torch.profiler import ProfilerActivity, profile
+    except ImportError:
+        return None
+    profiler = profile(activities=[ProfilerActivity.CPU], record_shapes=True, with_stack=True)
+    profiler.__enter__()
+    return profiler
+
+
+@contextlib.contextmanager
+def profile_request(name="assessment", out_dir=None):
+    """
+    Profile everything run inside the block, including work handed to other
+    threads through wrap(). Yields the RequestProfile; its `files` are
+    written when the block ends.
+    """
+    with _profile_lock:
+        profile = RequestProfile(name, out_dir or PROFILE_DIR)
+        token = _active.set(profile)
+        torch_profiler = _start_torch_profiler()
+        profiler = cProfile.Profile()
+        profiler.enable()
+        try:
+            yield profile
+        finally:
+            profiler.disable()
+            profile.add(profiler)
+            _active.reset(token)
+            if torch_profiler is not None:
+                torch_profiler.__exit__(None, None, None)
+            profile.write(torch_profiler)
+
+
+def wrap(fn):
+    """
+    `fn` itself outside a profiled request; inside one, a version of `fn`
+    that profiles the thread it runs in. Use where work is handed to an
+    executor thread.
+    """
+    profile = _active.get()
+    if profile is None:
+        return fn
+
+    def profiled(*args, **kwargs):
+        profiler = cProfile.Profile()
+        try:
+            profiler.enable()
+        except ValueError:
+            # Another profiler owns this thread (or the interpreter)
+            return fn(*args, **kwargs)
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            profiler.disable()
+            profile.add(profiler)
+    return profiled
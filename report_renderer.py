@@ -0,0 +1,288 @@
+import json
+from dataclasses import dataclass, field
+
+
+@dataclass
+class ModelPrediction:
+    """Prediction of one model in `pipelines`."""
+    name: str
+    ranked: list          # [(label, score), ...] sorted by score, descending
+    explanation: str
+
+
+@dataclass
+class LabTrend:
+    """Trend of one analyte over the patient's assessments (see lab_trends.py)."""
+    lab: str
+    count: int
+    first: float
+    last: float
+    delta: float          # last value - previous value
+    slope: float          # least-squares change per 30 days, None for less than a day of values
+    direction: str        # "rising", "falling" or "stable"
+    streak: int           # +k / -k: the last k values above / below the normal range
+    concern: bool         # direction or streak worth attention (e.g. rising LDL)
+
+
+@dataclass
+class AssessmentResult:
+    """Everything the report shows, independent of the output format."""
+    lang: str
+    final_risk: str
+    heart_score: int
+    heart_risk: str
+    risk_scores: dict
+    models: list = field(default_factory=list)            # [ModelPrediction, ...]
+    alerts: list = field(default_factory=list)
+    recommendations: list = field(default_factory=list)
+    summary: str = ""
+    extra_text: str = None
+    keywords: list = field(default_factory=list)
+    negated_keywords: list = field(default_factory=list)
+    text_matches: list = field(default_factory=list)     # [TextMatch, ...] from text_matcher
+    mismatch_warnings: list = field(default_factory=list)
+    file_data: dict = None
+    file_labs: dict = None
+    lab_overrides: list = field(default_factory=list)
+    llm_summary: str = None
+    recomputed: list = None
+    conditions: list = field(default_factory=list)       # rule-based findings, shown when degraded
+    degraded: list = None                                # stages skipped under load
+    pending_id: str = None                               # id of the full result completed later
+    preliminary: bool = False                            # rules + HEART shown while the models still run
+    trends: list = field(default_factory=list)           # [LabTrend, ...] of the patient, if known
+
+
+# ---------------------- Templates ----------------------
+# One template table per language; no language checks while rendering.
+TEMPLATES = {
+    "中文": {
+        "risk": "## 🩺 综合风险等级\n🔹 **{0}**\n\n",
+        "alerts": "## 🚨 临床警报\n",
+        "models": "## 📊 模型概率分布\n",
+        "model": "### 🔸 {0}\n",
+        "prob": "- {0}: {1:.2f}\n",
+        "heart": "\n## ❤️ HEART评分: {0}分 ({1})\n",
+        "weighted": "## ⚖️ 加权风险分数\n",
+        "weighted_item": "- {0}: {1:.3f}\n",
+        "recommendations": "\n## 🩺 临床建议\n",
+        "explanations": "\n## 💬 模型说明\n",
+        "explanation": "### {0}\n{1}\n\n",
+        "summary": "\n## 📝 输入摘要\n{0}\n",
+        "extra": "\n## 📝 其他症状/关注点分析\n输入内容: {0}\n关键词: {1}\n",
+        "no_keywords": "无明显关键词",
+        "negated": "否定提及: {0}\n",
+        "mismatch": "\n## ⚠️ 信息不一致警告\n",
+        "file": "### 上传文件内容解析\n",
+        "file_item": "- {0}: {1}\n",
+        "llm_summary": "\n## 📝 模型输出总结\n{0}\n",
+        "recomputed": "\n## 🔁 本次重新计算的阶段\n",
+        "degraded": "## ⏳ 降级评估\n系统负载较高，模型评分暂不可用，本结果仅基于临床规则和HEART评分。\n\n",
+        "conditions": "## 🩻 规则判断\n",
+        "degraded_stages": "\n## ⏳ 因负载跳过的阶段\n",
+        "pending": "完整结果生成中（编号: {0}），请稍后再次提交以查看。\n",
+        "preliminary": "## ⏳ 初步结果\n模型评分进行中，以下结果基于临床规则和HEART评分，稍后自动更新。\n\n",
+        "timeline": "\n## ⏱ 分阶段输出\n",
+        "timeline_item": "- {0}: {1:.3f}s\n",
+        "item": "- {0}\n",
+        "trends": "## 📈 化验趋势\n",
+        "trend": "- {0}{1}: {2:g} → {3:g}（{4}次），{5}{6}{7}\n",
+        "trend_slope": "，每30天 {0:+.4g}",
+        "trend_high": "，连续{0}次偏高",
+        "trend_low": "，连续{0}次偏低",
+        "rising": "上升",
+        "falling": "下降",
+        "stable": "平稳",
+    },
+    "English": {
+        "risk": "## 🩺 Overall risk\n🔹 **{0}**\n\n",
+        "alerts": "## 🚨 Clinical Alerts\n",
+        "models": "## 📊 Model Probability Distribution\n",
+        "model": "### 🔸 {0}\n",
+        "prob": "- {0}: {1:.2f}\n",
+        "heart": "\n## ❤️ HEART Score: {0} points ({1})\n",
+        "weighted": "## ⚖️ Weighted Risk Scores\n",
+        "weighted_item": "- {0}: {1:.3f}\n",
+        "recommendations": "\n## 🩺 Clinical Recommendations\n",
+        "explanations": "\n## 💬 Model Explanation\n",
+        "explanation": "### {0}\n{1}\n\n",
+        "summary": "\n## 📝 Input Summary\n{0}\n",
+        "extra": "\n## 📝 Extra Symptoms/Concerns Analysis\nInput: {0}\nKeywords: {1}\n",
+        "no_keywords": "No significant keywords found",
+        "negated": "Negated mentions: {0}\n",
+        "mismatch": "\n## ⚠️ Inconsistency Warning\n",
+        "file": "### File Content Analysis\n",
+        "file_item": "- {0}: {1}\n",
+        "llm_summary": "\n## 📝 Model Output Summary\n{0}\n",
+        "recomputed": "\n## 🔁 Recomputed Stages\n",
+        "degraded": "## ⏳ Degraded assessment\nThe system is under high load and model scoring is unavailable; this result is based on clinical rules and the HEART score only.\n\n",
+        "conditions": "## 🩻 Rule-based findings\n",
+        "degraded_stages": "\n## ⏳ Stages skipped under load\n",
+        "pending": "The full result is in progress (id: {0}); submit again later to see it.\n",
+        "preliminary": "## ⏳ Preliminary result\nModel scoring is in progress; this result is based on clinical rules and the HEART score and updates shortly.\n\n",
+        "timeline": "\n## ⏱ Progressive output\n",
+        "timeline_item": "- {0}: {1:.3f}s\n",
+        "item": "- {0}\n",
+        "trends": "## 📈 Lab Trends\n",
+        "trend": "- {0}{1}: {2:g} → {3:g} ({4} values), {5}{6}{7}\n",
+        "trend_slope": ", {0:+.4g} per 30 days",
+        "trend_high": ", high {0} times in a row",
+        "trend_low": ", low {0} times in a row",
+        "rising": "rising",
+        "falling": "falling",
+        "stable": "stable",
+    },
+}
+
+# Precompile: every template becomes its bound `str.format`
+_COMPILED = {
+    lang: {name: template.format for name, template in table.items()}
+    for lang, table in TEMPLATES.items()
+}
+
+
+def _templates(lang):
+    return _COMPILED.get(lang, _COMPILED["English"])
+
+
+def render_markdown(result):
+    """
+    Render the report body (everything the LLM summary is based on).
+    """
+    t = _templates(result.lang)
+    item = t["item"]
+    parts = [t["risk"](result.final_risk)]
+    if result.preliminary:
+        parts.append(t["preliminary"]())
+    elif not result.models and result.degraded:
+        parts.append(t["degraded"]())
+    if result.conditions:
+        parts.append(t["conditions"]())
+        parts.extend(item(condition) for condition in result.conditions)
+        parts.append("\n")
+    if result.alerts:
+        parts.append(t["alerts"]())
+        parts.extend(item(alert) for alert in result.alerts)
+        parts.append("\n")
+    if result.trends:
+        parts.append(t["trends"]())
+        parts.extend(_render_trend(t, trend) for trend in result.trends)
+        parts.append("\n")
+    if result.models:
+        parts.append(t["models"]())
+        for model in result.models:
+            parts.append(t["model"](model.name))
+            parts.extend(t["prob"](label, score) for label, score in model.ranked)
+    parts.append(t["heart"](result.heart_score, result.heart_risk))
+    if result.risk_scores:
+        parts.append(t["weighted"]())
+        parts.extend(t["weighted_item"](risk, score) for risk, score in result.risk_scores.items())
+    parts.append(t["recommendations"]())
+    parts.extend(item(rec) for rec in result.recommendations)
+    if result.models:
+        parts.append(t["explanations"]())
+        parts.extend(t["explanation"](model.name, model.explanation) for model in result.models)
+    parts.append(t["summary"](result.summary))
+    if result.extra_text:
+        keywords = ", ".join(result.keywords) if result.keywords else t["no_keywords"]()
+        parts.append(t["extra"](result.extra_text, keywords))
+        if result.negated_keywords:
+            parts.append(t["negated"](", ".join(result.negated_keywords)))
+    if result.mismatch_warnings:
+        parts.append(t["mismatch"]())
+        parts.extend(item(warn) for warn in result.mismatch_warnings)
+    if result.file_data:
+        parts.append(t["file"]())
+        parts.extend(t["file_item"](k, v) for k, v in result.file_data.items())
+        parts.append("\n")
+    if result.lab_overrides:
+        parts.append("\n".join(result.lab_overrides))
+    return "".join(parts)
+
+
+def _render_trend(t, trend):
+    slope = t["trend_slope"](trend.slope) if trend.slope is not None else ""
+    streak = ""
+    if trend.streak >= 2:
+        streak = t["trend_high"](trend.streak)
+    elif trend.streak <= -2:
+        streak = t["trend_low"](-trend.streak)
+    return t["trend"]("⚠️ " if trend.concern else "", trend.lab, trend.first, trend.last, trend.count,
+                      t[trend.direction](), slope, streak)
+
+
+def render_markdown_tail(result):
+    """
+    Render the sections that come after the report body: LLM summary, the
+    stages skipped under load and the list of recomputed stages.
+    """
+    t = _templates(result.lang)
+    parts = []
+    if result.llm_summary is not None:
+        parts.append(t["llm_summary"](result.llm_summary))
+    if result.degraded:
+        parts.append(t["degraded_stages"]())
+        parts.extend(t["item"](name) for name in result.degraded)
+        if result.pending_id:
+            parts.append(t["pending"](result.pending_id))
+    if result.recomputed is not None:
+        parts.append(t["recomputed"]())
+        if result.recomputed:
+            parts.extend(t["item"](name) for name in result.recomputed)
+        else:
+            parts.append("-\n")
+    return "".join(parts)
+
+
+def render_timeline(lang, timeline):
+    """Render [(stage, seconds since the request started), ...] of the progressive updates shown so far."""
+    t = _templates(lang)
+    return t["timeline"]() + "".join(t["timeline_item"](stage, seconds) for stage, seconds in timeline)
+
+
+def to_payload(result):
+    """
+    Compact structured form of the result for API clients (no markdown).
+    """
+    payload = {
+        "lang": result.lang,
+        "final_risk": result.final_risk,
+        "heart": {"score": result.heart_score, "risk": result.heart_risk},
+        "risk_scores": {k: round(v, 4) for k, v in result.risk_scores.items()},
+        "models": {m.name: {label: round(score, 4) for label, score in m.ranked} for m in result.models},
+        "alerts": result.alerts,
+        "recommendations": result.recommendations,
+    }
+    if result.keywords:
+        payload["keywords"] = result.keywords
+    if result.negated_keywords:
+        payload["negated_keywords"] = result.negated_keywords
+    if result.text_matches:
+        payload["text_matches"] = [[m.start, m.end, m.term, m.negated] for m in result.text_matches]
+    if result.mismatch_warnings:
+        payload["mismatch_warnings"] = result.mismatch_warnings
+    if result.file_labs:
+        payload["file_labs"] = result.file_labs
+    if result.lab_overrides:
+        payload["lab_overrides"] = result.lab_overrides
+    if result.llm_summary is not None:
+        payload["llm_summary"] = result.llm_summary
+    if result.conditions:
+        payload["conditions"] = result.conditions
+    if result.degraded:
+        payload["degraded"] = result.degraded
+    if result.pending_id:
+        payload["pending_id"] = result.pending_id
+    if result.trends:
+        payload["trends"] = [
+            {"lab": tr.lab, "count": tr.count, "first": tr.first, "last": tr.last, "delta": tr.delta,
+             "slope_per_30d": tr.slope, "direction": tr.direction, "streak": tr.streak, "concern": tr.concern}
+            for tr in result.trends
+        ]
+    if result.recomputed is not None:
+        payload["recomputed"] = result.recomputed
+    return payload
+
+
+def render_json(result):
+    return json.dumps(to_payload(result), ensure_ascii=False, separators=(",", ":"))
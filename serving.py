@@ -0,0 +1,147 @@
+import copy
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+# ---------------------- Configuration ----------------------
+# AIGNOSIS_CONCURRENCY   number of requests processed at the same time (default: CPU cores)
+# AIGNOSIS_QUEUE_SIZE    max requests waiting in the queue before new ones are rejected
+# AIGNOSIS_TORCH_THREADS intra-op threads per request (default: cores // concurrency)
+# AIGNOSIS_LENGTH_BUCKETING set to 0 to batch texts in call order instead of by token length
+CPU_COUNT = len(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else (os.cpu_count() or 1)
+CONCURRENCY = int(os.getenv("AIGNOSIS_CONCURRENCY", CPU_COUNT))
+QUEUE_SIZE = int(os.getenv("AIGNOSIS_QUEUE_SIZE", CONCURRENCY * 16))
+TORCH_THREADS = int(os.getenv("AIGNOSIS_TORCH_THREADS", max(1, CPU_COUNT // CONCURRENCY)))
+LENGTH_BUCKETING = os.getenv("AIGNOSIS_LENGTH_BUCKETING", "1") != "0"
+
+
+def configure_torch_threads(threads=None):
+    """
+    Limit PyTorch intra-op threads so concurrent requests do not oversubscribe
+    the cores (each request would otherwise grab all of them).
+    """
+    import torch
+    torch.set_num_threads(threads or TORCH_THREADS)
+
+
+def configure_queue(app, concurrency=None, queue_size=None):
+    """
+    Enable the Gradio request queue with an explicit size and worker count.
+    Returns the app, so it can be chained before launch().
+    """
+    concurrency = concurrency or CONCURRENCY
+    app.queue(max_size=queue_size or QUEUE_SIZE, default_concurrency_limit=concurrency)
+    return app
+
+
+def launch(app, concurrency=None, queue_size=None, **kwargs):
+    """
+    Configure queue and torch threads, then launch the Gradio app.
+    """
+    concurrency = concurrency or CONCURRENCY
+    configure_torch_threads()
+    configure_queue(app, concurrency, queue_size)
+    # The worker thread pool must be at least as large as the concurrency limit
+    kwargs.setdefault("max_threads", max(40, concurrency))
+    return app.launch(**kwargs)
+
+
+def length_buckets(lengths, batch_size):
+    """
+    Indices of the texts with token counts `lengths`, grouped into batches of
+    `batch_size` texts of similar length (sorted by length, then cut), so
+    every batch is padded only to its own longest text.
+    """
+    order = sorted(range(len(lengths)), key=lengths.__getitem__)
+    return [order[start:start + batch_size] for start in range(0, len(order), batch_size)]
+
+
+class PerThreadPipeline:
+    """
+    Thread-safe wrapper around a Hugging Face pipeline.
+    Fast tokenizers are not safe to call from several threads at once
+    ("Already borrowed"), so every worker thread gets its own pipeline with a
+    private tokenizer copy; the model weights are shared, not copied.
+    A list of texts called with batch_size > 1 is batched by token length
+    (length_buckets); the outputs keep the order of the texts.
+    """
+
+    def __init__(self, pipe, length_bucketing=LENGTH_BUCKETING):
+        self.pipe = pipe
+        self.length_bucketing = length_bucketing
+        self._local = threading.local()
+        self._owner = threading.get_ident()
+
+    def _get(self):
+        pipe = getattr(self._local, "pipe", None)
+        if pipe is None:
+            if threading.get_ident() == self._owner:
+                pipe = self.pipe
+            else:
+                from transformers import pipeline
+                pipe = pipeline(
+                    self.pipe.task, model=self.pipe.model,
+                    tokenizer=copy.deepcopy(self.pipe.tokenizer))
+            self._local.pipe = pipe
+        return pipe
+
+    def __call__(self, *args, **kwargs):
+        pipe = self._get()
+        texts, batch_size = (args[0] if args else None), kwargs.get("batch_size") or 1
+        if not (self.length_bucketing and isinstance(texts, list) and batch_size > 1 and len(texts) > batch_size):
+            return pipe(*args, **kwargs)
+        # The pipeline pads each batch of consecutive texts to its longest one:
+        # call it on the texts sorted by length and put the outputs back in order
+        lengths = [len(ids) for ids in pipe.tokenizer(texts, truncation=True)["input_ids"]]
+        order = [i for bucket in length_buckets(lengths, batch_size) for i in bucket]
+        outputs = [None] * len(texts)
+        for i, output in zip(order, pipe([texts[i] for i in order], *args[1:], **kwargs)):
+            outputs[i] = output
+        return outputs
+
+    def __getattr__(self, name):
+        if name in ("pipe", "length_bucketing", "_local", "_owner"):
+            raise AttributeError(name)
+        return getattr(self.pipe, name)
+
+
+def run_load_test(levels=None, requests_per_worker=8):
+    """
+    Measure assessment throughput at increasing worker counts.
+    Returns a list of (workers, requests_per_second, speedup).
+    """
+    import assessment
+    configure_torch_threads(1)
+
+    no, yes = "No", "Yes"
+    symptoms = {"Is chest pain aggravated by exertion?": yes, "Is there shortness of breath?": no,
+                "__extra_text__": "no chest pain, but cold sweat"}
+    history = {"Do you have hypertension?": yes, "Family history of heart disease?": no}
+    labs = {"Systolic BP (mmHg)": 150, "Diastolic BP (mmHg)": 95, "Troponin I/T (ng/mL)": 0.02}
+
+    def one(i):
+        lab_params = dict(labs, **{"Systolic BP (mmHg)": 120 + i % 60})
+        return assessment.analyze_structured_inputs(
+            symptoms, history, lab_params, None, "English", output_format="json")
+
+    levels = levels or sorted({1, 2, 4, 8, 16, 32, CPU_COUNT} & set(range(1, CPU_COUNT + 1)))
+    one(0)  # warm-up
+    results = []
+    base = None
+    for workers in levels:
+        total = workers * requests_per_worker
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            start = time.perf_counter()
+            list(pool.map(one, range(total)))
+            elapsed = time.perf_counter() - start
+        rps = total / elapsed
+        base = base or rps
+        results.append((workers, rps, rps / base))
+    return results
+
+
+if __name__ == "__main__":
+    print(f"cores={CPU_COUNT}")
+    for workers, rps, speedup in run_load_test():
+        print(f"workers={workers:3d}  throughput={rps:8.2f} req/s  speedup={speedup:5.2f}x")
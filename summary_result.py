@@ -1,10 +1,4 @@
-import openai
-from dotenv import load_dotenv
-import os
-
-# Load environment variables from .env
-load_dotenv()
-openai.api_key = os.getenv("OPENAI_API_KEY")
+from llm_client import get_openai_client
 
 
 def summarize_model_outputs_llm(model_outputs, language="中文"):
@@ -63,7 +57,7 @@ Based on the above model output, generate a detailed user report, but do not rep
 Please output only in English.
 Make sure the structure and level of detail match the Chinese report.
 """
-    client = openai.OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+    client = get_openai_client()
     response = client.chat.completions.create(
         model="gpt-4",
         messages=[
@@ -0,0 +1,163 @@
+import asyncio
+from collections import Counter
+from concurrent.futures import Future
+
+from admission import StageDegraded
+from assessment_graph import AssessmentGraph, AssessmentSession
+
+
+def make_graph(calls):
+    # a -> double -> total <- plus_b <- b
+    graph = AssessmentGraph()
+
+    @graph.stage("double", deps=["a"])
+    def double(a):
+        calls["double"] += 1
+        return a * 2
+
+    @graph.stage("plus_b", deps=["b"])
+    def plus_b(b):
+        calls["plus_b"] += 1
+        return b + 1
+
+    @graph.stage("total", deps=["double", "plus_b"])
+    def total(double, plus_b):
+        calls["total"] += 1
+        return None if double is None else double + plus_b
+
+    return graph
+
+
+def test_rerun_only_recomputes_changed_branch():
+    calls = Counter()
+    graph = make_graph(calls)
+    session = AssessmentSession()
+    values, recomputed = graph.run({"a": 1, "b": 10}, session=session)
+    assert values["total"] == 13
+    assert recomputed == ["double", "plus_b", "total"]
+
+    values, recomputed = graph.run({"a": 1, "b": 10}, session=session)
+    assert recomputed == []
+    assert values["total"] == 13
+
+    values, recomputed = graph.run({"a": 1, "b": 20}, session=session)
+    assert recomputed == ["plus_b", "total"]
+    assert values["total"] == 23
+    assert calls == Counter(double=1, plus_b=2, total=2)
+    assert set(session.last_timings) == {"plus_b", "total"}
+
+
+def test_unchanged_output_does_not_invalidate_downstream():
+    calls = Counter()
+    graph = AssessmentGraph()
+
+    @graph.stage("sign", deps=["a"])
+    def sign(a):
+        calls["sign"] += 1
+        return a > 0
+
+    @graph.stage("label", deps=["sign"])
+    def label(sign):
+        calls["label"] += 1
+        return "positive" if sign else "negative"
+
+    session = AssessmentSession()
+    graph.run({"a": 3}, session=session)
+    values, recomputed = graph.run({"a": 5}, session=session)
+    assert recomputed == ["sign"]
+    assert values["label"] == "positive"
+    assert calls == Counter(sign=2, label=1)
+
+
+def test_only_runs_dependency_closure():
+    calls = Counter()
+    graph = make_graph(calls)
+    values, recomputed = graph.run({"a": 3, "b": 0}, only={"double"})
+    assert recomputed == ["double"]
+    assert values["double"] == 6
+    assert "plus_b" not in values and "total" not in values
+
+
+def test_skip_degrades_stage_and_downstream_gets_none():
+    calls = Counter()
+    graph = make_graph(calls)
+    session = AssessmentSession()
+    values, recomputed = graph.run({"a": 1, "b": 1}, session=session, skip={"double"})
+    assert values["double"] is None
+    assert values["total"] is None
+    assert session.last_degraded == ["double"]
+    assert "double" not in recomputed and calls["double"] == 0
+    # a cached output is used even when the stage is listed in skip
+    graph.run({"a": 1, "b": 1}, session=session)
+    values, _ = graph.run({"a": 1, "b": 1}, session=session, skip={"double"})
+    assert values["double"] == 2
+    assert session.last_degraded == []
+
+
+def test_late_output_is_cached_under_the_fingerprint_of_its_run():
+    late = Future()
+    graph = AssessmentGraph()
+
+    calls = []
+
+    @graph.stage("slow", deps=["a"])
+    def slow(a):
+        if not late.done():
+            raise StageDegraded("slow", "deadline", late=late)
+        calls.append(a)
+        return f"fresh {a}"
+
+    session = AssessmentSession()
+    values, _ = graph.run({"a": 1}, session=session)
+    assert values["slow"] is None
+    assert session.last_degraded == ["slow"]
+    assert session.late == {"slow": late}
+
+    late.set_result("done for a=1")
+    values, recomputed = graph.run({"a": 1}, session=session)
+    assert values["slow"] == "done for a=1"
+    assert recomputed == [] and session.last_degraded == [] and calls == []
+
+    # The late output belongs to a=1: other inputs must not reuse it
+    values, recomputed = graph.run({"a": 2}, session=session)
+    assert values["slow"] == "fresh 2" and calls == [2]
+
+
+def test_run_async_matches_run_and_reports_stages():
+    calls = Counter()
+    graph = make_graph(calls)
+    reported = []
+
+    async def main():
+        session = AssessmentSession()
+        values, recomputed = await graph.run_async(
+            {"a": 2, "b": 5}, session=session, on_stage=lambda name, output: reported.append((name, output)))
+        again, recomputed_again = await graph.run_async({"a": 2, "b": 5}, session=session)
+        return values, recomputed, again, recomputed_again
+
+    values, recomputed, again, recomputed_again = asyncio.run(main())
+    assert values["total"] == again["total"] == 10
+    assert recomputed == ["double", "plus_b", "total"]
+    assert recomputed_again == []
+    assert sorted(reported) == [("double", 4), ("plus_b", 6), ("total", 10)]
+    assert reported[-1] == ("total", 10)
+
+
+def test_snapshot_runs_apart_and_merges_only_untouched_stages():
+    calls = Counter()
+    graph = make_graph(calls)
+    session = AssessmentSession()
+    graph.run({"a": 1, "b": 1}, session=session)
+
+    background = session.snapshot()
+    assert background.id == session.id
+    graph.run({"a": 5, "b": 1}, session=background)
+    assert background.last_recomputed == ["double", "total"]
+    # The live session's bookkeeping is untouched by the background run
+    assert session.last_recomputed == ["double", "plus_b", "total"]
+
+    # Meanwhile the user submits again and caches another "total"
+    session.store("total", "other-key", "user's")
+    session.merge(background)
+    assert session.cache["double"] == background.cache["double"]
+    assert session.cache["total"] == ("other-key", "user's")
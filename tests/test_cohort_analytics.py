@@ -0,0 +1,74 @@
+import time
+from types import SimpleNamespace
+
+import pytest
+
+pytest.importorskip("pyarrow")
+
+import cohort_analytics  # noqa: E402
+from history_store import HistoryStore, history_entry  # noqa: E402
+
+T0 = time.time() - 3600
+
+
+def model(name, label, probability):
+    return SimpleNamespace(name=name, ranked=[(label, probability)])
+
+
+# (heart score, final risk, heart risk, rules, model labels, degraded)
+PATIENTS = [
+    (2, "Low Risk", "Low Risk", [], ("Low Risk", "Low Risk", "Low Risk"), False),
+    (5, "Moderate Risk", "Moderate Risk", ["高血压 (轻度)"], ("Moderate Risk", "High Risk", "Moderate Risk"), False),
+    (8, "High Risk", "High Risk", ["冠心病", "高血压 (严重)"], ("High Risk", "High Risk", "High Risk"), False),
+    (7, "High Risk", "Moderate Risk", ["冠心病"], None, True),
+]
+
+
+@pytest.fixture
+def history(tmp_path):
+    path = str(tmp_path / "history.db")
+    store = HistoryStore(path)
+    for i, (score, final, heart, rules, labels, degraded) in enumerate(PATIENTS):
+        models = [] if labels is None else [model(name, label, 0.5 + 0.1 * j)
+                                            for j, (name, label) in enumerate(zip(cohort_analytics.MODELS, labels))]
+        outcome = SimpleNamespace(final_risk=final, heart_score=score, heart_risk=heart,
+                                  risk_scores={final: 0.6}, models=models, degraded=["models"] if degraded else [])
+        store.record(history_entry(f"p{i % 2}", "English", {}, {}, {"Systolic BP (mmHg)": 120 + 10 * i},
+                                   outcome, {"total": 0.5}, rules=rules, created_at=T0 + i))
+    store.flush()
+    store.close()
+    return path
+
+
+@pytest.mark.parametrize("file_format", ["parquet", "arrow"])
+def test_export_and_report_round_trip(history, tmp_path, file_format):
+    out = str(tmp_path / f"history.{file_format}")
+    assert cohort_analytics.export_history(out, history, file_format=file_format, chunk_rows=3) == 4
+    rows = list(cohort_analytics.iter_batches(out, ["id", "sbp", "rules"], batch_rows=2))
+    assert max(batch.num_rows for batch in rows) == 2
+    assert [v for batch in rows for v in batch.column("sbp").to_pylist()] == [120, 130, 140, 150]
+
+    report = cohort_analytics.cohort_report(out, batch_rows=2)
+    assert report["risk_distribution"]["groups"] == {
+        "0-3": {"count": 1, "risks": {"Low Risk": 1.0}},
+        "4-6": {"count": 1, "risks": {"Moderate Risk": 1.0}},
+        "7-10": {"count": 2, "risks": {"High Risk": 1.0}},
+    }
+    rules = report["rule_fire_rates"]
+    assert rules["assessments"] == 4 and rules["none"] == 0.25
+    assert rules["rules"] == {"Coronary Artery Disease": 0.5, "Hypertension (Mild)": 0.25,
+                              "Hypertension (Severe)": 0.25}
+    models = report["model_disagreement"]
+    assert models["scored_by_all_models"] == 3
+    assert models["top_label_disagreement"] == round(1 / 3, 4)
+    assert models["final_matches_heart_risk"] == 0.75
+
+
+def test_export_since_and_grouping_by_patient(history, tmp_path):
+    out = str(tmp_path / "recent.parquet")
+    assert cohort_analytics.export_history(out, history, since=T0 + 2) == 2
+    groups = cohort_analytics.risk_distribution(out, by="patient")
+    assert groups == {"p0": {"count": 1, "risks": {"High Risk": 1.0}},
+                      "p1": {"count": 1, "risks": {"High Risk": 1.0}}}
+    with pytest.raises(ValueError):
+        cohort_analytics.risk_distribution(out, by="unknown")
@@ -0,0 +1,91 @@
+import os
+import threading
+
+import pytest
+
+import cpu_scheduler
+from cpu_scheduler import Layout, ModelScheduler, Slot, parse_layout, partition_cores, plan_layouts, resolve_layout
+
+MODELS = ["BioBERT", "ClinicalBERT", "PubMedBERT"]
+CORES = [[0, 4], [1, 5], [2, 6], [3, 7]]
+
+
+def test_partition_cores():
+    assert partition_cores(CORES, 2) == [[0, 1], [2, 3]]
+    assert partition_cores(CORES, 3) == [[0, 1], [2], [3]]
+    assert partition_cores(CORES, 2, smt=True) == [[0, 1, 4, 5], [2, 3, 6, 7]]
+    assert partition_cores(CORES[:1], 2) == [[0], [0]]
+
+
+def test_planned_layouts():
+    layouts = plan_layouts(MODELS, CORES)
+    assert set(layouts) == {"sequential", "per_model", "per_model_smt", "shared"}
+    assert layouts["per_model"].describe()[0] == {"models": ["BioBERT"], "cpus": [0, 1], "threads": 2}
+    assert resolve_layout("shared", MODELS, CORES) == layouts["shared"]
+
+
+def test_explicit_layout_spec():
+    layout = resolve_layout("BioBERT=0-1:4, ClinicalBERT+PubMedBERT=2+6-7", MODELS, CORES)
+    assert layout.slots == (Slot(("BioBERT",), (0, 1), 4), Slot(("ClinicalBERT", "PubMedBERT"), (2, 6, 7), 3))
+    unpinned = parse_layout("BioBERT=*:2,ClinicalBERT=*,PubMedBERT=*", MODELS, CORES)
+    assert [(slot.cpus, slot.threads) for slot in unpinned.slots] == [((), 2), ((), 1), ((), 1)]
+
+
+@pytest.mark.parametrize("spec", [
+    "BioBERT=0-1",                                        # models left out
+    "BioBERT=0,ClinicalBERT=1,PubMedBERT=2,BioBERT=3",    # a model twice
+    "GPT=0,ClinicalBERT=1,PubMedBERT=2",                  # unknown model
+    "BioBERT=0-9,ClinicalBERT=1,PubMedBERT=2",            # CPUs not usable
+    "BioBERT=a,ClinicalBERT=1,PubMedBERT=2",
+    "BioBERT=0:0,ClinicalBERT=1,PubMedBERT=2",
+    "BioBERT,ClinicalBERT=1,PubMedBERT=2",
+    "fastest",
+])
+def test_invalid_layouts(spec):
+    with pytest.raises(ValueError):
+        resolve_layout(spec, MODELS, CORES)
+
+
+def test_merged_layout():
+    layout = Layout("custom", (Slot(("a",), (0, 1), 2), Slot(("b", "c"), (2,), 1)))
+    assert layout.merged().slots == (Slot(("a", "b", "c"), (0, 1, 2), 3),)
+    unpinned = Layout("shared", (Slot(("a",), (), 2), Slot(("b",), (1,), 1)))
+    assert unpinned.merged().slots == (Slot(("a", "b"), (), 3),)
+
+
+def recorder():
+    seen = {}
+
+    def model(name):
+        def run(texts, **kwargs):
+            seen[name] = (threading.current_thread().name, sorted(os.sched_getaffinity(0)))
+            return [name] * len(texts)
+        return run
+    return seen, {name: model(name) for name in MODELS}
+
+
+@pytest.mark.skipif(not hasattr(os, "sched_getaffinity"), reason="needs CPU affinity")
+def test_slots_run_on_their_own_pinned_threads(monkeypatch):
+    monkeypatch.setattr(cpu_scheduler, "intra_op_threads_per_thread", lambda: True)
+    cpu = min(os.sched_getaffinity(0))
+    seen, pipelines = recorder()
+    layout = Layout("custom", (Slot(("BioBERT",), (cpu,), 1), Slot(("ClinicalBERT", "PubMedBERT"), (), 1)))
+    scheduler = ModelScheduler(pipelines, layout)
+    try:
+        assert scheduler.predict_all({name: ["t"] for name in MODELS}) == {name: [name] for name in MODELS}
+    finally:
+        scheduler.shutdown()
+    assert seen["BioBERT"][1] == [cpu]
+    assert seen["ClinicalBERT"][0] == seen["PubMedBERT"][0] != seen["BioBERT"][0]
+
+
+def test_process_wide_threads_merge_the_slots(monkeypatch):
+    monkeypatch.setattr(cpu_scheduler, "intra_op_threads_per_thread", lambda: False)
+    seen, pipelines = recorder()
+    scheduler = ModelScheduler(pipelines, plan_layouts(MODELS, [[0]])["shared"])
+    try:
+        scheduler.predict_all(["t"])
+    finally:
+        scheduler.shutdown()
+    assert len(scheduler.layout.slots) == 1
+    assert len({thread for thread, _ in seen.values()}) == 1
@@ -0,0 +1,67 @@
+import sqlite3
+import time
+from types import SimpleNamespace
+
+from history_store import SCHEMA, HistoryStore, history_entry, open_history_store
+from lab_trends import AnalyteStats
+
+
+def result(final_risk="High Risk", heart_score=5, heart_risk="Moderate Risk", models=(), degraded=()):
+    return SimpleNamespace(final_risk=final_risk, heart_score=heart_score, heart_risk=heart_risk,
+                           risk_scores={final_risk: 0.7}, models=list(models), degraded=list(degraded))
+
+
+def test_recorded_assessments_round_trip(tmp_path):
+    store = HistoryStore(str(tmp_path / "history.db"))
+    stats = AnalyteStats()
+    stats.add(time.time(), 160.0)
+    store.record(history_entry("p1", "中文", {}, {}, {"收缩压 (mmHg)": 160, "LDL (mg/dL)": "n/a"},
+                               result(final_risk="高风险"), {"total": 0.1},
+                               trend_states={"sbp": stats.to_dict()}, rules=["高血压 (中度)", "无明显心血管疾病风险"]))
+    store.record(history_entry("p2", "English", {}, {}, {}, result(), {"total": 0.2}, created_at=time.time() + 1))
+    store.flush()
+    store.close()
+
+    [row] = store.assessments(patient_id="p1")
+    assert row["final_risk"] == "High Risk"      # stored in English whatever the language
+    assert row["rules"] == ["Hypertension (Moderate)"]
+    assert row["timings"] == {"total": 0.1} and row["degraded"] is None
+    assert [(lab, value) for _, lab, value in store.lab_values("p1")] == [("sbp", 160.0)]
+    assert AnalyteStats.from_dict(store.trend_states("p1")["sbp"]).last == 160.0
+    assert [row["patient_id"] for row in store.assessments()] == ["p2", "p1"]
+    assert store.stats()["written"] == 2
+
+
+def test_queries_before_any_write(tmp_path):
+    store = HistoryStore(str(tmp_path / "missing.db"))
+    assert store.assessments() == [] and store.trend_states("p1") == {}
+    store.start()
+    assert store.assessments() == []
+    store.close()
+
+
+def test_disabled_without_a_path():
+    assert open_history_store("") is None
+
+
+def test_old_database_gets_added_columns_and_keeps_rows(tmp_path):
+    path = str(tmp_path / "history.db")
+    # The first release: assessments without the rules column
+    conn = sqlite3.connect(path)
+    conn.execute(
+        "CREATE TABLE assessments (id INTEGER PRIMARY KEY, created_at REAL NOT NULL, patient_id TEXT,"
+        " lang TEXT NOT NULL, features TEXT NOT NULL, final_risk TEXT, heart_score INTEGER, heart_risk TEXT,"
+        " risk_scores TEXT, models TEXT, degraded TEXT, timings TEXT)")
+    conn.executescript(SCHEMA)
+    with conn:
+        conn.execute("INSERT INTO assessments (created_at, patient_id, lang, features) VALUES (?, ?, ?, ?)",
+                     (time.time() - 60, "p1", "English", "sbp=150"))
+    conn.close()
+
+    store = HistoryStore(path)
+    store.record(history_entry("p1", "English", {}, {}, {}, result(), {"total": 0.1}, rules=["冠心病"]))
+    store.flush()
+    store.close()
+    new, old = store.assessments(patient_id="p1")
+    assert old["rules"] is None and old["features"] == "sbp=150"
+    assert new["rules"] == ["Coronary Artery Disease"]
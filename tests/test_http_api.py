@@ -0,0 +1,125 @@
+import gzip
+import http.client
+import importlib
+import json
+import socket
+import sys
+import threading
+from types import SimpleNamespace
+
+import pytest
+
+
+@pytest.fixture
+def api(monkeypatch):
+    # The real assessment module loads the models; the HTTP layer only needs
+    # its entry points, so it is imported against a recording stand-in
+    calls = []
+
+    def analyze_batch(patients):
+        calls.append(patients)
+        return [{"final_risk": "Low Risk", "labs": p.get("lab_params") or {}} for p in patients]
+
+    pipeline = SimpleNamespace(analyze_batch=analyze_batch, pipelines={}, model_manager=None,
+                               HISTORY_STORE=None, inference_pool=None)
+    monkeypatch.setitem(sys.modules, "assessment", pipeline)
+    sys.modules.pop("http_api", None)
+    http_api = importlib.import_module("http_api")
+    monkeypatch.setattr(http_api, "MAX_BODY_BYTES", 4096)
+    server = http_api.make_server(port=0)
+    threading.Thread(target=server.serve_forever, kwargs={"poll_interval": 0.05}, daemon=True).start()
+    yield SimpleNamespace(module=http_api, port=server.server_address[1], calls=calls)
+    server.shutdown()
+    server.server_close()
+    sys.modules.pop("http_api", None)
+
+
+def post(api, path, body, headers=None):
+    conn = http.client.HTTPConnection("127.0.0.1", api.port, timeout=10)
+    if not isinstance(body, bytes):
+        body = json.dumps(body).encode("utf-8")
+    conn.request("POST", path, body=body, headers=headers or {})
+    response = conn.getresponse()
+    payload = json.loads(response.read())
+    conn.close()
+    return response.status, payload
+
+
+def test_valid_patient(api):
+    status, payload = post(api, "/v1/assess", {"lab_params": {"Systolic BP (mmHg)": 150, "Troponin I/T (ng/mL)": 0.02}})
+    assert status == 200
+    assert payload["labs"] == {"Systolic BP (mmHg)": 150, "Troponin I/T (ng/mL)": 0.02}
+    assert len(api.calls) == 1
+
+
+@pytest.mark.parametrize("patient, message", [
+    ([], "patient must be a JSON object"),
+    ({"symptoms": "chest pain"}, "'symptoms' must be an object"),
+    ({"lab_params": {"Systolic BP (mmHg)": "150"}}, "'lab_params' value of 'Systolic BP (mmHg)' must be a number"),
+    ({"lab_params": {"Systolic BP (mmHg)": True}}, "'lab_params' value of 'Systolic BP (mmHg)' must be a number"),
+    ({"lab_params": {"LDL Cholesterol (mg/dL)": None}}, "'lab_params' value of 'LDL Cholesterol (mg/dL)' must be a number"),
+    ({"lang": "Deutsch"}, "'lang' must be '中文' or 'English'"),
+    ({"patient_id": 7}, "'patient_id' must be a string"),
+])
+def test_invalid_patient_is_rejected(api, patient, message):
+    assert post(api, "/v1/assess", patient) == (400, {"error": message})
+    assert api.calls == []
+
+
+def test_non_finite_lab_value_is_rejected(api):
+    status, _ = post(api, "/v1/assess", b'{"lab_params": {"Systolic BP (mmHg)": NaN}}')
+    assert status == 400
+
+
+def test_batch_validation(api):
+    assert post(api, "/v1/assess/batch", {"patients": []})[0] == 400
+    status, _ = post(api, "/v1/assess/batch", {"patients": [{}, {"lab_params": {"x": "1"}}]})
+    assert status == 400 and api.calls == []
+    status, payload = post(api, "/v1/assess/batch", {"patients": [{}] * (api.module.MAX_BATCH + 1)})
+    assert status == 413
+    status, payload = post(api, "/v1/assess/batch", {"patients": [{}, {}]})
+    assert status == 200 and len(payload["results"]) == 2
+
+
+def test_body_errors(api):
+    assert post(api, "/v1/assess", b"{not json")[0] == 400
+    assert post(api, "/v1/assess", b"x" * 5000)[0] == 413
+    assert post(api, "/v1/assess", b"not gzip", {"Content-Encoding": "gzip"})[0] == 400
+    bomb = gzip.compress(b" " * 100_000)
+    assert len(bomb) < 4096
+    assert post(api, "/v1/assess", bomb, {"Content-Encoding": "gzip"})[0] == 413
+    status, _ = post(api, "/v1/assess", gzip.compress(json.dumps({"lab_params": {"x": 1}}).encode()),
+                     {"Content-Encoding": "gzip"})
+    assert status == 200
+
+
+def raw_exchange(api, request):
+    with socket.create_connection(("127.0.0.1", api.port), timeout=10) as sock:
+        sock.sendall(request)
+        chunks = []
+        while True:
+            chunk = sock.recv(65536)
+            if not chunk:
+                break
+            chunks.append(chunk)
+    return b"".join(chunks)
+
+
+@pytest.mark.parametrize("length, status", [(b"-5", b"400"), (b"abc", b"400"), (b"5000", b"413")])
+def test_unread_body_closes_the_connection(api, length, status):
+    # The unread body holds what looks like a second request; it must not be served
+    body = b"GET /healthz HTTP/1.1\r\nHost: x\r\n\r\n"
+    response = raw_exchange(api, b"POST /v1/assess HTTP/1.1\r\nHost: x\r\nContent-Length: " + length
+                            + b"\r\n\r\n" + body)
+    assert response.startswith(b"HTTP/1.1 " + status)
+    assert b"Connection: close" in response
+    assert response.count(b"HTTP/1.1 ") == 1
+
+
+def test_keep_alive_after_a_read_body(api):
+    body = json.dumps({"lab_params": {"x": 1}}).encode()
+    request = (b"POST /v1/assess HTTP/1.1\r\nHost: x\r\nContent-Length: %d\r\n\r\n" % len(body)) + body
+    close = (b"POST /v1/assess HTTP/1.1\r\nHost: x\r\nConnection: close\r\nContent-Length: %d\r\n\r\n"
+             % len(body)) + body
+    response = raw_exchange(api, request + close)
+    assert response.count(b"HTTP/1.1 200") == 2
@@ -0,0 +1,75 @@
+import os
+import signal
+import sys
+import time
+
+import pytest
+
+import inference_workers
+from inference_workers import InferenceWorkerPool, WorkerCrashed
+
+pytestmark = pytest.mark.skipif(sys.platform != "linux", reason="the pool forks its workers")
+
+
+def lengths(texts, **kwargs):
+    if "hang" in texts:
+        time.sleep(60)
+    return [len(text) for text in texts]
+
+
+def wait_for(condition, timeout=15):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if condition():
+            return True
+        time.sleep(0.05)
+    return False
+
+
+@pytest.fixture
+def pool(monkeypatch):
+    monkeypatch.setattr(inference_workers, "HEALTH_INTERVAL", 0.1)
+    pool = InferenceWorkerPool({"a": lengths, "b": lengths}, workers=2, torch_threads=0, job_timeout=1).start()
+    yield pool
+    pool.shutdown()
+
+
+def serving_pids(pool):
+    return [w["pid"] for w in pool.health() if w["retired"] is None and w["alive"]]
+
+
+def test_jobs_run_in_the_workers(pool):
+    assert pool.submit(["ab", "c"]).result(timeout=10) == {"a": [2, 1], "b": [2, 1]}
+    assert pool.submit({"a": ["abc"], "b": []}).result(timeout=10) == {"a": [3], "b": []}
+    assert all(w["pid"] != os.getpid() for w in pool.health())
+
+
+def test_killed_worker_is_replaced(pool):
+    first = serving_pids(pool)
+    assert len(first) == 2
+    os.kill(first[0], signal.SIGKILL)
+    assert wait_for(lambda: len(serving_pids(pool)) == 2 and first[0] not in serving_pids(pool))
+    assert pool.health()[0]["restarts"] == 1 and pool.available()
+    # Both slots serve again, the replacement included
+    futures = [pool.submit(["x" * i]) for i in range(8)]
+    assert [f.result(timeout=10)["a"] for f in futures] == [[i] for i in range(8)]
+
+
+def test_hung_job_fails_and_worker_is_replaced(pool):
+    future = pool.submit(["hang"])
+    with pytest.raises(WorkerCrashed):
+        future.result(timeout=15)
+    assert wait_for(lambda: len(serving_pids(pool)) == 2)
+    assert sum(w["restarts"] for w in pool.health()) == 1
+    assert pool.submit(["ok"]).result(timeout=10) == {"a": [2], "b": [2]}
+
+
+def test_without_the_fork_server_workers_stay_retired(pool):
+    pool.zygote.kill()
+    pool.zygote.join()
+    for pid in serving_pids(pool):
+        os.kill(pid, signal.SIGKILL)
+    assert wait_for(lambda: not pool.available())
+    assert {w["retired"] for w in pool.health()} == {"died"}
+    with pytest.raises(WorkerCrashed):
+        pool.submit(["x"]).result(timeout=1)
@@ -0,0 +1,123 @@
+import numpy as np
+import pytest
+
+from assessment_graph import AssessmentGraph, AssessmentSession
+from lab_trends import DUPLICATE_WINDOW, AnalyteStats, TrendTracker, trend_values
+
+DAY = 86400
+T0 = 1_700_000_000
+
+
+def test_running_stats_match_numpy():
+    days = np.array([0.0, 1.5, 3.0, 7.25, 30.0, 31.0])
+    values = np.array([130.0, 128.0, 141.5, 150.0, 139.0, 160.0])
+    stats = AnalyteStats()
+    for day, value in zip(days, values):
+        assert stats.add(T0 + day * DAY, float(value))
+    assert stats.n == len(values)
+    assert stats.mean == pytest.approx(values.mean())
+    assert stats.m2 / (stats.n - 1) == pytest.approx(values.var(ddof=1))
+    assert stats.slope == pytest.approx(np.polyfit(days, values, 1)[0])
+    assert (stats.first, stats.last, stats.previous) == (130.0, 160.0, 139.0)
+
+
+def test_slope_needs_two_times_and_survives_round_trip():
+    stats = AnalyteStats()
+    stats.add(T0, 100.0)
+    assert stats.slope is None and stats.direction == "stable"
+    stats.add(T0 + 10 * DAY, 150.0)
+    assert stats.slope == pytest.approx(5.0)
+    assert stats.direction == "rising"
+    restored = AnalyteStats.from_dict(stats.to_dict())
+    restored.add(T0 + 20 * DAY, 200.0)
+    stats.add(T0 + 20 * DAY, 200.0)
+    assert restored.to_dict() == stats.to_dict()
+
+
+def test_duplicate_within_window_is_ignored():
+    stats = AnalyteStats()
+    assert stats.add(T0, 120.0)
+    assert not stats.add(T0 + DUPLICATE_WINDOW - 1, 120.0)
+    assert stats.add(T0 + DUPLICATE_WINDOW, 120.0)
+    assert stats.add(T0 + DUPLICATE_WINDOW + 1, 121.0)
+    assert stats.n == 3
+
+
+def test_streak_counts_consecutive_out_of_range_values():
+    stats = AnalyteStats(low=90, high=140)
+    for day, value in enumerate([150, 160, 170]):
+        stats.add(T0 + day * DAY, value)
+    assert stats.streak == 3
+    stats.add(T0 + 3 * DAY, 80)
+    assert stats.streak == -1
+    stats.add(T0 + 4 * DAY, 120)
+    assert stats.streak == 0
+
+
+def test_session_resubmit_replaces_its_point():
+    tracker = TrendTracker()
+    tracker.observe("p1", {"sbp": 140.0}, at=T0, session_id="a")
+    tracker.observe("p1", {"sbp": 150.0}, at=T0 + DAY, session_id="b")
+    changed = tracker.observe("p1", {"sbp": 170.0}, at=T0 + DAY + 60, session_id="b")
+    assert changed["sbp"]["n"] == 2
+    assert changed["sbp"]["last"] == 170.0
+    assert changed["sbp"]["previous"] == 140.0
+
+    [trend] = tracker.preview("p1", {"sbp": 130.0}, "English", at=T0 + DAY + 120, session_id="b")
+    assert (trend.count, trend.first, trend.last) == (2, 140.0, 130.0)
+    [trend] = tracker.preview("p1", {"sbp": 130.0}, "English", at=T0 + 2 * DAY, session_id="c")
+    assert trend.count == 3
+
+    tracker.observe("p1", {"sbp": 160.0}, at=T0 + 2 * DAY, session_id="c")
+    assert tracker.observe("p1", {"sbp": 165.0}, at=T0 + 2 * DAY + 60, session_id="c")["sbp"]["n"] == 3
+
+
+def test_version_changes_when_the_series_change():
+    tracker = TrendTracker(max_patients=1)
+    start = tracker.version("p1")
+    tracker.preview("p1", {"sbp": 140.0}, "English", at=T0)
+    assert tracker.version("p1") == start
+
+    tracker.observe("p1", {"sbp": 140.0}, at=T0, session_id="a")
+    observed = tracker.version("p1")
+    assert observed != start
+    # A resubmit of the same value changes nothing
+    tracker.observe("p1", {"sbp": 140.0}, at=T0 + 60)
+    assert tracker.version("p1") == observed
+
+    # Evicted and reloaded: the stored series may have changed meanwhile
+    tracker.version("p2")
+    assert tracker.version("p1") not in (start, observed)
+
+
+def test_cached_trends_are_recomputed_after_another_session_observes():
+    tracker = TrendTracker()
+    graph = AssessmentGraph()
+
+    @graph.stage("trends", deps=["patient_id", "values", "trend_version"])
+    def trends(patient_id, values, trend_version):
+        return tracker.preview(patient_id, values, "English", at=T0 + 2 * DAY)
+
+    def run(session):
+        return graph.run({"patient_id": "p1", "values": {"sbp": 150.0},
+                          "trend_version": tracker.version("p1")}, session=session)
+
+    tracker.observe("p1", {"sbp": 130.0}, at=T0)
+    session = AssessmentSession()
+    values, _ = run(session)
+    assert values["trends"][0].count == 2
+
+    tracker.observe("p1", {"sbp": 140.0}, at=T0 + DAY, session_id="other")
+    values, recomputed = run(session)
+    assert recomputed == ["trends"]
+    assert values["trends"][0].count == 3
+
+
+def test_trend_values_skip_unedited_form_fields_only():
+    labs = {"Systolic BP (mmHg)": 120, "Diastolic BP (mmHg)": 80}
+    # API and batch requests have no form: a normal 120/80 is a measurement
+    assert trend_values(labs) == {"sbp": 120.0, "dbp": 80.0}
+    form_defaults = {"Systolic BP (mmHg)": 120, "Diastolic BP (mmHg)": 80}
+    assert trend_values(dict(labs, **{"Diastolic BP (mmHg)": 95}), form_defaults=form_defaults) == {"dbp": 95.0}
+    # The same value read from the report is a real measurement
+    assert trend_values(labs, {"Systolic BP (mmHg)": 120}, form_defaults)["sbp"] == 120.0
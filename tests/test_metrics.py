@@ -0,0 +1,43 @@
+from metrics import Registry, simple_collector
+
+
+def test_counter_and_gauge_exposition():
+    registry = Registry()
+    counter = registry.counter("demo_total", "Demo counter", ["stage"])
+    counter.labels(stage='quo"te').inc()
+    counter.labels(stage="b").inc(2.5)
+    assert registry.counter("demo_total", "Demo counter", ["stage"]) is counter
+    gauge = registry.gauge("demo_depth", "Demo gauge")
+    gauge.set_function(lambda: 3)
+    lines = registry.render().splitlines()
+    assert lines == [
+        "# HELP demo_total Demo counter",
+        "# TYPE demo_total counter",
+        'demo_total{stage="b"} 2.5',
+        'demo_total{stage="quo\\"te"} 1',
+        "# HELP demo_depth Demo gauge",
+        "# TYPE demo_depth gauge",
+        "demo_depth 3",
+    ]
+
+
+def test_histogram_buckets_are_cumulative():
+    registry = Registry()
+    histogram = registry.histogram("demo_seconds", "Demo histogram", buckets=(0.1, 1))
+    for value in (0.05, 0.1, 0.5, 2):
+        histogram.observe(value)
+    lines = registry.render().splitlines()
+    assert lines[2:] == [
+        'demo_seconds_bucket{le="0.1"} 2',
+        'demo_seconds_bucket{le="1"} 3',
+        'demo_seconds_bucket{le="+Inf"} 4',
+        "demo_seconds_sum 2.65",
+        "demo_seconds_count 4",
+    ]
+
+
+def test_simple_collector():
+    registry = Registry()
+    registry.register_collector(simple_collector(
+        "demo_requests_total", "counter", "Demo requests", lambda: [({"result": "ok"}, 5)]))
+    assert registry.render().splitlines()[-1] == 'demo_requests_total{result="ok"} 5'
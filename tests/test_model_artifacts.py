@@ -0,0 +1,52 @@
+import json
+import subprocess
+
+import pytest
+
+import model_artifacts
+
+
+def write_manifest(cache_dir, models=model_artifacts.MODELS, torch="2.3"):
+    manifest = {"torch": torch, "models": {name: {"source": path} for name, path in models.items()}}
+    (cache_dir / model_artifacts.MANIFEST).write_text(json.dumps(manifest), encoding="utf-8")
+
+
+def test_benchmark_uses_the_given_cache_dir(tmp_path, monkeypatch):
+    write_manifest(tmp_path)
+    children = []
+
+    def run(cmd, env, **kwargs):
+        children.append(env)
+        return subprocess.CompletedProcess(cmd, 0, stdout=json.dumps({"load_s": 1.0, "ready_s": 2.0}) + "\n")
+
+    monkeypatch.setattr(model_artifacts.subprocess, "run", run)
+    results = model_artifacts.benchmark_cold_start(runs=2, cache_dir=str(tmp_path))
+    assert results == {"checkpoints": {"load_s": 1.0, "ready_s": 2.0}, "artifacts": {"load_s": 1.0, "ready_s": 2.0}}
+    assert len(children) == 4
+    assert all(env["AIGNOSIS_ARTIFACT_DIR"] == str(tmp_path) for env in children)
+    assert [env["AIGNOSIS_USE_ARTIFACTS"] for env in children] == ["0", "0", "1", "1"]
+
+
+def test_benchmark_without_artifacts_in_cache_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(model_artifacts.subprocess, "run", pytest.fail)
+    with pytest.raises(SystemExit):
+        model_artifacts.benchmark_cold_start(runs=1, cache_dir=str(tmp_path))
+
+
+def test_mismatched_artifacts_are_ignored_with_a_warning(tmp_path, monkeypatch):
+    events = []
+    monkeypatch.setattr(model_artifacts, "log_event", lambda logger, level, event, **fields: events.append((event, fields)))
+    monkeypatch.setattr(model_artifacts, "_torch_version", lambda: "2.3")
+    models = dict(model_artifacts.MODELS)
+
+    write_manifest(tmp_path, models)
+    assert model_artifacts._usable_manifest(models, str(tmp_path))["torch"] == "2.3"
+    assert events == []
+
+    write_manifest(tmp_path, models, torch="2.1")
+    assert model_artifacts._usable_manifest(models, str(tmp_path)) is None
+    write_manifest(tmp_path, {"BioBERT": models["BioBERT"]})
+    assert model_artifacts._usable_manifest(models, str(tmp_path)) is None
+    assert [event for event, _ in events] == ["artifacts_ignored", "artifacts_ignored"]
+    assert all(fields["cache_dir"] == str(tmp_path) for _, fields in events)
+    assert "torch 2.1" in events[0][1]["reason"]
@@ -0,0 +1,50 @@
+import random
+
+from serving import PerThreadPipeline, length_buckets
+
+
+def test_length_buckets_cover_all_indices_sorted_by_length():
+    rng = random.Random(0)
+    lengths = [rng.randint(1, 500) for _ in range(103)]
+    buckets = length_buckets(lengths, 8)
+    order = [i for bucket in buckets for i in bucket]
+    assert sorted(order) == list(range(len(lengths)))
+    assert all(len(bucket) == 8 for bucket in buckets[:-1]) and len(buckets[-1]) == 103 % 8
+    assert [lengths[i] for i in order] == sorted(lengths)
+
+
+class FakePipe:
+    """Echoes its texts; token count = word count."""
+
+    def __init__(self):
+        self.calls = []
+
+    def tokenizer(self, texts, truncation=False):
+        return {"input_ids": [text.split() for text in texts]}
+
+    def __call__(self, texts, **kwargs):
+        self.calls.append(list(texts) if isinstance(texts, list) else texts)
+        if isinstance(texts, list):
+            return [{"label": text} for text in texts]
+        return {"label": texts}
+
+
+def test_outputs_are_put_back_in_call_order():
+    texts = ["a " * n for n in (9, 1, 5, 3, 7, 2, 8)]
+    pipe = FakePipe()
+    outputs = PerThreadPipeline(pipe, length_bucketing=True)(texts, batch_size=2)
+    assert [output["label"] for output in outputs] == texts
+    # The pipeline saw the texts sorted by length
+    assert pipe.calls == [sorted(texts, key=len)]
+
+
+def test_bucketing_only_for_batched_lists():
+    texts = ["a b c", "a"]
+    pipe = FakePipe()
+    wrapper = PerThreadPipeline(pipe, length_bucketing=True)
+    wrapper(texts, batch_size=1)
+    wrapper(texts, batch_size=4)
+    wrapper("single text", batch_size=4)
+    PerThreadPipeline(pipe, length_bucketing=False)(texts + ["a b"], batch_size=2)
+    assert pipe.calls == [texts, texts, "single text", texts + ["a b"]]
+    assert wrapper.tokenizer == pipe.tokenizer
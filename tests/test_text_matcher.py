@@ -0,0 +1,58 @@
+from text_matcher import NEGATION_WINDOW, PhraseMatcher
+
+MATCHER = PhraseMatcher({"chest pain": ["angina"], "fever": ["infection"], "胸痛": ["angina"], "发热": ["infection"]})
+
+
+def hits(text):
+    return {(m.term, m.negated) for m in MATCHER.find(text)}
+
+
+def test_spans_and_tags():
+    text = "Patient reports Chest Pain since morning"
+    [match] = MATCHER.find(text)
+    assert text[match.start:match.end].lower() == "chest pain"
+    assert match.tags == ("angina",)
+    assert not match.negated
+
+
+def test_cue_negates_following_terms_in_clause():
+    assert hits("no chest pain or fever") == {("chest pain", True), ("fever", True)}
+    assert hits("denies fever") == {("fever", True)}
+    assert hits("free of chest pain") == {("chest pain", True)}
+
+
+def test_cue_after_term_does_not_negate_it():
+    assert hits("chest pain, no fever") == {("chest pain", False), ("fever", True)}
+    assert hits("chest pain no fever") == {("chest pain", False), ("fever", True)}
+
+
+def test_clause_break_and_break_words_end_negation():
+    assert hits("no fever. chest pain") == {("fever", True), ("chest pain", False)}
+    assert hits("no fever but chest pain") == {("fever", True), ("chest pain", False)}
+    assert hits("no fever, however chest pain") == {("fever", True), ("chest pain", False)}
+
+
+def test_english_cues_are_whole_words():
+    assert hits("I know chest pain") == {("chest pain", False)}
+    assert hits("nothing new; notable fever") == {("fever", False)}
+    assert hits("Not chest pain") == {("chest pain", True)}
+
+
+def test_negation_window():
+    # Distance from the end of "no" to "fever": exactly the window, then one more
+    near = "no " + "x" * (NEGATION_WINDOW - 2) + " fever"
+    far = "no " + "x" * (NEGATION_WINDOW - 1) + " fever"
+    assert hits(near) == {("fever", True)}
+    assert hits(far) == {("fever", False)}
+
+
+def test_chinese_cues_and_breaks():
+    assert hits("没有胸痛") == {("胸痛", True)}
+    assert hits("无胸痛、发热") == {("胸痛", True), ("发热", True)}
+    assert hits("无发热，胸痛") == {("发热", True), ("胸痛", False)}
+    assert hits("无发热但胸痛") == {("发热", True), ("胸痛", False)}
+
+
+def test_empty_text():
+    assert MATCHER.find("") == []
+    assert MATCHER.find(None) == []
@@ -0,0 +1,141 @@
+from collections import deque
+from dataclasses import dataclass
+
+# Negation cues; English cues must stand as whole words ("no" but not "know")
+NEGATION_CUES = {
+    "English": ["no", "not", "without", "denies", "deny", "never", "none", "free of"],
+    "中文": ["没有", "没", "无", "不", "未", "否认"],
+}
+
+# A negation only reaches forward to the end of its clause ("、" lists stay negated)
+CLAUSE_BREAKS = set(".,;:!?\n，。；：！？")
+CLAUSE_BREAK_WORDS = ["but", "但", "但是", "however"]
+
+# Max distance (characters) between the end of a cue and the negated term
+NEGATION_WINDOW = 30
+
+
+@dataclass(frozen=True)
+class TextMatch:
+    """One vocabulary hit in the free text; text[start:end] is the matched span."""
+    term: str
+    start: int
+    end: int
+    negated: bool
+    tags: tuple
+
+
+def _is_ascii_word(term):
+    return term.isascii() and any(c.isalpha() for c in term)
+
+
+def _fold(c):
+    # Lower-case without changing the text length, so spans map 1:1 to the input
+    low = c.lower()
+    return low if len(low) == 1 else c
+
+
+class PhraseMatcher:
+    """
+    Aho-Corasick automaton over a bilingual vocabulary.
+    `find` makes one pass over the text and returns every vocabulary hit, with
+    negation resolved from the cues and clause breaks seen in the same pass.
+    Matching is case-insensitive; vocabulary terms match as substrings (the
+    legacy keyword behaviour), negation cues only as whole words.
+    """
+
+    def __init__(self, vocabulary, negation_cues=None):
+        """
+        Args:
+            vocabulary: dict of term -> iterable of tags
+            negation_cues: list of cue strings (defaults to all NEGATION_CUES)
+        """
+        if negation_cues is None:
+            negation_cues = [cue for cues in NEGATION_CUES.values() for cue in cues]
+        self.entries = []     # (term, kind, tags); kind is "term", "cue" or "break"
+        self.goto = [{}]
+        self.fail = [0]
+        self.out = [[]]
+        for term, tags in vocabulary.items():
+            self._add(term, "term", tuple(tags))
+        for cue in negation_cues:
+            self._add(cue, "cue", ())
+        for word in CLAUSE_BREAK_WORDS:
+            self._add(word, "break", ())
+        self._build()
+
+    def _add(self, term, kind, tags):
+        index = len(self.entries)
+        self.entries.append((term, kind, tags))
+        node = 0
+        for c in term:
+            c = _fold(c)
+            nxt = self.goto[node].get(c)
+            if nxt is None:
+                nxt = len(self.goto)
+                self.goto[node][c] = nxt
+                self.goto.append({})
+                self.fail.append(0)
+                self.out.append([])
+            node = nxt
+        self.out[node].append(index)
+
+    def _build(self):
+        pending = deque(self.goto[0].values())
+        while pending:
+            node = pending.popleft()
+            for c, nxt in self.goto[node].items():
+                pending.append(nxt)
+                f = self.fail[node]
+                while f and c not in self.goto[f]:
+                    f = self.fail[f]
+                self.fail[nxt] = self.goto[f].get(c, 0)
+                self.out[nxt] = self.out[nxt] + self.out[self.fail[nxt]]
+
+    def find(self, text):
+        """
+        Returns the list of TextMatch for all vocabulary terms in `text`, in
+        order of their end position.
+        """
+        if not text:
+            return []
+        matches = []
+        goto, fail, out, entries = self.goto, self.fail, self.out, self.entries
+        node = 0
+        clause_start = 0
+        last_cue_end = -1
+        n = len(text)
+        for i, c in enumerate(text):
+            if c in CLAUSE_BREAKS:
+                clause_start = i + 1
+                last_cue_end = -1
+                node = 0
+                continue
+            c = _fold(c)
+            while node and c not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(c, 0)
+            for index in out[node]:
+                term, kind, tags = entries[index]
+                end = i + 1
+                start = end - len(term)
+                if kind == "term":
+                    negated = (
+                        last_cue_end != -1
+                        and last_cue_end <= start
+                        and start - last_cue_end <= NEGATION_WINDOW
+                    )
+                    matches.append(TextMatch(term, start, end, negated, tags))
+                    continue
+                # Cues and break words must be whole words in ASCII text
+                if _is_ascii_word(term) and (
+                    (start > 0 and text[start - 1].isascii() and text[start - 1].isalpha())
+                    or (end < n and text[end].isascii() and text[end].isalpha())
+                ):
+                    continue
+                if kind == "cue" and start >= clause_start:
+                    last_cue_end = end
+                elif kind == "break":
+                    clause_start = end
+                    last_cue_end = -1
+        return matches
@@ -0,0 +1,223 @@
+import contextvars
+import itertools
+import json
+import logging
+import os
+import queue
+import random
+import socket
+import threading
+import time
+
+# ---------------------- Configuration ----------------------
+# AIGNOSIS_TRACE=1                 enable spans
+# AIGNOSIS_TRACE_SAMPLE=0.1        fraction of requests (root spans) that are traced
+# AIGNOSIS_TRACE_EXPORT=udp://127.0.0.1:6831 | /path/to/spans.jsonl
+# AIGNOSIS_LOG_LEVEL=DEBUG         level of the structured "aignosis" loggers
+# AIGNOSIS_LOG_SAMPLE=0.01         sampling of DEBUG events (WARNING and above are never sampled)
+TRACE_ENABLED = os.getenv("AIGNOSIS_TRACE", "0") == "1"
+TRACE_SAMPLE = float(os.getenv("AIGNOSIS_TRACE_SAMPLE", "1.0"))
+TRACE_EXPORT = os.getenv("AIGNOSIS_TRACE_EXPORT", "")
+LOG_LEVEL = os.getenv("AIGNOSIS_LOG_LEVEL", "WARNING").upper()
+LOG_SAMPLE = float(os.getenv("AIGNOSIS_LOG_SAMPLE", "1.0"))
+
+_current_span = contextvars.ContextVar("aignosis_span", default=None)
+_ids = itertools.count(1)
+
+
+class _NoopSpan:
+    """Returned when tracing is off or the request is not sampled."""
+    __slots__ = ()
+    sampled = False
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def set(self, **attrs):
+        pass
+
+
+_NOOP_SPAN = _NoopSpan()
+
+
+class Span:
+    __slots__ = ("name", "trace_id", "span_id", "parent_id", "attrs", "start", "duration", "error", "_t0", "_token")
+    sampled = True
+
+    def __init__(self, name, trace_id, parent_id, attrs):
+        self.name = name
+        self.trace_id = trace_id
+        self.span_id = next(_ids)
+        self.parent_id = parent_id
+        self.attrs = attrs
+        self.error = None
+
+    def __enter__(self):
+        self._token = _current_span.set(self)
+        self.start = time.time()
+        self._t0 = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.duration = time.perf_counter() - self._t0
+        _current_span.reset(self._token)
+        if exc is not None:
+            self.error = repr(exc)
+        _exporter.submit(self)
+        return False
+
+    def set(self, **attrs):
+        self.attrs.update(attrs)
+
+    def to_dict(self):
+        record = {
+            "name": self.name,
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "start": self.start,
+            "duration_ms": round(self.duration * 1000, 3),
+            "pid": os.getpid(),
+        }
+        if self.attrs:
+            record["attrs"] = self.attrs
+        if self.error:
+            record["error"] = self.error
+        return record
+
+
+def span(name, **attrs):
+    """
+    Open a named span, e.g. `with span("model", model="BioBERT"):`.
+    Nested spans share the trace of their parent; a new trace is sampled at the
+    root. Costs one global lookup when tracing is disabled.
+    """
+    if not TRACE_ENABLED:
+        return _NOOP_SPAN
+    parent = _current_span.get()
+    if parent is None:
+        if TRACE_SAMPLE < 1.0 and random.random() >= TRACE_SAMPLE:
+            return _NOOP_SPAN
+        return Span(name, f"{os.getpid():x}-{next(_ids):x}", None, attrs)
+    if not parent.sampled:
+        return _NOOP_SPAN
+    return Span(name, parent.trace_id, parent.span_id, attrs)
+
+
+class _SpanExporter:
+    """
+    Ships finished spans off the request path: spans go into a bounded queue
+    and a daemon thread writes them as JSON lines to a UDP collector or a file.
+    Spans are dropped (and counted) when the queue is full.
+    """
+
+    def __init__(self, target, maxsize=10000):
+        self.target = target
+        self.queue = queue.Queue(maxsize=maxsize)
+        self.dropped = 0
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def submit(self, finished):
+        if not self.target:
+            return
+        if self._thread is None:
+            self._start()
+        try:
+            self.queue.put_nowait(finished)
+        except queue.Full:
+            self.dropped += 1
+
+    def _start(self):
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="aignosis-span-exporter", daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        if self.target.startswith("udp://"):
+            host, port = self.target[len("udp://"):].rsplit(":", 1)
+            sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+            address = (host, int(port))
+
+            def write(line):
+                sock.sendto(line.encode("utf-8"), address)
+        else:
+            out = open(self.target, "a", encoding="utf-8", buffering=1)
+
+            def write(line):
+                out.write(line + "\n")
+        while True:
+            finished = self.queue.get()
+            try:
+                write(json.dumps(finished.to_dict(), ensure_ascii=False, default=repr))
+            except OSError:
+                self.dropped += 1
+
+
+_exporter = _SpanExporter(TRACE_EXPORT)
+
+
+# ---------------------- Structured logging ----------------------
+class StructuredFormatter(logging.Formatter):
+    """
+    One JSON object per line: time, level, logger, event, trace id and fields.
+    """
+
+    def format(self, record):
+        entry = {
+            "ts": round(record.created, 3),
+            "level": record.levelname,
+            "logger": record.name,
+            "event": record.getMessage(),
+        }
+        fields = getattr(record, "fields", None)
+        if fields:
+            entry.update(fields)
+        current = _current_span.get()
+        if current is not None and current.sampled:
+            entry["trace_id"] = current.trace_id
+        return json.dumps(entry, ensure_ascii=False, default=repr)
+
+
+def get_logger(name):
+    """
+    Logger under the "aignosis" namespace, configured on first use.
+    """
+    _configure_logging()
+    return logging.getLogger(f"aignosis.{name}")
+
+
+_configured = False
+
+
+def _configure_logging():
+    global _configured
+    if _configured:
+        return
+    _configured = True
+    root = logging.getLogger("aignosis")
+    root.setLevel(LOG_LEVEL)
+    if not root.handlers:
+        handler = logging.StreamHandler()
+        handler.setFormatter(StructuredFormatter())
+        root.addHandler(handler)
+    root.propagate = False
+
+
+def log_event(logger, level, event, sample=None, **fields):
+    """
+    Emit a structured event. Fields are only serialized if the level is enabled
+    and the event survives sampling; DEBUG/INFO events are sampled with
+    AIGNOSIS_LOG_SAMPLE unless an explicit `sample` rate is given.
+    """
+    if not logger.isEnabledFor(level):
+        return
+    if level < logging.WARNING:
+        rate = LOG_SAMPLE if sample is None else sample
+        if rate < 1.0 and random.random() >= rate:
+            return
+    logger.log(level, event, extra={"fields": fields})
@@ -1,6 +1,7 @@
 import gradio as gr
 from transformers import pipeline, AutoModelForSequenceClassification, AutoTokenizer
 import json
+from serving import PerThreadPipeline, launch
 
 # ---------------------- 标签映射和模型解释 ----------------------
 LABEL_MAPPING = {
@@ -35,7 +36,7 @@ pipelines = {}
 for name, path in MODELS.items():
     tokenizer = AutoTokenizer.from_pretrained(path)
     model = AutoModelForSequenceClassification.from_pretrained(path, num_labels=3)
-    pipelines[name] = pipeline("text-classification", model=model, tokenizer=tokenizer)
+    pipelines[name] = PerThreadPipeline(pipeline("text-classification", model=model, tokenizer=tokenizer))
 
 # ---------------------- 心血管疾病分类函数 ----------------------
 def classify_cardiovascular_disease(symptoms, history, lab_params, lang="中文"):
@@ -332,4 +333,4 @@ with gr.Blocks() as demo:
     # 初始化默认中文界面
     switch_tab("中文")
 
-demo.launch()
+launch(demo)